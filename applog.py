@@ -0,0 +1,210 @@
+"""
+App Log
+Журнал приложения: уровни, контекст объявления, буферизованная запись.
+
+Модули пишут через log = applog.get_logger(__name__):
+    log.debug    — шаги разбора (попытки, отдельные скриншоты)
+    log.info     — начало и итог объявления, этапы прогона
+    log.warning  — деградация (нет блока, не появился tooltip)
+    log.error    — ошибки, из-за которых часть данных потеряна
+
+К каждой записи добавляются сайт и ссылка текущего объявления
+(timing.tracer.set_ad). Записи складываются в кольцевой буфер, фоновый
+поток пачками пишет их в файл с ротацией:
+    Логи/parser.log — одна строка JSON на запись
+
+Аргументы сообщений передаются отдельно (log.debug("… %s", x)), поэтому
+при уровне INFO отладочные вызовы стоят одну проверку уровня.
+Записи потока воркера дублируются в ParserWorker.log через attach().
+"""
+
+import json
+import logging
+import sys
+import threading
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from timing import tracer
+
+LOG_DIR = Path("Логи")
+ROOT = "parser"
+
+_setup_lock = threading.Lock()
+_buffer_handler = None
+
+
+def get_logger(name):
+    """Логгер модуля внутри иерархии приложения"""
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+class AdContextFilter(logging.Filter):
+    """Сайт и ссылка текущего объявления потока — в поля записи"""
+
+    def filter(self, record):
+        record.site, record.url = tracer.current_ad()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "site": getattr(record, "site", None),
+            "url": getattr(record, "url", None),
+            "msg": record.getMessage().strip(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RingBufferHandler(logging.Handler):
+    """
+    Кольцевой буфер записей и фоновый поток, который пачками пишет их
+    в target (обычно RotatingFileHandler) с одним flush на пачку.
+    При переполнении теряются самые старые записи — поток парсинга не ждёт диск.
+    """
+
+    def __init__(self, target, capacity=10000, batch_size=200, interval=1.0):
+        super().__init__()
+        self.target = target
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self._records = deque(maxlen=capacity)
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def emit(self, record):
+        if len(self._records) == self._records.maxlen:
+            self.dropped += 1
+        self._records.append(record)
+        if len(self._records) >= self.batch_size:
+            self._wakeup.set()
+
+    def _drain(self):
+        batch = []
+        while self._records:
+            try:
+                batch.append(self._records.popleft())
+            except IndexError:
+                break
+        return batch
+
+    def _write(self, batch):
+        target = self.target
+        target.acquire()
+        try:
+            for record in batch:
+                try:
+                    if target.shouldRollover(record):
+                        target.doRollover()
+                    target.stream.write(target.format(record) + target.terminator)
+                except Exception:
+                    target.handleError(record)
+            target.flush()
+        finally:
+            target.release()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            batch = self._drain()
+            if batch:
+                self._write(batch)
+
+    def flush(self):
+        batch = self._drain()
+        if batch:
+            self._write(batch)
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join(timeout=5)
+        self.flush()
+        self.target.close()
+        super().close()
+
+
+class CallbackHandler(logging.Handler):
+    """Передаёт текст записей одного потока в callback (например, сигнал log воркера)"""
+
+    def __init__(self, callback, thread_id=None, level=logging.INFO):
+        super().__init__(level)
+        self.callback = callback
+        self.thread_id = thread_id
+        self.setFormatter(logging.Formatter("%(message)s"))
+
+    def filter(self, record):
+        if self.thread_id is not None and record.thread != self.thread_id:
+            return False
+        return super().filter(record)
+
+    def emit(self, record):
+        try:
+            self.callback(self.format(record).strip())
+        except Exception:
+            self.handleError(record)
+
+
+def setup(level=logging.INFO, console=True, log_dir=LOG_DIR, max_bytes=5 * 1024 * 1024, backups=5):
+    """Настройка журнала приложения (повторный вызов меняет только уровень)"""
+    global _buffer_handler
+
+    logger = logging.getLogger(ROOT)
+    logger.setLevel(level)
+    with _setup_lock:
+        if _buffer_handler is not None:
+            return logger
+
+        log_dir = Path(log_dir)
+        log_dir.mkdir(parents=True, exist_ok=True)
+        file_handler = RotatingFileHandler(
+            log_dir / "parser.log", maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+        )
+        file_handler.setFormatter(JsonFormatter())
+
+        _buffer_handler = RingBufferHandler(file_handler)
+        _buffer_handler.addFilter(AdContextFilter())
+        logger.addHandler(_buffer_handler)
+
+        # В оконной сборке PyInstaller консоли нет — sys.stderr равен None
+        if console and sys.stderr is not None:
+            console_handler = logging.StreamHandler(sys.stderr)
+            console_handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(console_handler)
+
+        logger.propagate = False
+    return logger
+
+
+def attach(callback, thread_id=None, level=logging.INFO):
+    """Дублирует записи (по умолчанию текущего потока) в callback; вернуть handler в detach()"""
+    handler = CallbackHandler(callback, thread_id or threading.get_ident(), level)
+    logging.getLogger(ROOT).addHandler(handler)
+    return handler
+
+
+def detach(handler):
+    logging.getLogger(ROOT).removeHandler(handler)
+
+
+def shutdown():
+    """Дописывает буфер в файл (при выходе из приложения)"""
+    global _buffer_handler
+    with _setup_lock:
+        if _buffer_handler is not None:
+            logging.getLogger(ROOT).removeHandler(_buffer_handler)
+            _buffer_handler.close()
+            _buffer_handler = None
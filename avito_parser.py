@@ -6,120 +6,93 @@ Avito Real Estate Parser
 pip install selenium webdriver-manager requests
 """
 
-import os
-import sys
 import re
-import json
 import time
 import hashlib
 from datetime import datetime
-from pathlib import Path
-import asyncio
-import aiohttp
-from pathlib import Path
-from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from webdriver_manager.chrome import ChromeDriverManager
-from PIL import Image
 
+import applog
+import metrics
+from site_engine import SiteParser
+from text_parsing import (
+    area_from_text, first_number, normalize_dates, parse_price_history, plot_area_m2, price_per_m2_from_info
+)
+from timing import span
 
-def resource_path(relative_path):
-    if hasattr(sys, "_MEIPASS"):
-        return os.path.join(sys._MEIPASS, relative_path)
-    return os.path.abspath(relative_path)
+log = applog.get_logger(__name__)
 
-class AvitoParser:
-    """Парсер объявлений недвижимости Avito"""
+AD_ID_RE = re.compile(r'_(\d+)(?:\?|$)')
+# Параметры размера в ссылке фото: без них CDN отдаёт оригинал
+IMAGE_SIZE_PARAMS_RE = re.compile(r'[?&](?:s=\d+x\d+|w=\d+|h=\d+)')
 
-    def __init__(self, headless=False, download_screens=True, download_photos = False, images_dir="Скриншоты", slow_mode=False, on_captcha=None):
-        self.download_screens = download_screens
-        self.download_photos = download_photos
-        self.images_dir = Path(images_dir)
-        self.driver = None
-        self.headless = headless
-        self.slow_mode = slow_mode
-        self.slow_delay = 0.4
-        self.on_captcha = on_captcha
-        self._wait_for_user = False
-        self.browser_type = None
-
-        if download_screens:
-            self.images_dir.mkdir(parents=True, exist_ok=True)
-
-    def _setup_driver(self):
-        """Настройка драйвера с fallback: Yandex → Chrome"""
-        options = Options()
-
-        if self.headless:
-            options.add_argument("--headless=new")
-
-        # Общие параметры для обоих браузеров
-        options.add_argument("--disable-blink-features=AutomationControlled")
-        options.add_argument("--disable-infobars")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-gpu")
-        options.add_argument("--window-size=1920,1080")
-        options.add_argument("--start-maximized")
-        options.add_argument("--lang=ru-RU")
-        options.add_argument('--disable-notifications')
-        options.add_argument('--disable-extensions')
-        options.add_argument(
-            "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-        options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        options.add_experimental_option("useAutomationExtension", False)
-        options.page_load_strategy = "eager"
-
-        # Попытка 1: Yandex Browser с yandexdriver.exe
-        yandex_driver_path = resource_path("yandexdriver.exe")
-
-        if os.path.exists(yandex_driver_path):
-            try:
-                print("🔍 Найден yandexdriver.exe, запускаю Yandex Browser...")
-                service = Service(yandex_driver_path)
-                self.driver = webdriver.Chrome(service=service, options=options)
-                self.browser_type = "yandex"
-                print("✓ Yandex Browser успешно запущен")
-            except Exception as e:
-                print(f"✗ Ошибка запуска Yandex Browser: {e}")
-                print("↻ Переключаюсь на Chrome...")
-                self.driver = None
-        else:
-            print(f"ℹ yandexdriver.exe не найден по пути: {yandex_driver_path}")
-            print("↻ Переключаюсь на Chrome...")
+ADS_SELECTORS = [
+    "div[class*='item-view-ads']",
+    "div[class*='ads']",
+    "div[data-marker*='ads']"
+]
 
-        # Попытка 2: Chrome (если Yandex не запустился)
-        if self.driver is None:
-            try:
-                print("🔍 Запускаю Chrome...")
-                service = Service(ChromeDriverManager().install())
-                self.driver = webdriver.Chrome(service=service, options=options)
-                self.browser_type = "chrome"
-                print("✓ Chrome успешно запущен")
-            except Exception as e:
-                raise Exception(f"Не удалось запустить ни Yandex, ни Chrome: {e}")
 
-        # Применяем антидетект скрипты
-        self.driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
-            "source": """
-                Object.defineProperty(navigator, 'webdriver', {get: () => undefined});
-                Object.defineProperty(navigator, 'plugins', {get: () => [1, 2, 3, 4, 5]});
-                Object.defineProperty(navigator, 'languages', {get: () => ['ru-RU', 'ru', 'en-US', 'en']});
-            """
-        })
+class AvitoParser(SiteParser):
+    """Парсер объявлений недвижимости Avito"""
 
-        return self.driver
+    SITE = "avito"
+    BASE_URL = "https://www.avito.ru/"
+    FIELDS = {
+        "title": [
+            "[data-marker='item-view/title-info'] h1",
+            "h1[itemprop='name']",
+            ".title-info-title span",
+            "h1"
+        ],
+        "address": [
+            "[data-marker='delivery/location']",
+            "[itemprop='address']",
+            ".style-item-address__string",
+        ],
+        "description": [
+            "[data-marker='item-view/item-description']",
+            "[itemprop='description']",
+            ".item-description-text",
+        ],
+        "seller_name": [
+            "[data-marker='seller-info/name']",
+            ".seller-info-name",
+            "[class*='seller-info'] a"
+        ],
+        "published_date": [
+            "[data-marker='item-view/item-date']",
+            ".style-item-metadata-date",
+            "[class*='date-info']"
+        ],
+    }
+    POSTPROCESS = {"address": "_clean_address"}
+    PARAM_SELECTORS = ["[data-marker='item-view/item-params'] li, [class*='params-paramsList'] li"]
+    CONTENT_SELECTOR = "[data-marker='item-view/title-info'], h1"
+    NOT_FOUND_PHRASES = [
+        "такой страницы не существует",
+        "страница не найдена",
+        "объявление не найдено",
+    ]
+    BLOCK_PHRASES = [
+        "подтвердите, что вы не робот",
+        "доступ ограничен",
+        "заблокирован",
+        "access denied",
+        "проверка безопасности"
+    ]
+    LOAD_DELAY = 2
 
     def _wait_for_page_load(self, timeout=60):
         """Циклическая проверка tooltip каждые 3 секунды"""
         max_attempts = 20
 
         for attempt in range(1, max_attempts + 1):
-            print(f"  Попытка {attempt}/{max_attempts}: ждём 2 сек...")
+            log.debug("  Попытка %s/%s: ждём 2 сек...", attempt, max_attempts)
+            if attempt > 1:
+                metrics.RETRIES.inc(site=self.SITE, stage="readiness")
             time.sleep(1)
 
             try:
@@ -135,7 +108,7 @@ class AvitoParser:
                 if not elements:
                     raise Exception("История цены не найдена")
             except Exception as e:
-                print(str(e))
+                log.debug("%s", e)
                 break
 
             # Проверяем tooltip
@@ -152,7 +125,7 @@ class AvitoParser:
                         elements = self.driver.find_elements(By.XPATH,
                                                              "//*[contains(text(), 'История цены')]")
                 except Exception as e:
-                    print(str(e))
+                    log.debug("%s", e)
 
                 for el in elements:
                     try:
@@ -171,21 +144,21 @@ class AvitoParser:
                             for t in tooltips:
                                 try:
                                     if t.is_displayed() and '₽' in t.text:
-                                        print("  ✓ Tooltip найден, начинаем парсинг")
+                                        log.debug("  ✓ Tooltip найден, начинаем парсинг")
                                         return True # Успех!
                                 except:
                                     continue
 
                             actions.move_by_offset(300, 300).perform()
-                            print(f"  ⚠ Tooltip не появился (попытка {attempt})")
+                            log.debug("  ⚠ Tooltip не появился (попытка %s)", attempt)
                             break
                     except:
                         continue
                 else:
-                    print(f"  ⚠ Элемент 'История цены' не найден (попытка {attempt})")
+                    log.debug("  ⚠ Элемент 'История цены' не найден (попытка %s)", attempt)
 
             except Exception as e:
-                print(f"  ⚠ Ошибка попытки {attempt}: {e}")
+                log.debug("  ⚠ Ошибка попытки %s: %s", attempt, e)
 
         try:
             # Ждём только interactive, не complete
@@ -193,7 +166,7 @@ class AvitoParser:
                 lambda d: d.execute_script("return document.readyState") in ["interactive", "complete"]
             )
         except TimeoutException:
-            print("  Таймаут базовой загрузки")
+            log.warning("  Таймаут базовой загрузки")
 
         return False
 
@@ -210,12 +183,17 @@ class AvitoParser:
 
         return content_container
 
+    def _remove_ads(self, content_container):
+        """Удаляет рекламные блоки из контейнера (одним вызовом)"""
+        try:
+            self.driver.execute_script("""
+                arguments[0].querySelectorAll(arguments[1]).forEach(function(el) { el.remove(); });
+            """, content_container, ", ".join(ADS_SELECTORS))
+        except Exception:
+            pass
+
     def _get_price_history_and_screenshot(self, address_ad):
         """Получение истории цен + скриншот tooltip, обрезанный по контейнеру контента"""
-        import time
-        import re
-        from PIL import Image
-        from selenium.webdriver.common.by import By
         from selenium.webdriver.common.action_chains import ActionChains
 
         price_history = []
@@ -246,66 +224,26 @@ class AvitoParser:
                 hover_element
             )
         except Exception as e:
-            print(str(e))
+            log.debug("%s", e)
 
 
         try:
             driver = self.driver
             content_container = self._get_main_container()
 
-            try:
-                ads_selectors = [
-                    "div[class*='item-view-ads']",
-                    "div[class*='ads']",
-                    "div[data-marker*='ads']"
-                ]
-
-                for selector in ads_selectors:
-                    ads = content_container.find_elements(By.CSS_SELECTOR, selector)
-                    for ad in ads:
-                        self.driver.execute_script("arguments[0].remove();", ad)
-
-            except Exception:
-                pass
+            self._remove_ads(content_container)
 
             ActionChains(self.driver).move_to_element(hover_element).perform()
 
             time.sleep(1)
 
-            ad_folder = self.images_dir / str(address_ad)
-            ad_folder.mkdir(parents=True, exist_ok=True)
-
-            full_path = ad_folder / "_tmp_full.png"
-            driver.save_screenshot(str(full_path))
+            if self.defer_screenshots and self.snapshot_archive:
+                self._deferred = self._capture_for_render(address_ad)
 
-            rect = driver.execute_script("""
-                var r = arguments[0].getBoundingClientRect();
-                return {left:r.left, top:r.top, width:r.width, height:r.height};
-            """, content_container)
-
-            dpr = driver.execute_script("return window.devicePixelRatio || 1;")
-
-            left = int(rect["left"] * dpr)
-            top = int(rect["top"] * dpr)
-            right = int((rect["left"] + rect["width"]) * dpr)
-            bottom = int((rect["top"] + rect["height"]) * dpr)
-
-            img = Image.open(full_path)
-            img_w, img_h = img.size
-
-            # 🔧 защита от чёрных прямоугольников
-            left = max(0, left)
-            top = max(0, top)
-            right = min(img_w, right)
-            bottom = min(img_h, bottom)
-
-            final_path = ad_folder / "история цены.png"
-            img.crop((left, top, right, bottom)).save(final_path)
-            screenshot_path = str(final_path)
-
-            full_path.unlink(missing_ok=True)
-
-            print(f"  ✓ Скриншот (история цены): {final_path.name}")
+            if self._deferred is None:
+                ad_folder = self._ad_folder(address_ad)
+                screenshot_path = self._screenshot_region(ad_folder, "история цены.png", content_container)
+                log.debug("  ✓ Скриншот (история цены): история цены.png")
 
             tooltip_selectors = [
                 "[class*='tooltip']", "[class*='Tooltip']", "[class*='popup']",
@@ -326,99 +264,33 @@ class AvitoParser:
                     break
 
             if tooltip:
-                text = tooltip.text.replace("\xa0", " ")
-                text = re.sub(r"\s+", " ", text).strip()
-                tokens = text.split(" ")
-
-                i = 0
-                while i < len(tokens):
-                    if (
-                            i + 2 < len(tokens)
-                            and re.match(r"\d{1,2}", tokens[i])
-                            and re.match(r"[А-Яа-я]+", tokens[i + 1])
-                            and re.match(r"\d{4}", tokens[i + 2])
-                    ):
-                        date = f"{tokens[i]} {tokens[i + 1]} {tokens[i + 2]}"
-                        i += 3
-
-                        num_parts = []
-                        while i < len(tokens) and tokens[i].isdigit():
-                            num_parts.append(tokens[i])
-                            i += 1
-
-                        if i < len(tokens) and tokens[i] == "₽":
-                            price = int("".join(num_parts))
-                            price_history.append({"date": date, "price": price})
-                            i += 1
-
-                    i += 1
-
-                print(f"  ✓ История цен: {len(price_history)} записей")
+                price_history = parse_price_history(tooltip.text)
+                log.debug("  ✓ История цен: %s записей", len(price_history))
 
             ActionChains(driver).move_by_offset(300, 300).perform()
             time.sleep(0.3)
 
         except Exception as e:
-            print(f"  ✗ Ошибка истории цен: {e}")
+            log.error("  ✗ Ошибка истории цен: %s", e)
 
         return price_history, screenshot_path
 
+    def _capture_for_render(self, address_ad):
+        """Отложенный режим: реклама удаляется до снимка, как перед скриншотами"""
+        try:
+            self._remove_ads(self._get_main_container())
+        except Exception:
+            pass
+        return super()._capture_for_render(address_ad)
+
     def _take_top_screenshot(self, address_ad):
 
         try:
-            driver = self.driver
-
             content_container = self._get_main_container()
+            self._remove_ads(content_container)
 
-            try:
-                ads_selectors = [
-                    "div[class*='item-view-ads']",
-                    "div[class*='ads']",
-                    "div[data-marker*='ads']"
-                ]
-
-                for selector in ads_selectors:
-                    ads = content_container.find_elements(By.CSS_SELECTOR, selector)
-                    for ad in ads:
-                        self.driver.execute_script("arguments[0].remove();", ad)
-
-            except Exception:
-                pass
-
-            ad_folder = self.images_dir / str(address_ad)
-            ad_folder.mkdir(parents=True, exist_ok=True)
-
-            full_path = ad_folder / "_tmp_full.png"
-            driver.save_screenshot(str(full_path))
-
-            rect = driver.execute_script("""
-                            var r = arguments[0].getBoundingClientRect();
-                            return {left:r.left, top:r.top, width:r.width, height:r.height};
-                        """, content_container)
-
-            dpr = driver.execute_script("return window.devicePixelRatio || 1;")
-
-            left = int(rect["left"] * dpr)
-            top = int(rect["top"] * dpr)
-            right = int((rect["left"] + rect["width"]) * dpr)
-            bottom = int((rect["top"] + rect["height"]) * dpr)
-
-            img = Image.open(full_path)
-            img_w, img_h = img.size
-
-            # 🔧 защита от чёрных прямоугольников
-            left = max(0, left)
-            top = max(0, top)
-            right = min(img_w, right)
-            bottom = min(img_h, bottom)
-
-            final_path = ad_folder / "титул.png"
-            img.crop((left, top, right, bottom)).save(final_path)
-            screenshot_path = str(final_path)
-
-            full_path.unlink(missing_ok=True)
-
-            return screenshot_path
+            ad_folder = self._ad_folder(address_ad)
+            return self._screenshot_region(ad_folder, "титул.png", content_container)
         except:
             pass
 
@@ -428,13 +300,7 @@ class AvitoParser:
             driver = self.driver
 
             # Удаляем калькулятор ипотеки если есть
-            try:
-                mortgage_calc = driver.find_element(By.CSS_SELECTOR, "div#MortgageCalculatorNode")
-                driver.execute_script("arguments[0].remove();", mortgage_calc)
-                print("  ℹ Калькулятор ипотеки удалён")
-                time.sleep(0.2)
-            except Exception:
-                pass
+            self._remove_mortgage_calculator()
 
             # Ищем блок с картой
             map_element = driver.find_element(By.CSS_SELECTOR, "div[data-marker*='item-map-wrapper']").find_element(By.XPATH, "..")
@@ -448,61 +314,17 @@ class AvitoParser:
             # Получаем контейнер контента (для удаления рекламы)
             content_container = self._get_main_container()
 
-            # Удаляем рекламу
-            try:
-                ads_selectors = [
-                    "div[class*='item-view-ads']",
-                    "div[class*='ads']",
-                    "div[data-marker*='ads']"
-                ]
-                for selector in ads_selectors:
-                    ads = content_container.find_elements(By.CSS_SELECTOR, selector)
-                    for ad in ads:
-                        driver.execute_script("arguments[0].remove();", ad)
-            except Exception:
-                pass
-
-            ad_folder = self.images_dir / str(address_ad)
-            ad_folder.mkdir(parents=True, exist_ok=True)
-
-            # Делаем полный скриншот
-            full_path = ad_folder / "_tmp_address.png"
-            driver.save_screenshot(str(full_path))
-
-            # Получаем координаты БЛОКА КАРТЫ (а не всего контейнера!)
-            rect = driver.execute_script("""
-                var r = arguments[0].getBoundingClientRect();
-                return {left:r.left, top:r.top, width:r.width, height:r.height};
-            """, map_element)
-
-            dpr = driver.execute_script("return window.devicePixelRatio || 1;")
-
-            left = int(rect["left"] * dpr)
-            top = int(rect["top"] * dpr)
-            right = int((rect["left"] + rect["width"]) * dpr)
-            bottom = int((rect["top"] + rect["height"]) * dpr)
-
-            img = Image.open(full_path)
-            img_w, img_h = img.size
-
-            # Защита от выхода за границы
-            left = max(0, left)
-            top = max(0, top)
-            right = min(img_w, right)
-            bottom = min(img_h, bottom)
-
-            # Сохраняем обрезанный скриншот
-            final_path = ad_folder / "адрес.png"
-            img.crop((left, top, right, bottom)).save(final_path)
-            screenshot_path = str(final_path)
+            self._remove_ads(content_container)
 
-            full_path.unlink(missing_ok=True)
+            # Обрезаем по БЛОКУ КАРТЫ (а не всему контейнеру!)
+            ad_folder = self._ad_folder(address_ad)
+            screenshot_path = self._screenshot_region(ad_folder, "адрес.png", map_element, "_tmp_address.png")
 
-            print(f"  ✓ Скриншот (адрес): {final_path.name}")
+            log.debug("  ✓ Скриншот (адрес): адрес.png")
             return screenshot_path
 
         except Exception as e:
-            print(f"  ✗ Ошибка скриншота адреса: {e}")
+            log.error("  ✗ Ошибка скриншота адреса: %s", e)
             return None
 
     def _take_bottom_screenshot(self, address_ad):
@@ -512,16 +334,10 @@ class AvitoParser:
         2) если дата не видна — контейнер после прокрутки вниз
         Все скрины обрезаются по контейнеру контента
         """
-        import time
-        from selenium.webdriver.common.by import By
-        from selenium.common.exceptions import NoSuchElementException
-        from PIL import Image
-
         screenshots = []
         has_location_and_date = False
         try:
-            ad_folder = self.images_dir / str(address_ad)
-            ad_folder.mkdir(parents=True, exist_ok=True)
+            ad_folder = self._ad_folder(address_ad)
 
             driver = self.driver
 
@@ -530,21 +346,7 @@ class AvitoParser:
             # ========================================
             content_container = self._get_main_container()
 
-            # ========================================
-            # 2 Удаляем рекламу (если есть)
-            # ========================================
-            try:
-                ads_selectors = [
-                    "div[class*='item-view-ads']",
-                    "div[class*='ads']",
-                    "div[data-marker*='ads']"
-                ]
-                for selector in ads_selectors:
-                    ads = content_container.find_elements(By.CSS_SELECTOR, selector)
-                    for ad in ads:
-                        driver.execute_script("arguments[0].remove();", ad)
-            except Exception:
-                pass
+            self._remove_ads(content_container)
 
             # ========================================
             # 3 Скролл к описанию
@@ -568,33 +370,7 @@ class AvitoParser:
             # ========================================
             # 4 Скрин №1 — описание (через save+crop)
             # ========================================
-            first_full_path = ad_folder / "_tmp_full.png"
-            driver.save_screenshot(str(first_full_path))
-
-            rect = driver.execute_script("""
-                var r = arguments[0].getBoundingClientRect();
-                return {left:r.left, top:r.top, width:r.width, height:r.height};
-            """, content_container)
-
-            dpr = driver.execute_script("return window.devicePixelRatio || 1;")
-
-            left = int(rect["left"] * dpr)
-            top = int(rect["top"] * dpr)
-            right = int((rect["left"] + rect["width"]) * dpr)
-            bottom = int((rect["top"] + rect["height"]) * dpr)
-
-            img = Image.open(first_full_path)
-            img_w, img_h = img.size
-
-            left = max(0, left)
-            top = max(0, top)
-            right = min(img_w, right)
-            bottom = min(img_h, bottom)
-
-            first_cropped_path = ad_folder / "описание.png"
-            img.crop((left, top, right, bottom)).save(first_cropped_path)
-            screenshots.append(str(first_cropped_path))
-            first_full_path.unlink(missing_ok=True)
+            screenshots.append(self._screenshot_region(ad_folder, "описание.png", content_container))
 
             # ========================================
             # 5 Проверяем дату публикации
@@ -631,180 +407,46 @@ class AvitoParser:
                 driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
                 time.sleep(0.5)
 
-                second_full_path = ad_folder / "_tmp_full2.png"
-                driver.save_screenshot(str(second_full_path))
-
-                rect = driver.execute_script("""
-                    var r = arguments[0].getBoundingClientRect();
-                    return {left:r.left, top:r.top, width:r.width, height:r.height};
-                """, content_container)
-
-                dpr = driver.execute_script("return window.devicePixelRatio || 1;")
-
-                left = int(rect["left"] * dpr)
-                top = int(rect["top"] * dpr)
-                right = int((rect["left"] + rect["width"]) * dpr)
-                bottom = int((rect["top"] + rect["height"]) * dpr)
-
-                img = Image.open(second_full_path)
-                img_w, img_h = img.size
-
-                left = max(0, left)
-                top = max(0, top)
-                right = min(img_w, right)
-                bottom = min(img_h, bottom)
-
-                second_cropped_path = ad_folder / "дата_публикации.png"
-                img.crop((left, top, right, bottom)).save(second_cropped_path)
-                screenshots.append(str(second_cropped_path))
-                second_full_path.unlink(missing_ok=True)
+                screenshots.append(
+                    self._screenshot_region(ad_folder, "дата_публикации.png", content_container, "_tmp_full2.png")
+                )
 
             return screenshots, has_location_and_date
 
         except Exception as e:
-            print(f"✗ Ошибка _take_bottom_screenshot: {e}")
+            log.error("✗ Ошибка _take_bottom_screenshot: %s", e)
             return screenshots, has_location_and_date
 
-    def continue_after_captcha(self):
-        self._wait_for_user = False
-
-    def _slow_pause(self, message=""):
-        if self.slow_mode:
-            if message:
-                print(f"  [SLOW MODE] {message}")
-            time.sleep(self.slow_delay)
-
-    def _extract_text(self, selectors, default=""):
-        for selector in selectors:
-            try:
-                el = self.driver.find_element(By.CSS_SELECTOR, selector)
-                text = el.text.strip()
-                if text:
-                    return text
-            except NoSuchElementException:
-                continue
-        return default
-
-    def _parse_price(self, price_text):
-        if not price_text:
-            return None, None
-
-        numbers = re.findall(r'[\d\s]+', price_text)
-        if numbers:
-            price_str = numbers[0].replace(' ', '').replace('\xa0', '')
-            try:
-                price = int(price_str)
-            except ValueError:
-                price = None
-        else:
-            price = None
-
-        price_type = "месяц"
-        if "м²" in price_text or "м2" in price_text:
-            price_type = "м²/месяц"
-        elif "год" in price_text:
-            price_type = "год"
-
-        return price, price_type
-
     def _convert_to_max_quality(self, url):
         if not url:
             return None
 
         # Убираем query-параметры размера
-        converted = re.sub(r'[?&]s=\d+x\d+', '', url)
-        converted = re.sub(r'[?&]w=\d+', '', converted)
-        converted = re.sub(r'[?&]h=\d+', '', converted)
+        converted = IMAGE_SIZE_PARAMS_RE.sub('', url)
 
         if converted.endswith('?'):
             converted = converted[:-1]
 
         return converted
 
-    def _extract_params(self):
-        params = {}
-        try:
-            param_items = self.driver.find_elements(By.CSS_SELECTOR,
-                "[data-marker='item-view/item-params'] li, [class*='params-paramsList'] li")
-
-            for item in param_items:
-                text = item.text.strip()
-                if ':' in text:
-                    key, value = text.split(':', 1)
-                    params[key.strip()] = value.strip()
-                elif '\n' in text:
-                    parts = text.split('\n')
-                    if len(parts) >= 2:
-                        params[parts[0].strip()] = parts[1].strip()
-        except:
-            pass
-        return params
-
     def extract_price_per_m2(self, price_info: str):
-        if not price_info:
-            return None
-        match = re.search(r'([\d\s]+)\s*₽', price_info)
-        if match:
-            try:
-                if 'за сотку' in price_info:
-                    return float(match.group(1).replace(" ", "")) / 100
-                if 'за гектар' in price_info:
-                    return float(match.group(1).replace(" ", "")) * 10000
-                if 'в год' in price_info:
-                    return float(match.group(1).replace(" ", "")) / 12
-                return float(match.group(1).replace(" ", ""))
-            except:
-                pass
-        return None
+        return price_per_m2_from_info(price_info)
 
     def _remove_mortgage_calculator(self):
         """Удаляет калькулятор ипотеки со страницы"""
         try:
             mortgage_calc = self.driver.find_element(By.CSS_SELECTOR, "div#MortgageCalculatorNode")
             self.driver.execute_script("arguments[0].remove();", mortgage_calc)
-            print("  ℹ Калькулятор ипотеки удалён")
+            log.debug("  ℹ Калькулятор ипотеки удалён")
             time.sleep(0.2)
         except Exception:
             pass
 
         except Exception as e:
-            print(f"  ✗ Ошибка парсинга цены: {e}")
+            log.error("  ✗ Ошибка парсинга цены: %s", e)
             return None, None
-    @staticmethod
-    async def _download_image(session, url, path):
-        try:
-            async with session.get(url) as resp:
-                if resp.status == 200:
-                    data = await resp.read()
-                    with open(path, 'wb') as f:
-                        f.write(data)
-                    return True
-        except Exception as e:
-            print(f"  ✗ Ошибка загрузки {url}: {e}")
-        return False
-
-    async def _download_all_images(self, image_urls, ad_folder):
-        downloaded = set()
-        async with aiohttp.ClientSession() as session:
-            tasks = []
-            for i, url in enumerate(image_urls):
-                path = ad_folder / f"фото_{i + 1:03d}.jpg"
-                tasks.append(self._download_image(session, url, path))
-            results = await asyncio.gather(*tasks)
-            for i, (url, ok) in enumerate(zip(image_urls, results)):
-                if ok:
-                    downloaded.add(url)
-                    print(f"  ✓ Фото {i + 1}: загружено")
-        return downloaded
-
-    def _collect_and_download_images(self, address_ad):
-        """Листает галерею, собирает src изображений, скачивает асинхронно"""
-        from selenium.webdriver.common.by import By
-        import time
-
-        ad_folder = self.images_dir / str(address_ad)
-        ad_folder.mkdir(parents=True, exist_ok=True)
-
+    def _collect_image_urls(self):
+        """Листает галерею и собирает src изображений в максимальном качестве"""
         image_urls = []
         seen_urls = set()
 
@@ -859,67 +501,67 @@ class AvitoParser:
             except Exception:
                 break
 
-        print(f"  ✓ Найдено изображений: {len(image_urls)}")
+        return image_urls
+
+    def _clean_address(self, address):
+        """Убирает из адреса строки с расстоянием до метро ('5 мин.')"""
+        result = ""
+        for s in address.split('\n'):
+            if 'мин.' not in s:
+                result = result + s + " "
+        return result.strip()
+
+    def _fill_derived_fields(self, data):
+        """Площадь, площадь участка и пересчёт цены по уже извлечённым title, params и price"""
+        params = data["params"]
+        area = area_from_text(data.get("title", "") + str(params))
+        if area is not None:
+            data["area_m2"] = area
+        total_area = first_number(params.get("Общая площадь"))
+        if total_area is not None:
+            data["area_m2"] = total_area
+
+        plot = plot_area_m2(params.get("Площадь участка"))
+        if plot is not None:
+            params["Площадь участка"] = plot
+        plot = plot_area_m2(params.get("Площадь"))
+        if plot is not None:
+            params["Площадь участка"] = plot
+            if not data.get("area_m2"):
+                data["area_m2"] = plot
+
+        # Если в объявлении указана только цена за м² (в месяц или в год — parse_price привёл к месяцу)
+        if data.get("price_type") == "м²/месяц":
+            if area is not None and data.get("price"):
+                data["price"] = round(data["price"] * data["area_m2"], 1)
+        if not data.get('price_per_m2') and data.get('area_m2', False) and data.get("price"):
+            data["price_per_m2"] = int(data["price"] / data["area_m2"])
 
-        if not image_urls:
-            return set()
+        # Дата публикации и даты истории цен в ISO
+        normalize_dates(data)
 
-        # Асинхронная загрузка
-        downloaded = asyncio.run(self._download_all_images(image_urls, ad_folder))
-        print(f"  ✓ Загружено: {len(downloaded)}/{len(image_urls)}")
-        return downloaded
+        return data
 
     def parse_ad(self, url):
-        if not self.driver:
-            self._setup_driver()
-
-        print(f"\nПарсинг: {url}")
+        log.info("Парсинг: %s", url)
 
-        ad_id_match = re.search(r'_(\d+)(?:\?|$)', url)
+        ad_id_match = AD_ID_RE.search(url)
         ad_id = ad_id_match.group(1) if ad_id_match else hashlib.md5(url.encode()).hexdigest()[:10]
 
-        self.driver.get(url)
-        time.sleep(2)
-
-        # Проверяем капчу/блокировку по реальным признакам
-        page_text = self.driver.find_element(By.TAG_NAME, "body").text.lower()
-
-        if (
-                "такой страницы не существует" in page_text
-                or "страница не найдена" in page_text
-                or "объявление не найдено" in page_text
-        ):
-            return {
-                "url": url,
-                "page_not_found": True
-            }
-
-        is_blocked = any(phrase in page_text for phrase in [
-            "подтвердите, что вы не робот",
-            "доступ ограничен",
-            "заблокирован",
-            "access denied",
-            "проверка безопасности"
-        ])
-
-        # Также проверяем отсутствие основного контента
-        try:
-            self.driver.find_element(By.CSS_SELECTOR, "[data-marker='item-view/title-info'], h1")
-            has_content = True
-        except:
-            has_content = False
-
-        if is_blocked or not has_content:
-            self._wait_for_user = True
-
-            if self.on_captcha:
-                self.on_captcha()
-
-            while self._wait_for_user:
-                time.sleep(0.3)
+        not_found = self._open_ad(url)
+        if not_found:
+            return not_found
 
+        with span("readiness"):
             getHistory = self._wait_for_page_load()
-        getHistory = self._wait_for_page_load()
+        page_metrics = self._collect_page_metrics()
+
+        # Снимок до изменений DOM (зум, удаление рекламы) — для повторного разбора офлайн.
+        # В отложенном режиме снимок делается позже, в момент скриншотов
+        snapshot = None
+        if self.snapshot_archive and not self.defer_screenshots:
+            with span("snapshot"):
+                snapshot = self.snapshot_archive.capture(self.driver, url)
 
         self.driver.execute_script("document.body.style.zoom='80%'")
         self._remove_mortgage_calculator()
@@ -929,13 +571,12 @@ class AvitoParser:
             "url": url,
             "parsed_at": datetime.now().isoformat(),
         }
+        if snapshot:
+            data["snapshot"] = snapshot
+        data["page_metrics"] = page_metrics
 
-        data["title"] = self._extract_text([
-            "[data-marker='item-view/title-info'] h1",
-            "h1[itemprop='name']",
-            ".title-info-title span",
-            "h1"
-        ])
+        # Заголовок и адрес — одним вызовом браузера
+        data.update(self._extract_fields("title", "address"))
 
         price_text_el = self.driver.find_element(By.CSS_SELECTOR, "[id*='item-price-value']")
         price_text = self.driver.execute_script("return arguments[0].innerText;", price_text_el).replace('\xa0', ' ').replace('\n', ' ').strip()
@@ -977,130 +618,52 @@ class AvitoParser:
             pass
 
 
-        data["address"] = self._extract_text([
-            "[data-marker='delivery/location']",
-            "[itemprop='address']",
-            ".style-item-address__string",
-        ])
-
-        split_address = data['address'].split('\n')
-        address = ""
-
-        for idx, s in enumerate(split_address):
-            if 'мин.' not in s:
-                address = address + s + " "
-        data['address'] = address.strip()
+        screenshot_id = data['title'] + data['address'].replace("\n", " ")
 
         # История цен + скриншот с tooltip
-        print("  Получение истории цен и скриншота...")
-        print(f"getHist:{getHistory}")
+        log.debug("  Получение истории цен и скриншота...")
+        log.debug("  История цены в tooltip: %s", getHistory)
+        self._deferred = None
         if getHistory:
-            data["price_history"], top_screenshot = self._get_price_history_and_screenshot(data['title'] + data['address'].replace("\n", " "))
+            with span("price_history"):
+                data["price_history"], top_screenshot = self._get_price_history_and_screenshot(screenshot_id)
+        elif self.defer_screenshots and self.snapshot_archive:
+            self._deferred = self._capture_for_render(screenshot_id)
+            top_screenshot = None if self._deferred else self._take_top_screenshot(screenshot_id)
         else:
-            top_screenshot = self._take_top_screenshot(data['title'] + data['address'].replace("\n", " "))
-
-        data["description"] = self._extract_text([
-            "[data-marker='item-view/item-description']",
-            "[itemprop='description']",
-            ".item-description-text",
-        ])
+            top_screenshot = self._take_top_screenshot(screenshot_id)
 
+        data.update(self._extract_fields("description", "seller_name", "published_date"))
         data["params"] = self._extract_params()
 
-        area_match = re.search(r'(\d+[.,]?\d*)\s*м[²2]', data.get("title", "") + str(data.get("params", {})))
-        if area_match:
-            data["area_m2"] = float(area_match.group(1).replace(',', '.'))
-        if data["params"].get("Общая площадь"):
-            data["area_m2"] = float(data["params"].get("Общая площадь").replace('м²', '').strip())
-
-        if data["params"].get("Площадь участка"):
-            if 'сот.' in data["params"].get("Площадь участка"):
-                data["params"]['Площадь участка'] = float(data["params"]['Площадь участка'].replace('сот.', '').strip()) * 100
-            elif 'га' in data["params"].get("Площадь участка"):
-                data["params"]['Площадь участка'] = float(
-                    data["params"]['Площадь участка'].replace('сот.', '').strip()) * 10000
-        if data["params"].get("Площадь"):
-            if 'сот.' in data["params"].get("Площадь"):
-                data["params"]["Площадь участка"] = float(data["params"]['Площадь'].replace('сот.', '').strip()) * 100
-            elif 'га' in data["params"].get("Площадь"):
-                data["params"]["Площадь участка"] = float(data["params"]['Площадь'].replace('сот.', '').strip()) * 10000
-
-        if not data.get("area_m2"):
-            sqr = data['params'].get("Площадь")
-            if 'га' in sqr:
-                data['area_m2'] = float(sqr.replace('га.', '').strip()) * 10000
-            if 'сот.' in sqr:
-                data['area_m2'] = float(sqr.replace('сот.', '').strip()) * 100
-
-        data["seller_name"] = self._extract_text([
-            "[data-marker='seller-info/name']",
-            ".seller-info-name",
-            "[class*='seller-info'] a"
-        ])
-
-        data["published_date"] = self._extract_text([
-            "[data-marker='item-view/item-date']",
-            ".style-item-metadata-date",
-            "[class*='date-info']"
-        ])
+        self._fill_derived_fields(data)
 
-        # Если в объявлении указана только цена за м2 в месяц
-        if "в месяц за м²" in data["price_text"]:
-            if area_match:
-                data["price"] = round(data["price"] * data["area_m2"], 1)
-        if not data['price_per_m2'] and data.get('area_m2', False):
-            data["price_per_m2"] = int(data["price"] / data["area_m2"])
-
-        address_screenshot = self._take_address_screenshot(
-            data['title'] + data['address'].replace("\n", " "))
+        if self._deferred:
+            # Скриншоты будут отрисованы из снимка при экспорте
+            data["screenshots"] = self._deferred
+            data["snapshot"] = self._deferred["snapshot"]
+        else:
+            with span("screenshots"):
+                address_screenshot = self._take_address_screenshot(screenshot_id)
 
-        bottom_screenshot, has_location_and_date = self._take_bottom_screenshot(data['title'] + data['address'].replace("\n", " "))
+                bottom_screenshot, has_location_and_date = self._take_bottom_screenshot(screenshot_id)
 
-        data["screenshots"] = {
-            "top": top_screenshot,
-            "bottom": bottom_screenshot,
-            "address": address_screenshot
-        }
+            data["screenshots"] = {
+                "top": top_screenshot,
+                "bottom": bottom_screenshot,
+                "address": address_screenshot
+            }
 
-        data["screenshots"]["has_location_and_date"] = has_location_and_date
+            data["screenshots"]["has_location_and_date"] = has_location_and_date
 
         # Загрузка фотографий из галереи
         if self.download_photos:
-            print("  Загрузка фотографий...")
-            downloaded_images = self._collect_and_download_images(
-                data['title'] + data['address'].replace("\n", " ")
-            )
+            log.debug("  Загрузка фотографий...")
+            downloaded_images = self._collect_and_download_images(screenshot_id)
             data["images_count"] = len(downloaded_images)
 
-        print(f"  ✓ Заголовок: {data.get('title', 'Не найден')[:50]}...")
-        print(f"  ✓ Цена: {data.get('price', 'Не найдена')}")
-        print(f"  ✓ Изображений: {data.get('images_count', 0)}")
+        log.info("  ✓ Заголовок: %s...", data.get('title', 'Не найден')[:50])
+        log.info("  ✓ Цена: %s", data.get('price', 'Не найдена'))
+        log.info("  ✓ Изображений: %s", data.get('images_count', 0))
 
-        print(data)
         return data
-
-    def parse_multiple(self, urls):
-        results = []
-        for i, url in enumerate(urls, 1):
-            print(f"\n[{i}/{len(urls)}] ", end="")
-            try:
-                data = self.parse_ad(url)
-                results.append(data)
-                if i < len(urls):
-                    delay = 3 + (i % 3)
-                    print(f"  Пауза {delay} сек...")
-                    time.sleep(delay)
-            except Exception as e:
-                print(f"  ✗ Ошибка: {e}")
-                results.append({"url": url, "error": str(e)})
-        return results
-
-    def save_results(self, results, filename="avito_results.json"):
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
-        print(f"\nРезультаты сохранены в {filename}")
-
-    def close(self):
-        if self.driver:
-            self.driver.quit()
-            self.driver = None
\ No newline at end of file
@@ -0,0 +1,255 @@
+"""
+Benchmark
+Воспроизводимый замер скорости парсеров на локальном сайте (fixture_site).
+
+Оба парсера запускаются без окна (headless) против записанных страниц,
+поэтому результат не зависит от сети, блокировок и изменений на сайтах:
+удобно сравнивать до/после оптимизаций.
+
+В отчёте по каждому сайту:
+    ads_per_min          — объявлений в минуту (без запуска браузера)
+    phases               — p50/p90/сумма по этапам из timing-спанов
+                           (navigation, readiness, price_history, screenshots…)
+    screenshot_bytes     — объём скриншотов на объявление
+    errors               — ошибки и пустые поля
+
+Капча на фикстурах «решается» автоматически: страница перезагружается,
+сервер со второго запроса отдаёт объявление.
+
+Запуск:
+    python fixture_site.py generate
+    python benchmark.py --rounds 3
+    python benchmark.py --http          — тот же набор через HttpFetcher
+                                          (браузер не нужен)
+Отчёт: Диагностика/benchmark_<время>.json
+"""
+
+import argparse
+import json
+import platform
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import applog
+from fixture_site import FIXTURES_DIR, FixtureServer
+from metrics import quantile
+from timing import DIAGNOSTICS_DIR, tracer
+
+log = applog.get_logger(__name__)
+
+SITES = ("avito", "cian")
+# Поля, которые должны быть заполнены на любой фикстуре объявления
+REQUIRED_FIELDS = ("title", "price", "address")
+
+
+def _create_parser(site, work_dir, photos=False):
+    """Парсер без окна и без постоянного профиля; все файлы — во временной папке"""
+    if site == "avito":
+        from avito_parser import AvitoParser
+        parser = AvitoParser(
+            headless=True, download_photos=photos, images_dir=work_dir / "Скриншоты",
+            persistent_profile=False,
+        )
+    else:
+        from cian_parser import CianParser
+        parser = CianParser(
+            headless=True, download_photos=photos, images_dir=work_dir / "Скриншоты",
+            persistent_profile=False,
+        )
+    # Не трогаем cookies и статистику селекторов пользователя
+    parser.cookie_jar = work_dir / f"{site}_cookies.json"
+    parser.selectors.path = work_dir / f"{site}_selectors.json"
+
+    def solve_captcha():
+        # Сервер фикстур отдаёт капчу один раз — повторная загрузка её «решает»
+        def solve():
+            parser.driver.get(parser.driver.current_url)
+            parser.continue_after_captcha()
+        threading.Thread(target=solve, daemon=True).start()
+
+    parser.on_captcha = solve_captcha
+    if site == "cian":
+        parser.on_auth = solve_captcha
+    return parser
+
+
+def _screenshot_bytes(data):
+    total = 0
+    for path in (data.get("screenshots") or {}).values():
+        if isinstance(path, str) and Path(path).is_file():
+            total += Path(path).stat().st_size
+    return total
+
+
+def _check(data):
+    """Список проблем результата (пустые обязательные поля, ошибка)"""
+    if data.get("error"):
+        return [data["error"]]
+    if data.get("page_not_found"):
+        return []
+    return [f"нет поля {field}" for field in REQUIRED_FIELDS if data.get(field) in (None, "")]
+
+
+def _phase_stats(spans):
+    by_phase = {}
+    for span in spans:
+        by_phase.setdefault(span["name"], []).append(span["duration"])
+    stats = {}
+    for name, durations in sorted(by_phase.items()):
+        durations.sort()
+        stats[name] = {
+            "count": len(durations),
+            "p50": round(quantile(durations, 0.5), 3),
+            "p90": round(quantile(durations, 0.9), 3),
+            "total": round(sum(durations), 3),
+        }
+    return stats
+
+
+def run_browser(server, site, rounds, work_dir, defer=False, photos=False):
+    """Прогон одного сайта через parse_ad. Возвращает отчёт сайта"""
+    urls = server.urls(site)
+    parser = _create_parser(site, work_dir, photos=photos)
+    if defer:
+        # Отложенные скриншоты рисуются из снимков — архив во временной папке
+        from snapshot_archive import SnapshotArchive
+        parser.snapshot_archive = SnapshotArchive(work_dir / "_snapshots")
+        parser.defer_screenshots = True
+    results, problems = [], []
+
+    try:
+        # Запуск браузера не входит в замер пропускной способности
+        with tracer.span("browser_start"):
+            parser._setup_driver()
+        tracer.take()
+
+        started = time.monotonic()
+        for round_number in range(rounds):
+            server.reset_captchas()
+            for url in urls:
+                try:
+                    data = parser.parse_ad(url)
+                except Exception as e:
+                    log.error("  ✗ %s: %s", url, e)
+                    data = {"url": url, "error": str(e)}
+                results.append(data)
+                problems.extend(f"{url}: {p}" for p in _check(data))
+        elapsed = time.monotonic() - started
+    finally:
+        parser.close()
+
+    spans = [s for s in tracer.take() if s["site"] == site]
+    screenshot_bytes = [_screenshot_bytes(d) for d in results if not d.get("error")]
+    return {
+        "mode": "browser",
+        "ads": len(results),
+        "seconds": round(elapsed, 3),
+        "ads_per_min": round(len(results) / elapsed * 60, 2) if elapsed else None,
+        "phases": _phase_stats(spans),
+        "screenshot_bytes": {
+            "total": sum(screenshot_bytes),
+            "per_ad": round(sum(screenshot_bytes) / len(screenshot_bytes)) if screenshot_bytes else 0,
+        },
+        "errors": problems,
+    }
+
+
+def run_http(server, site, rounds, work_dir):
+    """Тот же набор через HttpFetcher: скорость серверного разбора без браузера"""
+    from http_fetcher import HttpFetcher
+
+    urls = server.urls(site)
+    parser = _create_parser(site, work_dir)
+    fetcher = HttpFetcher({site: parser})
+    fetched, fallback = 0, 0
+
+    started = time.monotonic()
+    for round_number in range(rounds):
+        server.reset_captchas()
+        results, needs_browser = fetcher.fetch_many(urls)
+        fetched += len(results)
+        fallback += len(needs_browser)
+    elapsed = time.monotonic() - started
+
+    return {
+        "mode": "http",
+        "ads": fetched,
+        "fallback": fallback,
+        "seconds": round(elapsed, 3),
+        "ads_per_min": round(fetched / elapsed * 60, 2) if elapsed else None,
+    }
+
+
+def run(sites=SITES, rounds=1, fixtures=FIXTURES_DIR, http=False, defer=False, photos=False):
+    server = FixtureServer(fixtures).start()
+    work_dir = Path(tempfile.mkdtemp(prefix="benchmark_"))
+    report = {
+        "started_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "rounds": rounds,
+        "defer_screenshots": defer,
+        "download_photos": photos,
+        "sites": {},
+    }
+    try:
+        for site in sites:
+            if not server.urls(site):
+                log.warning("⚠ Нет фикстур %s в %s", site, fixtures)
+                continue
+            log.info("▶ %s: %s страниц × %s", site, len(server.urls(site)), rounds)
+            if http:
+                report["sites"][site] = run_http(server, site, rounds, work_dir)
+            else:
+                report["sites"][site] = run_browser(server, site, rounds, work_dir, defer=defer, photos=photos)
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return report
+
+
+def save_report(report, directory=DIAGNOSTICS_DIR):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def format_report(report):
+    lines = []
+    for site, result in report["sites"].items():
+        lines.append(f"{site} ({result['mode']}): {result['ads']} объявл. за {result['seconds']} с "
+                     f"— {result['ads_per_min']} в минуту")
+        if result["mode"] == "http":
+            lines.append(f"   нужен браузер: {result['fallback']}")
+            continue
+        for name, stats in result["phases"].items():
+            lines.append(f"   {name:<16} p50 {stats['p50']:>7} с  p90 {stats['p90']:>7} с  "
+                         f"всего {stats['total']:>8} с  ({stats['count']})")
+        lines.append(f"   скриншоты: {result['screenshot_bytes']['per_ad'] / 1024:.0f} КБ на объявление")
+        for problem in result["errors"]:
+            lines.append(f"   ✗ {problem}")
+    return lines
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Замер скорости парсеров на локальных фикстурах")
+    arg_parser.add_argument("--rounds", type=int, default=1, help="проходов по всем страницам")
+    arg_parser.add_argument("--sites", nargs="+", default=list(SITES), choices=SITES)
+    arg_parser.add_argument("--fixtures", default=str(FIXTURES_DIR))
+    arg_parser.add_argument("--http", action="store_true", help="через HttpFetcher, без браузера")
+    arg_parser.add_argument("--defer", action="store_true", help="отложенные скриншоты (из снимков страниц)")
+    arg_parser.add_argument("--photos", action="store_true", help="загружать фото галереи")
+    args = arg_parser.parse_args()
+
+    applog.setup()
+    benchmark_report = run(args.sites, args.rounds, args.fixtures, http=args.http, defer=args.defer, photos=args.photos)
+    for line in format_report(benchmark_report):
+        print(line)
+    print(f"✓ Отчёт: {save_report(benchmark_report)}")
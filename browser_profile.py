@@ -0,0 +1,77 @@
+"""
+Browser Profile
+Постоянные профили браузера и файл cookies для каждого сайта.
+
+Профиль (user-data-dir) сохраняет между запусками авторизацию, HTTP-кэш
+и service workers, поэтому сайты реже показывают капчу и не просят войти заново.
+Файл cookies — запасной вариант, когда профиль недоступен, и источник
+для восстановления сессии после перезапуска драйвера.
+"""
+
+import json
+from pathlib import Path
+
+import applog
+
+log = applog.get_logger(__name__)
+
+PROFILES_DIR = Path("Профили")
+
+
+def profile_dir(site):
+    """Каталог user-data-dir для сайта (создаётся при необходимости)"""
+    path = (PROFILES_DIR / site).resolve()
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def cookie_jar_path(site):
+    PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+    return PROFILES_DIR / f"{site}_cookies.json"
+
+
+def save_cookies(driver, path):
+    """Выгрузка cookies текущей сессии в JSON. Возвращает число cookies"""
+    try:
+        cookies = driver.get_cookies()
+    except Exception as e:
+        log.debug("  ℹ Не удалось получить cookies: %s", e)
+        return 0
+
+    if not cookies:
+        return 0
+
+    tmp_path = Path(path).with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cookies, f, ensure_ascii=False)
+    tmp_path.replace(path)
+    return len(cookies)
+
+
+def load_cookies(driver, path, base_url):
+    """Восстановление cookies из JSON. Возвращает число добавленных cookies"""
+    path = Path(path)
+    if not path.exists():
+        return 0
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cookies = json.load(f)
+    except (OSError, ValueError) as e:
+        log.warning("  ℹ Файл cookies повреждён: %s", e)
+        return 0
+
+    if not cookies:
+        return 0
+
+    # Cookies можно добавить только находясь на странице домена
+    driver.get(base_url)
+
+    added = 0
+    for cookie in cookies:
+        try:
+            driver.add_cookie(cookie)
+            added += 1
+        except Exception:
+            continue
+    return added
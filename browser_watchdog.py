@@ -0,0 +1,66 @@
+"""
+Browser Watchdog
+Контроль памяти браузера и количества загруженных страниц для долгих сессий.
+
+Chrome со временем раздувает память рендерера, поэтому после заданного
+числа страниц или превышения порога RSS драйвер нужно перезапустить.
+Сам перезапуск выполняет парсер (recycle_driver), watchdog только решает когда.
+"""
+
+try:
+    import psutil
+except ImportError:  # без psutil работает только лимит по страницам
+    psutil = None
+
+
+class DriverWatchdog:
+    """Счётчик страниц и RSS процессов браузера"""
+
+    def __init__(self, max_rss_mb=1500, max_pages=60):
+        self.max_rss_mb = max_rss_mb
+        self.max_pages = max_pages
+        self.pages = 0
+        self.restarts = 0
+
+    def reset(self):
+        """Сброс счётчиков после перезапуска драйвера"""
+        self.pages = 0
+
+    def page_loaded(self):
+        self.pages += 1
+
+    def browser_rss_mb(self, driver):
+        """Суммарный RSS chromedriver и всех дочерних процессов браузера, МБ"""
+        if psutil is None or driver is None:
+            return None
+
+        try:
+            pid = driver.service.process.pid
+            root = psutil.Process(pid)
+            processes = [root] + root.children(recursive=True)
+        except Exception:
+            return None
+
+        total = 0
+        for proc in processes:
+            try:
+                total += proc.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+
+        return total / (1024 * 1024)
+
+    def check(self, driver):
+        """Возвращает причину перезапуска или None, если драйвер в порядке"""
+        if driver is None:
+            return None
+
+        if self.max_pages and self.pages >= self.max_pages:
+            return f"загружено страниц: {self.pages}"
+
+        if self.max_rss_mb:
+            rss = self.browser_rss_mb(driver)
+            if rss is not None and rss >= self.max_rss_mb:
+                return f"память браузера {rss:.0f} МБ"
+
+        return None
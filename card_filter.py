@@ -0,0 +1,63 @@
+"""
+Card Filter
+Предварительный отбор карточек выдачи до полного парсинга.
+
+Полный parse_ad со скриншотами занимает десятки секунд, поэтому объявления,
+которые по цене, площади или цене за м² заведомо не подходят в аналоги,
+отсеиваются по данным карточки. Если значения на карточке нет,
+объявление остаётся — решать будет полный парсинг.
+"""
+
+
+class CardFilter:
+    """Границы (включительно) для price, area_m2 и price_per_m2; None — без ограничения"""
+
+    FIELDS = ("price", "area_m2", "price_per_m2")
+
+    def __init__(self, min_price=None, max_price=None, min_area=None, max_area=None,
+                 min_price_per_m2=None, max_price_per_m2=None):
+        self.bounds = {
+            "price": (min_price, max_price),
+            "area_m2": (min_area, max_area),
+            "price_per_m2": (min_price_per_m2, max_price_per_m2),
+        }
+        self.pruned_by = dict.fromkeys(self.FIELDS, 0)
+
+    @property
+    def is_empty(self):
+        return all(low is None and high is None for low, high in self.bounds.values())
+
+    def rejects(self, card):
+        """Поле, по которому карточка не проходит, или None"""
+        for field in self.FIELDS:
+            low, high = self.bounds[field]
+            value = card.get(field)
+            if value is None:
+                continue
+            if low is not None and value < low:
+                return field
+            if high is not None and value > high:
+                return field
+        return None
+
+    def apply(self, cards):
+        """Возвращает (подходящие карточки, число отсеянных)"""
+        self.pruned_by = dict.fromkeys(self.FIELDS, 0)
+        if self.is_empty:
+            return list(cards), 0
+
+        kept = []
+        pruned = 0
+        for card in cards:
+            field = self.rejects(card)
+            if field:
+                self.pruned_by[field] += 1
+                pruned += 1
+            else:
+                kept.append(card)
+        return kept, pruned
+
+    def summary(self):
+        labels = {"price": "цена", "area_m2": "площадь", "price_per_m2": "цена за м²"}
+        parts = [f"{labels[f]}: {n}" for f, n in self.pruned_by.items() if n]
+        return ", ".join(parts)
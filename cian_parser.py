@@ -6,113 +6,88 @@ Cian Real Estate Parser
 pip install selenium webdriver-manager requests pillow
 """
 
-import os
-import sys
-import re
-import json
 import time
-import asyncio
-import aiohttp
 from datetime import datetime
-from pathlib import Path
-from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from webdriver_manager.chrome import ChromeDriverManager
-from PIL import Image
 
+import applog
+import metrics
+from site_engine import SiteParser
+from text_parsing import (
+    extract_num, first_number, normalize_dates, parse_price_history, plot_area_m2, price_per_m2_from_facts
+)
+from timing import span
 
-def resource_path(relative_path):
-    if hasattr(sys, "_MEIPASS"):
-        return os.path.join(sys._MEIPASS, relative_path)
-    return os.path.abspath(relative_path)
+log = applog.get_logger(__name__)
 
 
-class CianParser:
+class CianParser(SiteParser):
     """Парсер объявлений недвижимости Циан"""
 
-    def __init__(self, headless=False, download_images=True, download_photos=False, images_dir="Скриншоты", slow_mode=False, on_captcha=None, on_auth=None):
+    SITE = "cian"
+    BASE_URL = "https://www.cian.ru/"
+    FIELDS = {
+        "title": [
+            "h1[data-name='OfferTitle']",
+            "h1",
+            "[class*='title']"
+        ],
+        # Цена - из div data-name=PriceInfo
+        "price_text": [
+            "[data-name='PriceInfo']",
+            "[data-name='OfferPrice']",
+            "[class*='price-value']",
+            "[class*='price']",
+            "[itemprop='price']"
+        ],
+        "address": [
+            "[data-name='Geo']",
+            "[data-name='Address']",
+            "[itemprop='address']",
+            "[class*='address']"
+        ],
+        "description": [
+            "[data-name='Description']",
+            "[data-name='OfferCardDescription']",
+            "[itemprop='description']",
+            "[class*='description-text']"
+        ],
+        "published_date": [
+            "[data-name='PublicationDate']",
+            "[class*='publication-date']",
+            "[class*='offer-date']"
+        ],
+    }
+    POSTPROCESS = {"address": "_clean_address", "description": "_clean_description"}
+    PARAM_SELECTORS = [
+        "[data-name*='ObjectFactoids'] div",
+        "[class*='features'] li",
+        "[class*='offer-card-params'] li",
+        "[data-name='OfferCardFeatures'] li"
+    ]
+    CONTENT_SELECTOR = "h1, [data-name='OfferTitle']"
+    NOT_FOUND_PHRASES = [
+        "страница не найдена",
+        "объявление не найдено",
+        "не существует"
+    ]
+    BLOCK_PHRASES = [
+        "подтвердите, что вы не робот",
+        "доступ ограничен",
+        "заблокирован",
+        "access denied",
+        "проверка безопасности",
+        "captcha"
+    ]
+    CROP_MIN_SIZE = 100
+
+    def __init__(self, headless=False, download_images=True, download_photos=False, images_dir="Скриншоты", slow_mode=False, on_captcha=None, on_auth=None, persistent_profile=True, proxy_pool=None, snapshot_archive=None):
+        super().__init__(headless, download_images, download_photos, images_dir, slow_mode, on_captcha,
+                         persistent_profile, proxy_pool, snapshot_archive)
         self.download_images = download_images
-        self.images_dir = Path(images_dir)
-        self.driver = None
-        self.headless = headless
-        self.slow_mode = slow_mode
-        self.slow_delay = 0.4
-        self.on_captcha = on_captcha
         self.on_auth = on_auth
-        self._wait_for_user = False
-        self.browser_type = None
-        self.download_photos = download_photos
-
-        if download_images:
-            self.images_dir.mkdir(parents=True, exist_ok=True)
-
-    def _setup_driver(self):
-        """Настройка драйвера с fallback: Yandex → Chrome"""
-        options = Options()
-
-        if self.headless:
-            options.add_argument("--headless=new")
-
-        # Общие параметры для обоих браузеров
-        options.add_argument("--disable-blink-features=AutomationControlled")
-        options.add_argument("--disable-infobars")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-gpu")
-        options.add_argument("--window-size=1920,1080")
-        options.add_argument("--start-maximized")
-        options.add_argument("--lang=ru-RU")
-        options.add_argument('--disable-notifications')
-        options.add_argument('--disable-extensions')
-        options.add_argument(
-            "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-        options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        options.add_experimental_option("useAutomationExtension", False)
-        options.page_load_strategy = "eager"
-
-        # Попытка 1: Yandex Browser с yandexdriver.exe
-        yandex_driver_path = resource_path("yandexdriver.exe")
-
-        if os.path.exists(yandex_driver_path):
-            try:
-                print("🔍 Найден yandexdriver.exe, запускаю Yandex Browser...")
-                service = Service(yandex_driver_path)
-                self.driver = webdriver.Chrome(service=service, options=options)
-                self.browser_type = "yandex"
-                print("✓ Yandex Browser успешно запущен")
-            except Exception as e:
-                print(f"✗ Ошибка запуска Yandex Browser: {e}")
-                print("↻ Переключаюсь на Chrome...")
-                self.driver = None
-        else:
-            print(f"ℹ yandexdriver.exe не найден по пути: {yandex_driver_path}")
-            print("↻ Переключаюсь на Chrome...")
-
-        # Попытка 2: Chrome (если Yandex не запустился)
-        if self.driver is None:
-            try:
-                print("🔍 Запускаю Chrome...")
-                service = Service(ChromeDriverManager().install())
-                self.driver = webdriver.Chrome(service=service, options=options)
-                self.browser_type = "chrome"
-                print("✓ Chrome успешно запущен")
-            except Exception as e:
-                raise Exception(f"Не удалось запустить ни Yandex, ни Chrome: {e}")
-
-        # Применяем антидетект скрипты
-        self.driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
-            "source": """
-                Object.defineProperty(navigator, 'webdriver', {get: () => undefined});
-                Object.defineProperty(navigator, 'plugins', {get: () => [1, 2, 3, 4, 5]});
-                Object.defineProperty(navigator, 'languages', {get: () => ['ru-RU', 'ru', 'en-US', 'en']});
-            """
-        })
-
-        return self.driver
 
     def _wait_for_page_load(self, timeout=30):
         """Ожидание загрузки страницы Циан"""
@@ -123,7 +98,7 @@ class CianParser:
             time.sleep(0.5)
             return True
         except TimeoutException:
-            print("  Таймаут загрузки страницы")
+            log.warning("  Таймаут загрузки страницы")
             return False
 
     def _check_authorization(self):
@@ -131,14 +106,14 @@ class CianParser:
         try:
             user_related = self.driver.find_element(By.CSS_SELECTOR, "[data-name='UserRelated']")
             if "Войти" in user_related.text:
-                print("  ⚠ Требуется авторизация")
+                log.warning("  ⚠ Требуется авторизация")
                 return False
             return True
         except NoSuchElementException:
             # Элемент не найден - считаем что авторизован
             return True
         except Exception as e:
-            print(f"  ℹ Ошибка проверки авторизации: {e}")
+            log.debug("  ℹ Ошибка проверки авторизации: %s", e)
             return True
 
     def _expand_description(self):
@@ -173,7 +148,7 @@ class CianParser:
 
                                 # Кликаем через JavaScript
                                 self.driver.execute_script("arguments[0].click();", button)
-                                print("  ✓ Описание раскрыто")
+                                log.debug("  ✓ Описание раскрыто")
                                 time.sleep(0.5)
                                 return True
                         except:
@@ -181,10 +156,10 @@ class CianParser:
                 except:
                     continue
 
-            print("  ℹ Кнопка раскрытия описания не найдена или не требуется")
+            log.debug("  ℹ Кнопка раскрытия описания не найдена или не требуется")
 
         except Exception as e:
-            print(f"  ℹ Ошибка при раскрытии описания: {e}")
+            log.debug("  ℹ Ошибка при раскрытии описания: %s", e)
 
         return False
 
@@ -206,18 +181,30 @@ class CianParser:
                         self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", button)
                         time.sleep(0.3)
                         button.click()
-                        print("  ✓ Статистика объявления открыта")
+                        log.debug("  ✓ Статистика объявления открыта")
                         time.sleep(1)
                         return True
                 except:
                     continue
 
-            print("  ℹ Кнопка статистики не найдена")
+            log.debug("  ℹ Кнопка статистики не найдена")
             return False
         except Exception as e:
-            print(f"  ✗ Ошибка открытия статистики: {e}")
+            log.warning("  ✗ Ошибка открытия статистики: %s", e)
             return False
 
+    def _get_content_container(self):
+        """Контейнер контента OfferCardPageLayout или None (тогда скриншот целиком)"""
+        try:
+            content_container = self.driver.find_element(By.CSS_SELECTOR, "[data-name='OfferCardPageLayout']")
+            if content_container.is_displayed() and content_container.size['width'] >= 100:
+                return content_container
+        except NoSuchElementException:
+            pass
+
+        log.warning("  ⚠ Контейнер OfferCardPageLayout не найден, используем весь скриншот")
+        return None
+
     def _take_top_screenshot_with_price_history(self, address_ad):
         """Скриншот верхней части страницы с наведением на историю цен (если есть)"""
         from selenium.webdriver.common.action_chains import ActionChains
@@ -226,8 +213,7 @@ class CianParser:
         price_history = []
 
         try:
-            ad_folder = self.images_dir / str(address_ad)
-            ad_folder.mkdir(parents=True, exist_ok=True)
+            ad_folder = self._ad_folder(address_ad)
 
             # Скроллим к началу страницы
             self.driver.execute_script("window.scrollTo(0, 0);")
@@ -282,7 +268,7 @@ class CianParser:
                         continue
 
                 if hover_element:
-                    print("  ✓ История цен найдена, наводим курсор...")
+                    log.debug("  ✓ История цен найдена, наводим курсор...")
                     self.driver.execute_script(
                         "arguments[0].scrollIntoView({block: 'center'}); window.scrollBy(0, -50);",
                         hover_element
@@ -312,87 +298,33 @@ class CianParser:
                                 break
 
                         if tooltip:
-                            text = tooltip.text.replace("\xa0", " ")
-                            text = re.sub(r"\s+", " ", text).strip()
-
-                            lines = text.split("\n")
-                            for line in lines:
-                                date_match = re.search(r'(\d{1,2}\s+[а-яА-Я]+\s+\d{4})', line)
-                                price_match = re.search(r'([\d\s]+)\s*[₽руб]', line)
-
-                                if date_match and price_match:
-                                    date = date_match.group(1)
-                                    price = int(price_match.group(1).replace(" ", ""))
-                                    price_history.append({"date": date, "price": price})
+                            price_history = parse_price_history(tooltip.text)
 
                             if price_history:
-                                print(f"  ✓ История цен: {len(price_history)} записей")
+                                log.debug("  ✓ История цен: %s записей", len(price_history))
 
                     except Exception as e:
-                        print(f"  ℹ Не удалось извлечь историю цен из tooltip: {e}")
+                        log.debug("  ℹ Не удалось извлечь историю цен из tooltip: %s", e)
                 else:
-                    print("  ℹ История цен не найдена")
+                    log.debug("  ℹ История цен не найдена")
 
             except Exception as e:
-                print(f"  ℹ Ошибка при поиске истории цен: {e}")
-
-            # Ищем контейнер контента - только OfferCardPageLayout
-            content_container = None
-            try:
-                content_container = self.driver.find_element(By.CSS_SELECTOR, "[data-name='OfferCardPageLayout']")
-                if not content_container.is_displayed() or content_container.size['width'] < 100:
-                    content_container = None
-            except:
-                content_container = None
-
-            if not content_container:
-                print("  ⚠ Контейнер OfferCardPageLayout не найден, используем весь скриншот")
-
-            # Делаем скриншот
-            full_path = ad_folder / "_tmp_top.png"
-            self.driver.save_screenshot(str(full_path))
-
-            img = Image.open(full_path)
-            img_w, img_h = img.size
+                log.debug("  ℹ Ошибка при поиске истории цен: %s", e)
 
-            if content_container:
-                rect = self.driver.execute_script("""
-                    var r = arguments[0].getBoundingClientRect();
-                    return {left:r.left, top:r.top, width:r.width, height:r.height};
-                """, content_container)
-
-                dpr = self.driver.execute_script("return window.devicePixelRatio || 1;")
-
-                left = int(rect["left"] * dpr)
-                top = int(rect["top"] * dpr)
-                width = int(rect["width"] * dpr)
-                height = int(rect["height"] * dpr)
-
-                right = left + width
-                bottom = top + height
-
-                # Корректируем координаты с проверками
-                left = max(0, min(left, img_w - 1))
-                top = max(0, min(top, img_h - 1))
-                right = max(left + 1, min(right, img_w))
-                bottom = max(top + 1, min(bottom, img_h))
-
-                # Дополнительная проверка
-                if right <= left or bottom <= top or width < 100 or height < 100:
-                    print(f"  ⚠ Некорректные размеры контейнера, используем весь скриншот")
-                    final_path = ad_folder / "титул.png"
-                    img.save(final_path)
-                else:
-                    final_path = ad_folder / "титул.png"
-                    img.crop((left, top, right, bottom)).save(final_path)
-            else:
-                final_path = ad_folder / "титул.png"
-                img.save(final_path)
+            # Отложенный режим: снимок с открытым tooltip вместо скриншота
+            if self.defer_screenshots and self.snapshot_archive:
+                self._deferred = self._capture_for_render(address_ad)
+                if self._deferred:
+                    try:
+                        ActionChains(self.driver).move_by_offset(300, 300).perform()
+                    except:
+                        pass
+                    return None, price_history
 
-            screenshot_path = str(final_path)
-            full_path.unlink(missing_ok=True)
+            content_container = self._get_content_container()
 
-            print(f"  ✓ Скриншот верхней части: {final_path.name}")
+            screenshot_path = self._screenshot_region(ad_folder, "титул.png", content_container, "_tmp_top.png")
+            log.debug("  ✓ Скриншот верхней части: титул.png")
 
             # Убираем курсор
             try:
@@ -404,14 +336,13 @@ class CianParser:
             return screenshot_path, price_history
 
         except Exception as e:
-            print(f"  ✗ Ошибка верхнего скриншота: {e}")
+            log.error("  ✗ Ошибка верхнего скриншота: %s", e)
             return None, []
 
     def _take_publication_date_screenshot(self, address_ad):
         """Скриншот даты публикации (после открытия OfferStats)"""
         try:
-            ad_folder = self.images_dir / str(address_ad)
-            ad_folder.mkdir(parents=True, exist_ok=True)
+            ad_folder = self._ad_folder(address_ad)
 
             # Открываем статистику
             self._open_offer_stats()
@@ -443,61 +374,12 @@ class CianParser:
                 )
                 time.sleep(0.5)
 
-            # Ищем контейнер контента - только OfferCardPageLayout
-            content_container = None
-            try:
-                content_container = self.driver.find_element(By.CSS_SELECTOR, "[data-name='OfferCardPageLayout']")
-                if not content_container.is_displayed() or content_container.size['width'] < 100:
-                    content_container = None
-            except:
-                content_container = None
-
-            if not content_container:
-                print("  ⚠ Контейнер OfferCardPageLayout не найден, используем весь скриншот")
-
-            # Делаем скриншот
-            full_path = ad_folder / "_tmp_date.png"
-            self.driver.save_screenshot(str(full_path))
-
-            img = Image.open(full_path)
-            img_w, img_h = img.size
-
-            if content_container:
-                rect = self.driver.execute_script("""
-                    var r = arguments[0].getBoundingClientRect();
-                    return {left:r.left, top:r.top, width:r.width, height:r.height};
-                """, content_container)
+            content_container = self._get_content_container()
 
-                dpr = self.driver.execute_script("return window.devicePixelRatio || 1;")
-
-                left = int(rect["left"] * dpr)
-                top = int(rect["top"] * dpr)
-                width = int(rect["width"] * dpr)
-                height = int(rect["height"] * dpr)
-
-                right = left + width
-                bottom = top + height
-
-                left = max(0, min(left, img_w - 1))
-                top = max(0, min(top, img_h - 1))
-                right = max(left + 1, min(right, img_w))
-                bottom = max(top + 1, min(bottom, img_h))
-
-                if right <= left or bottom <= top or width < 100 or height < 100:
-                    print(f"  ⚠ Некорректные размеры контейнера, используем весь скриншот")
-                    final_path = ad_folder / "дата_публикации.png"
-                    img.save(final_path)
-                else:
-                    final_path = ad_folder / "дата_публикации.png"
-                    img.crop((left, top, right, bottom)).save(final_path)
-            else:
-                final_path = ad_folder / "дата_публикации.png"
-                img.save(final_path)
-
-            screenshot_path = str(final_path)
-            full_path.unlink(missing_ok=True)
-
-            print(f"  ✓ Скриншот даты публикации: {final_path.name}")
+            screenshot_path = self._screenshot_region(
+                ad_folder, "дата_публикации.png", content_container, "_tmp_date.png"
+            )
+            log.debug("  ✓ Скриншот даты публикации: дата_публикации.png")
 
             # Закрываем окно статистики на крестик
             try:
@@ -514,26 +396,25 @@ class CianParser:
                         for btn in close_buttons:
                             if btn.is_displayed():
                                 self.driver.execute_script("arguments[0].click();", btn)
-                                print("  ✓ Окно статистики закрыто")
+                                log.debug("  ✓ Окно статистики закрыто")
                                 time.sleep(0.3)
                                 return screenshot_path
                     except:
                         continue
 
             except Exception as e:
-                print(f"  ℹ Не удалось закрыть окно статистики: {e}")
+                log.debug("  ℹ Не удалось закрыть окно статистики: %s", e)
 
             return screenshot_path
 
         except Exception as e:
-            print(f"  ✗ Ошибка скриншота даты: {e}")
+            log.error("  ✗ Ошибка скриншота даты: %s", e)
             return None
 
     def _take_description_screenshot(self, address_ad):
         """Скриншот описания: 1 скрин или 2 (верх/низ), если не влезает в viewport"""
         try:
-            ad_folder = self.images_dir / str(address_ad)
-            ad_folder.mkdir(parents=True, exist_ok=True)
+            ad_folder = self._ad_folder(address_ad)
 
             # Раскрываем описание
             self._expand_description()
@@ -557,7 +438,7 @@ class CianParser:
                     continue
 
             if not description_element:
-                print("  ⚠ Блок описания не найден")
+                log.warning("  ⚠ Блок описания не найден")
                 return None
 
             # Центрируем описание в viewport
@@ -577,27 +458,13 @@ class CianParser:
             viewport_height = self.driver.execute_script("return window.innerHeight;")
             need_two_screens = desc_metrics["height"] > viewport_height * 0.9
 
-            # Ищем контейнер страницы
-            content_container = None
-            try:
-                cc = self.driver.find_element(By.CSS_SELECTOR, "[data-name='OfferCardPageLayout']")
-                if cc.is_displayed() and cc.size["width"] > 100:
-                    content_container = cc
-            except:
-                pass
-
-            if not content_container:
-                print("  ⚠ Контейнер OfferCardPageLayout не найден, используем весь скриншот")
-
-            screenshots = []
-
-            def make_screenshot(name):
-                path = ad_folder / name
-                self.driver.save_screenshot(str(path))
-                return path
+            content_container = self._get_content_container()
 
+            # Каждый экран обрезается сразу после снимка
             if not need_two_screens:
-                screenshots.append(make_screenshot("_tmp_desc_1.png"))
+                result_paths = [
+                    self._screenshot_region(ad_folder, "описание.png", content_container, "_tmp_desc_1.png")
+                ]
             else:
                 # --- скрин 1: верх описания ---
                 self.driver.execute_script("""
@@ -605,7 +472,9 @@ class CianParser:
                     window.scrollBy(0, r.top - window.innerHeight * 0.1);
                 """, description_element)
                 time.sleep(0.4)
-                screenshots.append(make_screenshot("_tmp_desc_1.png"))
+                result_paths = [
+                    self._screenshot_region(ad_folder, "описание_1.png", content_container, "_tmp_desc_1.png")
+                ]
 
                 # --- скрин 2: низ описания ---
                 self.driver.execute_script("""
@@ -613,215 +482,45 @@ class CianParser:
                     window.scrollBy(0, r.bottom - window.innerHeight * 0.9);
                 """, description_element)
                 time.sleep(0.4)
-                screenshots.append(make_screenshot("_tmp_desc_2.png"))
-
-            result_paths = []
-
-            for idx, full_path in enumerate(screenshots, start=1):
-                img = Image.open(full_path)
-                img_w, img_h = img.size
-
-                if content_container:
-                    rect = self.driver.execute_script("""
-                        var r = arguments[0].getBoundingClientRect();
-                        return {left:r.left, top:r.top, width:r.width, height:r.height};
-                    """, content_container)
-
-                    dpr = self.driver.execute_script("return window.devicePixelRatio || 1;")
-
-                    left = int(rect["left"] * dpr)
-                    top = int(rect["top"] * dpr)
-                    right = int((rect["left"] + rect["width"]) * dpr)
-                    bottom = int((rect["top"] + rect["height"]) * dpr)
-
-                    left = max(0, min(left, img_w - 1))
-                    top = max(0, min(top, img_h - 1))
-                    right = max(left + 1, min(right, img_w))
-                    bottom = max(top + 1, min(bottom, img_h))
-
-                    name = "описание.png" if len(screenshots) == 1 else f"описание_{idx}.png"
-                    final_path = ad_folder / name
-
-                    if right > left and bottom > top:
-                        img.crop((left, top, right, bottom)).save(final_path)
-                    else:
-                        img.save(final_path)
-                else:
-                    name = "описание.png" if len(screenshots) == 1 else f"описание_{idx}.png"
-                    final_path = ad_folder / name
-                    img.save(final_path)
-
-                result_paths.append(str(final_path))
-                full_path.unlink(missing_ok=True)
+                result_paths.append(
+                    self._screenshot_region(ad_folder, "описание_2.png", content_container, "_tmp_desc_2.png")
+                )
 
             if len(result_paths) == 1:
-                print("  ✓ Описание влезло — 1 скриншот")
+                log.debug("  ✓ Описание влезло — 1 скриншот")
                 return result_paths[0]
             else:
-                print("  ✓ Описание длинное — 2 скриншота")
+                log.debug("  ✓ Описание длинное — 2 скриншота")
                 return result_paths
 
         except Exception as e:
-            print(f"  ✗ Ошибка скриншота описания: {e}")
+            log.error("  ✗ Ошибка скриншота описания: %s", e)
             import traceback
             traceback.print_exc()
             return None
 
-    def continue_after_captcha(self):
-        self._wait_for_user = False
-
-    def _slow_pause(self, message=""):
-        if self.slow_mode:
-            if message:
-                print(f"  [SLOW MODE] {message}")
-            time.sleep(self.slow_delay)
-
-    def _extract_text(self, selectors, default=""):
-        """Извлечение текста по списку селекторов"""
-        for selector in selectors:
-            try:
-                el = self.driver.find_element(By.CSS_SELECTOR, selector)
-                text = el.text.strip()
-                if text:
-                    return text
-            except NoSuchElementException:
-                continue
-        return default
-
-    def _parse_price(self, price_text):
-        """Парсинг цены из текста"""
-        if not price_text:
-            return None, None
-
-        # Извлекаем числа
-        numbers = re.findall(r'[\d\s]+', price_text)
-        if numbers:
-            price_str = numbers[0].replace(' ', '').replace('\xa0', '')
-            try:
-                price = int(price_str)
-            except ValueError:
-                price = None
-        else:
-            price = None
-
-        # Определяем тип цены
-        price_type = "месяц"
-        if "м²" in price_text or "м2" in price_text:
-            price_type = "м²/месяц"
-        elif "год" in price_text:
-            price_type = "год"
-            try:
-                price /= 12
-            except:
-                pass
-
-        return price, price_type
-
-    def _extract_num(self, text):
-        text = text.replace("²", "")
-        num = ""
-        for i, c in enumerate(text):
-            if c.isdigit():
-                num += c
-            elif i != 0 and text[i-1].isdigit() and c == '.':
-                num += c
-        return float(num)
-
     def _parse_price_per_m2(self):
         try:
             items = self.driver.find_elements(By.CSS_SELECTOR, "[data-name='OfferFactItem']")
 
+            facts = []
             for item in items:
-                title = item.find_element(By.TAG_NAME, "span").text.strip()
-                value = item.find_elements(By.TAG_NAME, "span")[1].text.strip()
-                if "Цена за метр" in title:
-                    if 'в год' in value:
-                        value = self._extract_num(value) / 12
-                    elif "в месяц" in value:
-                        value = self._extract_num(value)
-                    else:
-                        value = float(value.replace("₽/м²", "").replace("₽", "").replace(" ", ""))
-                    return value
-                elif "Цена за сотку" in title:
-                    value = self._extract_num(value)
-                    return value / 100
-                elif "Цена за гектар" in title:
-                    value = self._extract_num(value)
-                    return value / 10000
+                spans = item.find_elements(By.TAG_NAME, "span")
+                if len(spans) >= 2:
+                    facts.append((spans[0].text.strip(), spans[1].text.strip()))
 
-            return None
+            return self._price_per_m2_from_facts(facts)
 
         except Exception as e:
-            print(str(e))
+            log.debug("%s", e)
             return None
 
-    def _extract_params(self):
-        """Извлечение параметров объявления"""
-        params = {}
-
-        try:
-            param_selectors = [
-                "[data-name*='ObjectFactoids'] div",
-                "[class*='features'] li",
-                "[class*='offer-card-params'] li",
-                "[data-name='OfferCardFeatures'] li"
-            ]
-
-            for selector in param_selectors:
-                try:
-                    param_items = self.driver.find_elements(By.CSS_SELECTOR, selector)
-
-                    for item in param_items:
-                        text = item.text.strip()
-                        if ':' in text:
-                            key, value = text.split(':', 1)
-                            params[key.strip()] = value.strip()
-                        elif '\n' in text:
-                            parts = text.split('\n')
-                            if len(parts) >= 2:
-                                params[parts[0].strip()] = parts[1].strip()
-
-                    if params:
-                        break
-                except:
-                    continue
-        except Exception as e:
-            print(f"  ℹ Не удалось извлечь параметры: {e}")
-
-        return params
-
-    @staticmethod
-    async def _download_image(session, url, path):
-        try:
-            async with session.get(url) as resp:
-                if resp.status == 200:
-                    data = await resp.read()
-                    with open(path, 'wb') as f:
-                        f.write(data)
-                    return True
-        except Exception as e:
-            print(f"  ✗ Ошибка загрузки {url}: {e}")
-        return False
-
-    async def _download_all_images(self, image_urls, ad_folder):
-        downloaded = set()
-        async with aiohttp.ClientSession() as session:
-            tasks = []
-            for i, url in enumerate(image_urls):
-                path = ad_folder / f"фото_{i + 1:03d}.jpg"
-                tasks.append(self._download_image(session, url, path))
-            results = await asyncio.gather(*tasks)
-            for url, ok in zip(image_urls, results):
-                if ok:
-                    downloaded.add(url)
-        print(f"  ✓ Загружено: {len(downloaded)}/{len(image_urls)}")
-        return downloaded
-
-    def _collect_and_download_images(self, address_ad):
-        """Собирает все src из галереи и скачивает асинхронно"""
-        ad_folder = self.images_dir / str(address_ad)
-        ad_folder.mkdir(parents=True, exist_ok=True)
+    def _price_per_m2_from_facts(self, facts):
+        """Цена за м² из пар (название, значение) блока OfferFactItem"""
+        return price_per_m2_from_facts(facts)
 
+    def _collect_image_urls(self):
+        """Собирает все src из галереи"""
         image_urls = []
 
         try:
@@ -838,79 +537,89 @@ class CianParser:
                 except Exception:
                     continue
         except Exception as e:
-            print(f"  ✗ Ошибка получения галереи: {e}")
-            return set()
+            log.error("  ✗ Ошибка получения галереи: %s", e)
 
-        print(f"  ✓ Найдено изображений: {len(image_urls)}")
+        return image_urls
 
-        if not image_urls:
-            return set()
 
-        downloaded = asyncio.run(self._download_all_images(image_urls, ad_folder))
-        return downloaded
+    def _clean_address(self, address):
+        """Убирает из адреса ссылку 'На карте' и всё после неё"""
+        if not address:
+            return address
+        return address.split("На карте")[0].strip()
 
-    def parse_ad(self, url):
-        """Парсинг одного объявления"""
-        if not self.driver:
-            self._setup_driver()
+    def _clean_description(self, description):
+        return description.replace("Свернуть", "").strip()
 
-        print(f"\nПарсинг: {url}")
+    def _fill_derived_fields(self, data):
+        """Площадь, этаж, участок и пересчёт цены по уже извлечённым params и price"""
+        # Пытаемся найти площадь в параметрах
+        for key in ["Общая площадь", "Площадь", "Площадь дома"]:
+            area_value = first_number(data["params"].get(key))
+            if area_value is not None:
+                data["area_m2"] = area_value
+                break
+        if data["params"].get("Площади"):
+            try:
+                data["area_m2"] = extract_num(data["params"]['Площади'].split('–')[0])
+            except ValueError:
+                pass
 
-        self.driver.get(url)
+        # Извлекаем этаж
+        if data["params"].get("Этаж"):
+            data["params"]["Этаж"] = data["params"]["Этаж"].split('из')[0].strip()
 
-        # Проверяем наличие капчи или блокировки
-        page_text = self.driver.find_element(By.TAG_NAME, "body").text.lower()
+        # Площадь участка
+        for key in ["Площадь участка", "Участок"]:
+            if data["params"].get(key):
+                plot = plot_area_m2(data["params"][key])
+                if plot is not None:
+                    data["params"]["Площадь участка"] = plot
+                break
 
-        if any(phrase in page_text for phrase in [
-            "страница не найдена",
-            "объявление не найдено",
-            "не существует"
-        ]):
-            return {
-                "url": url,
-                "page_not_found": True
-            }
+        # Материал стен
+        if data["params"].get("Материал дома"):
+            data["params"]["Материал стен"] = data["params"]["Материал дома"]
 
-        is_blocked = any(phrase in page_text for phrase in [
-            "подтвердите, что вы не робот",
-            "доступ ограничен",
-            "заблокирован",
-            "access denied",
-            "проверка безопасности",
-            "captcha"
-        ])
+        # Если цена указана за м², пересчитываем
+        if "м²" in data.get("price_text", "").lower() and data.get("area_m2"):
+            if data["price"]:
+                data["price"] = round(data["price"] * data["area_m2"], 1)
 
-        # Проверяем наличие основного контента
-        try:
-            self.driver.find_element(By.CSS_SELECTOR, "h1, [data-name='OfferTitle']")
-            has_content = True
-        except:
-            has_content = False
+        # Дата публикации и даты истории цен в ISO
+        normalize_dates(data)
 
-        if is_blocked or not has_content:
-            self._wait_for_user = True
+        return data
 
-            if self.on_captcha:
-                self.on_captcha()
+    def parse_ad(self, url):
+        """Парсинг одного объявления"""
+        log.info("Парсинг: %s", url)
 
-            while self._wait_for_user:
-                time.sleep(0.3)
+        not_found = self._open_ad(url)
+        if not_found:
+            return not_found
 
         # Ждем загрузки страницы
-        self._wait_for_page_load()
+        with span("readiness"):
+            self._wait_for_page_load()
+        page_metrics = self._collect_page_metrics()
 
         if not self._check_authorization():
-            self._wait_for_user = True
-
-            if self.on_captcha:
-                # ЗАМЕНЯЕМ НА:
-                if hasattr(self, 'on_auth') and self.on_auth:
-                    self.on_auth()
-                else:
-                    self.on_captcha()
-
-            while self._wait_for_user:
-                time.sleep(0.3)
+            metrics.CAPTCHAS.inc(site=self.SITE, kind="auth")
+            wait_started = time.monotonic()
+            with span("auth_wait"):
+                self._wait_for_user_action(self.on_auth or self.on_captcha)
+            metrics.CAPTCHA_WAIT_SECONDS.observe(time.monotonic() - wait_started, site=self.SITE)
+
+            # Сразу сохраняем сессию, чтобы не авторизовываться после перезапуска
+            self._save_cookies()
+
+        # Снимок до изменений DOM (зум, раскрытие описания) — для повторного разбора офлайн.
+        # В отложенном режиме снимок делается позже, в момент скриншотов
+        snapshot = None
+        if self.snapshot_archive and not self.defer_screenshots:
+            with span("snapshot"):
+                snapshot = self.snapshot_archive.capture(self.driver, url)
 
         # Уменьшаем масштаб для лучших скриншотов
         self.driver.execute_script("document.body.style.zoom='80%'")
@@ -921,166 +630,69 @@ class CianParser:
             "url": url,
             "parsed_at": datetime.now().isoformat(),
         }
+        if snapshot:
+            data["snapshot"] = snapshot
+        data["page_metrics"] = page_metrics
 
-        # Заголовок
-        data["title"] = self._extract_text([
-            "h1[data-name='OfferTitle']",
-            "h1",
-            "[class*='title']"
-        ])
-
-        # Цена - извлекаем из div data-name=PriceInfo
-        price_text = self._extract_text([
-            "[data-name='PriceInfo']",
-            "[data-name='OfferPrice']",
-            "[class*='price-value']",
-            "[class*='price']",
-            "[itemprop='price']"
-        ])
-
-        data["price_text"] = price_text
-        data["price"], data["price_type"] = self._parse_price(price_text)
+        # Заголовок, цена и адрес — одним вызовом браузера
+        data.update(self._extract_fields("title", "price_text", "address"))
+        data["price"], data["price_type"] = self._parse_price(data["price_text"])
 
         price_per_m2 = self._parse_price_per_m2()
         if price_per_m2:
             data["price_per_m2"] = price_per_m2
 
-        # Адрес
-        data["address"] = self._extract_text([
-            "[data-name='Geo']",
-            "[data-name='Address']",
-            "[itemprop='address']",
-            "[class*='address']"
-        ])
-
-        # Очищаем адрес от лишних строк
-        if data["address"]:
-            data["address"] = data["address"].split("На карте")[0].strip()
-
         # Создаем идентификатор для папки скриншотов
         screenshot_id = (data.get('title', '') + data.get('address', '')).replace("\n", " ").strip()
 
+        self._deferred = None
+        if self.defer_screenshots and self.snapshot_archive:
+            # Описание раскрываем заранее, чтобы в снимок попал полный текст
+            self._expand_description()
+
         # Скриншот 1: Верхняя часть с историей цен (если есть)
-        print("  Получение верхнего скриншота...")
-        top_screenshot, price_history = self._take_top_screenshot_with_price_history(screenshot_id)
-
-        # Скриншот 2: Дата публикации
-        print("  Получение скриншота даты публикации...")
-        date_screenshot = self._take_publication_date_screenshot(screenshot_id)
-
-        # Скриншот 3: Описание
-        print("  Получение скриншота описания...")
-        description_screenshot = self._take_description_screenshot(screenshot_id)
-
-        # Сохраняем пути к скриншотам
-        data["screenshots"] = {
-            "top": top_screenshot,
-            "publication_date": date_screenshot,
-            "description": description_screenshot
-        }
+        log.debug("  Получение верхнего скриншота...")
+        with span("price_history"):
+            top_screenshot, price_history = self._take_top_screenshot_with_price_history(screenshot_id)
+        data["price_history"] = price_history
+
+        if self._deferred:
+            # Скриншоты будут отрисованы из снимка при экспорте
+            data["screenshots"] = self._deferred
+            data["snapshot"] = self._deferred["snapshot"]
+        else:
+            with span("screenshots"):
+                # Скриншот 2: Дата публикации
+                log.debug("  Получение скриншота даты публикации...")
+                date_screenshot = self._take_publication_date_screenshot(screenshot_id)
+
+                # Скриншот 3: Описание
+                log.debug("  Получение скриншота описания...")
+                description_screenshot = self._take_description_screenshot(screenshot_id)
+
+            # Сохраняем пути к скриншотам
+            data["screenshots"] = {
+                "top": top_screenshot,
+                "publication_date": date_screenshot,
+                "description": description_screenshot
+            }
 
         # Загрузка фото
         if self.download_photos:
-            print("  Загрузка фотографий...")
+            log.debug("  Загрузка фотографий...")
             downloaded_images = self._collect_and_download_images(screenshot_id)
             data["images_count"] = len(downloaded_images)
 
-        # Описание
-        data["description"] = self._extract_text([
-            "[data-name='Description']",
-            "[data-name='OfferCardDescription']",
-            "[itemprop='description']",
-            "[class*='description-text']"
-        ]).replace("Свернуть", "").strip()
+        # Описание и дата публикации
+        data.update(self._extract_fields("description", "published_date"))
 
         # Параметры
         data["params"] = self._extract_params()
 
-        # Пытаемся найти площадь в параметрах
-        for key in ["Общая площадь", "Площадь", "Площадь дома"]:
-            if data["params"].get(key):
-                try:
-                    area_text = data["params"][key]
-                    area_value = float(re.search(r'(\d+[.,]?\d*)', area_text).group(1).replace(',', '.'))
-                    data["area_m2"] = area_value
-                    break
-                except:
-                    pass
-        if data["params"].get("Площади"):
-            try:
-                area_text = data["params"]['Площади']
-                area_value = self._extract_num(area_text.split('–')[0])
-                data["area_m2"] = area_value
-            except:
-                pass
-
-
-        # Извлекаем этаж
-        if data["params"].get("Этаж"):
-            data["params"]["Этаж"] = data["params"]["Этаж"].split('из')[0].strip()
+        self._fill_derived_fields(data)
 
-        # Площадь участка
-        for key in ["Площадь участка", "Участок"]:
-            if data["params"].get(key):
-                try:
-                    if 'сот' in data["params"].get(key):
-                        data["params"]["Площадь участка"] = float(
-                            data["params"].get(key).replace("сот.", '').replace(',', '.').strip()) * 100
-                    elif 'га' in data["params"].get(key):
-                        data["params"]["Площадь участка"] = float(
-                            data["params"].get(key).replace("га", '').replace(',', '.').strip()) * 10000
-                    break
-                except:
-                    pass
-
-        # Материал стен
-        if data["params"].get("Материал дома"):
-            data["params"]["Материал стен"] = data["params"]["Материал дома"]
+        log.info("  ✓ Заголовок: %s...", data.get('title', 'Не найден')[:50])
+        log.info("  ✓ Цена: %s", data.get('price', 'Не найдена'))
+        log.info("  ✓ Адрес: %s...", data.get('address', 'Не найден')[:50])
 
-        # Дата публикации
-        data["published_date"] = self._extract_text([
-            "[data-name='PublicationDate']",
-            "[class*='publication-date']",
-            "[class*='offer-date']"
-        ])
-
-        # Если цена указана за м², пересчитываем
-        if "м²" in data.get("price_text", "").lower() and data.get("area_m2"):
-            if data["price"]:
-                data["price"] = round(data["price"] * data["area_m2"], 1)
-
-        print(f"  ✓ Заголовок: {data.get('title', 'Не найден')[:50]}...")
-        print(f"  ✓ Цена: {data.get('price', 'Не найдена')}")
-        print(f"  ✓ Адрес: {data.get('address', 'Не найден')[:50]}...")
-
-        print(data)
         return data
-
-    def parse_multiple(self, urls):
-        """Парсинг нескольких объявлений"""
-        results = []
-        for i, url in enumerate(urls, 1):
-            print(f"\n[{i}/{len(urls)}] ", end="")
-            try:
-                data = self.parse_ad(url)
-                results.append(data)
-                if i < len(urls):
-                    delay = 3 + (i % 3)
-                    print(f"  Пауза {delay} сек...")
-                    time.sleep(delay)
-            except Exception as e:
-                print(f"  ✗ Ошибка: {e}")
-                results.append({"url": url, "error": str(e)})
-        return results
-
-    def save_results(self, results, filename="cian_results.json"):
-        """Сохранение результатов в JSON"""
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
-        print(f"\nРезультаты сохранены в {filename}")
-
-    def close(self):
-        """Закрытие браузера"""
-        if self.driver:
-            self.driver.quit()
-            self.driver = None
\ No newline at end of file
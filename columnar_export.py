@@ -0,0 +1,322 @@
+"""
+Columnar Export
+Выгрузка результатов в Parquet или Arrow IPC и загрузка для анализа.
+
+Excel удобен для отчёта по десятку аналогов, но не для тысяч объявлений
+из регулярных сканов рынка. Здесь результаты пишутся колонками, пачками
+по batch_size строк, так что память не зависит от размера выгрузки:
+    основные поля Listing   — типизированные колонки (цены и площади — float64,
+                              parsed_at и published_at — timestamp)
+    param:<название>        — характеристики; набор колонок берётся из первой пачки
+    params_extra            — характеристики, которых не было в первой пачке (map)
+    price_history           — список {date, date_iso, price}
+
+Формат — по расширению: .parquet или .arrow/.feather (Arrow IPC).
+Нужен pyarrow (pip install pyarrow); без него модуль импортируется,
+а available() возвращает False.
+
+    python columnar_export.py Результаты/*.json -o scans/2026-05.parquet
+    python columnar_export.py --summary scans/       — сводка по всем файлам папки
+
+Загрузка нескольких месяцев сканов:
+    table = columnar_export.load("scans/", filter=ds.field("site") == "avito")
+"""
+
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # без pyarrow доступна только проверка available()
+    pa = ds = pq = None
+
+import applog
+from listing import FIELDS, Listing, read_results
+
+log = applog.get_logger(__name__)
+
+PARAM_PREFIX = "param:"
+BATCH_SIZE = 5000
+PARQUET_SUFFIXES = (".parquet",)
+ARROW_SUFFIXES = (".arrow", ".feather", ".ipc")
+
+# Поля Listing, которые не выгружаются: пути скриншотов и служебные данные страницы
+SKIPPED_FIELDS = ("screenshots", "price_history")
+TIMESTAMP_FIELDS = ("parsed_at", "published_at")
+
+
+def available():
+    return pa is not None
+
+
+def _require():
+    if pa is None:
+        raise RuntimeError("Для выгрузки в Parquet/Arrow нужен pyarrow: pip install pyarrow")
+
+
+def _core_types():
+    """Тип колонки для основных полей Listing"""
+    types = {}
+    for name in FIELDS:
+        if name in SKIPPED_FIELDS:
+            continue
+        if name in TIMESTAMP_FIELDS:
+            types[name] = pa.timestamp("ms")
+        elif name == "images_count":
+            types[name] = pa.int64()
+        elif name in ("price", "price_per_m2", "area_m2"):
+            types[name] = pa.float64()
+        else:
+            types[name] = pa.string()
+    return types
+
+
+def _history_type():
+    return pa.list_(pa.struct([
+        ("date", pa.string()),
+        ("date_iso", pa.timestamp("ms")),
+        ("price", pa.int64()),
+    ]))
+
+
+def _timestamp(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).replace(microsecond=0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _text(value):
+    return None if value is None else str(value)
+
+
+def schema_for(listings):
+    """Схема по первой пачке: основные поля, колонки характеристик в порядке появления"""
+    fields = [pa.field(name, type_) for name, type_ in _core_types().items()]
+    param_keys = {}
+    for item in listings:
+        for key in item.params:
+            param_keys.setdefault(key, None)
+    fields += [pa.field(PARAM_PREFIX + key, pa.string()) for key in param_keys]
+    fields.append(pa.field("params_extra", pa.map_(pa.string(), pa.string())))
+    fields.append(pa.field("price_history", _history_type()))
+    return pa.schema(fields)
+
+
+def to_batch(listings, schema):
+    """RecordBatch из списка Listing: каждая колонка собирается одним проходом"""
+    core = _core_types()
+    param_names = [name[len(PARAM_PREFIX):] for name in schema.names if name.startswith(PARAM_PREFIX)]
+    known = set(param_names)
+
+    arrays = []
+    for name, type_ in core.items():
+        values = [getattr(item, name) for item in listings]
+        if name in TIMESTAMP_FIELDS:
+            values = [_timestamp(v) for v in values]
+        elif name == "images_count":
+            values = [None if v is None else int(v) for v in values]
+        arrays.append(pa.array(values, type=type_))
+
+    for key in param_names:
+        arrays.append(pa.array([_text(item.params.get(key)) for item in listings], type=pa.string()))
+
+    arrays.append(pa.array(
+        [[(k, _text(v)) for k, v in item.params.items() if k not in known] for item in listings],
+        type=schema.field("params_extra").type
+    ))
+    arrays.append(pa.array(
+        [
+            [
+                {"date": _text(e.get("date")), "date_iso": _timestamp(e.get("date_iso")), "price": e.get("price")}
+                for e in item.price_history or []
+            ]
+            for item in listings
+        ],
+        type=_history_type()
+    ))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _Writer:
+    """Общий интерфейс ParquetWriter и Arrow IPC writer"""
+
+    def __init__(self, path, schema, arrow=False):
+        self.schema = schema
+        self.sink = None
+        if arrow:
+            self.sink = pa.OSFile(str(path), "wb")
+            self.writer = pa.ipc.new_file(self.sink, schema)
+        else:
+            self.writer = pq.ParquetWriter(str(path), schema, compression="zstd")
+
+    def write(self, batch):
+        self.writer.write_batch(batch)
+
+    def close(self):
+        self.writer.close()
+        if self.sink is not None:
+            self.sink.close()
+
+
+def export(rows, path, batch_size=BATCH_SIZE):
+    """
+    Потоковая запись результатов (словари или Listing, любой итератор) в path.
+    Пишется во временный файл, который заменяет path по завершении.
+    Возвращает число записанных строк.
+    """
+    _require()
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+
+    writer = None
+    count = 0
+    batch = []
+
+    def flush():
+        nonlocal writer
+        if writer is None:
+            writer = _Writer(tmp_path, schema_for(batch), arrow=path.suffix.lower() in ARROW_SUFFIXES)
+        writer.write(to_batch(batch, writer.schema))
+
+    try:
+        for data in rows:
+            listing = Listing.from_dict(data)
+            if listing.extra and (listing.extra.get("page_not_found") or listing.extra.get("error")):
+                continue
+            batch.append(listing)
+            if len(batch) >= batch_size:
+                flush()
+                count += len(batch)
+                batch = []
+        if batch or writer is None:
+            flush()
+            count += len(batch)
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+    writer.close()
+
+    tmp_path.replace(path)
+    log.info("✓ Выгружено объявлений: %s → %s", count, path)
+    return count
+
+
+def _files(source):
+    source = Path(source)
+    if source.is_dir():
+        return sorted(p for p in source.iterdir() if p.suffix.lower() in PARQUET_SUFFIXES + ARROW_SUFFIXES)
+    return [source]
+
+
+def dataset(sources):
+    """
+    pyarrow.dataset по файлам и папкам выгрузок (Parquet и Arrow можно смешивать).
+    Колонки характеристик у файлов разные — схема объединяется, недостающие заполняются null.
+    """
+    _require()
+    if isinstance(sources, (str, Path)):
+        sources = [sources]
+    files = [path for source in sources for path in _files(source)]
+    if not files:
+        raise FileNotFoundError(f"Нет файлов выгрузки в {', '.join(map(str, sources))}")
+
+    groups = {}
+    for path in files:
+        file_format = "parquet" if path.suffix.lower() in PARQUET_SUFFIXES else "ipc"
+        groups.setdefault(file_format, []).append(str(path))
+    # Схема каждого файла читается из его заголовка, данные не загружаются
+    schema = pa.unify_schemas([
+        ds.dataset(path, format=file_format).schema
+        for file_format, paths in groups.items() for path in paths
+    ])
+    parts = [ds.dataset(paths, schema=schema, format=file_format) for file_format, paths in groups.items()]
+    return parts[0] if len(parts) == 1 else ds.dataset(parts)
+
+
+def load(sources, columns=None, filter=None):
+    """pyarrow.Table из выгрузок; columns и filter передаются в сканер (читаются только нужные колонки)"""
+    return dataset(sources).to_table(columns=columns, filter=filter)
+
+
+def iter_listings(sources, batch_size=BATCH_SIZE):
+    """Обратно в Listing по пачкам — для normalizer, отчётов и т.п."""
+    for batch in dataset(sources).to_batches(batch_size=batch_size):
+        for row in batch.to_pylist():
+            yield Listing.from_dict(_row_to_dict(row))
+
+
+def _row_to_dict(row):
+    data = {}
+    params = {}
+    for name, value in row.items():
+        if value is None:
+            continue
+        if name.startswith(PARAM_PREFIX):
+            params[name[len(PARAM_PREFIX):]] = value
+        elif name == "params_extra":
+            params.update(value)
+        elif name == "price_history":
+            data[name] = [
+                {k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in entry.items() if v is not None}
+                for entry in value
+            ]
+        elif isinstance(value, datetime):
+            data[name] = value.isoformat()
+        else:
+            data[name] = value
+    data["params"] = params
+    return data
+
+
+def _rub(value):
+    return f"{value:,.0f} ₽".replace(",", " ")
+
+
+def summary(table):
+    """Строки сводки: объявлений и средние цены по сайтам"""
+    lines = [f"Объявлений: {table.num_rows}, колонок: {table.num_columns}"]
+    grouped = table.group_by("site").aggregate([
+        ("url", "count"), ("price", "mean"), ("price_per_m2", "mean"),
+    ])
+    for row in grouped.to_pylist():
+        line = f"   {row['site'] or '—'}: {row['url_count']}"
+        if row["price_mean"] is not None:
+            line += f", средняя цена {_rub(row['price_mean'])}"
+        if row["price_per_m2_mean"] is not None:
+            line += f", за м² {_rub(row['price_per_m2_mean'])}"
+        lines.append(line)
+    return lines
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Выгрузка результатов в Parquet/Arrow")
+    arg_parser.add_argument("files", nargs="+", help="результаты .json/.jsonl или, с --summary, выгрузки")
+    arg_parser.add_argument("-o", "--out", help="файл .parquet или .arrow")
+    arg_parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    arg_parser.add_argument("--summary", action="store_true", help="сводка по готовым выгрузкам")
+    args = arg_parser.parse_args()
+
+    applog.setup()
+    if not available():
+        raise SystemExit("✗ Нужен pyarrow: pip install pyarrow")
+
+    if args.summary:
+        for line in summary(load(args.files)):
+            print(line)
+    else:
+        if not args.out:
+            arg_parser.error("укажите -o/--out")
+        written = export(
+            (data for file_name in args.files for data in read_results(file_name)),
+            args.out, batch_size=args.batch_size
+        )
+        print(f"✓ {written} объявлений → {args.out}")
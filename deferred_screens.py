@@ -0,0 +1,239 @@
+"""
+Deferred Screenshots
+Отложенные скриншоты: при парсинге сохраняется только снимок страницы (MHTML)
+и геометрия нужных блоков, а сами PNG рендерятся при экспорте в Word
+и только для выбранных аналогов.
+
+Рендер выполняется в отдельном headless-браузере: снимок открывается
+как file://…mhtml, окно получает размер исходного viewport, страница
+прокручивается к сохранённым координатам и обрезается по блокам —
+так же, как это делали _take_*_screenshot парсеров. Имена файлов совпадают,
+поэтому word_builder работает без изменений.
+
+Ограничение: окно статистики Циан (дата публикации) открывается кликом
+и в снимок не попадает, поэтому этот скриншот в отложенном режиме не строится.
+"""
+
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image
+
+import applog
+
+log = applog.get_logger(__name__)
+
+# Геометрия блоков в координатах документа (не зависит от прокрутки)
+GEOMETRY_JS = {
+    "avito": """
+        function rect(el) {
+            if (!el) return null;
+            var r = el.getBoundingClientRect();
+            return {left: r.left + window.scrollX, top: r.top + window.scrollY, width: r.width, height: r.height};
+        }
+        var container = document.querySelector("[data-marker*='title']");
+        for (var i = 0; container && i < 5; i++) container = container.parentElement;
+        var history = document.querySelector('button[aria-label="История цены"]');
+        var mapWrapper = document.querySelector("div[data-marker*='item-map-wrapper']");
+        var description = container ? container.querySelector(
+            "[id*='item-description'], [class*='item-view-description']") : null;
+        var location = document.evaluate("//h2[contains(text(), 'Расположение')]", document, null,
+            XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+        return {
+            viewport: {width: window.innerWidth, height: window.innerHeight},
+            document_height: document.body.scrollHeight,
+            regions: {
+                container: rect(container),
+                history: rect(history),
+                map: rect(mapWrapper ? mapWrapper.parentElement : null),
+                description: rect(description),
+                date: rect(document.querySelector("[data-marker='item-view/item-date']")),
+                location: rect(location)
+            }
+        };
+    """,
+    "cian": """
+        function rect(el) {
+            if (!el) return null;
+            var r = el.getBoundingClientRect();
+            return {left: r.left + window.scrollX, top: r.top + window.scrollY, width: r.width, height: r.height};
+        }
+        var container = document.querySelector("[data-name='OfferCardPageLayout']");
+        if (container && container.getBoundingClientRect().width < 100) container = null;
+        var description = null;
+        var selectors = ["[data-name='Description']", "[data-name='OfferCardDescription']",
+                         "[class*='description']", "[class*='Description']"];
+        for (var i = 0; i < selectors.length && !description; i++) {
+            var el = document.querySelector(selectors[i]);
+            if (el && el.getBoundingClientRect().height > 50) description = el;
+        }
+        return {
+            viewport: {width: window.innerWidth, height: window.innerHeight},
+            document_height: document.body.scrollHeight,
+            regions: {
+                container: rect(container),
+                title: rect(document.querySelector("h1, [data-name='OfferTitle']")),
+                description: rect(description)
+            }
+        };
+    """,
+}
+
+
+def record_geometry(driver, site):
+    return driver.execute_script(GEOMETRY_JS[site])
+
+
+def _center(region, viewport_height):
+    return region["top"] + region["height"] / 2 - viewport_height / 2
+
+
+def _visible(region, scroll_y, viewport_height):
+    return region["top"] >= scroll_y and region["top"] + region["height"] <= scroll_y + viewport_height
+
+
+def plan_shots(site, geometry):
+    """
+    Список (имя файла, прокрутка по Y, блок для обрезки) и доп. флаги.
+    Повторяет логику _take_*_screenshot соответствующего парсера.
+    """
+    vh = geometry["viewport"]["height"]
+    regions = geometry["regions"]
+    container = regions.get("container")
+    shots = []
+    flags = {}
+
+    if site == "avito":
+        if regions.get("history"):
+            shots.append(("история цены.png", _center(regions["history"], vh) + 20, container))
+        else:
+            shots.append(("титул.png", 0, container))
+
+        if regions.get("map"):
+            shots.append(("адрес.png", _center(regions["map"], vh), regions["map"]))
+
+        description = regions.get("description") or container
+        description_y = description["top"] if description else 0
+        shots.append(("описание.png", description_y, container))
+
+        location = regions.get("location")
+        flags["has_location_and_date"] = bool(location and _visible(location, description_y, vh))
+
+        date = regions.get("date")
+        if date and not _visible(date, description_y, vh):
+            shots.append(("дата_публикации.png", geometry["document_height"], container))
+
+    elif site == "cian":
+        title = regions.get("title")
+        title_y = _center(title, vh) - 100 if title else 0
+        shots.append(("титул.png", title_y, container))
+
+        description = regions.get("description")
+        if description:
+            if description["height"] > vh * 0.9:
+                shots.append(("описание_1.png", description["top"] - vh * 0.1, container))
+                shots.append(("описание_2.png", description["top"] + description["height"] - vh * 0.9, container))
+            else:
+                shots.append(("описание.png", _center(description, vh), container))
+
+    return shots, flags
+
+
+class DeferredRenderer:
+    """Headless-браузер для рендера скриншотов из снимков"""
+
+    def __init__(self, archive, driver_factory, images_dir="Скриншоты"):
+        # driver_factory() → webdriver; вызывается один раз при первом рендере
+        self.archive = archive
+        self.driver_factory = driver_factory
+        self.images_dir = Path(images_dir)
+        self.driver = None
+        self._tmp_dir = tempfile.TemporaryDirectory(prefix="snapshots_")
+
+    def _open_snapshot(self, digest, viewport):
+        path = Path(self._tmp_dir.name) / f"{digest}.mhtml"
+        if not path.exists():
+            path.write_bytes(self.archive.load(digest))
+
+        if self.driver is None:
+            self.driver = self.driver_factory()
+
+        self.driver.set_window_size(viewport["width"], viewport["height"])
+        self.driver.get(path.as_uri())
+        time.sleep(0.5)
+
+    def _shoot(self, ad_folder, name, scroll_y, region):
+        driver = self.driver
+        actual = driver.execute_script(
+            "window.scrollTo(0, arguments[0]); return {x: window.scrollX, y: window.scrollY, "
+            "dpr: window.devicePixelRatio || 1};",
+            max(0, int(scroll_y))
+        )
+        time.sleep(0.2)
+
+        full_path = ad_folder / "_tmp_render.png"
+        driver.save_screenshot(str(full_path))
+        img = Image.open(full_path)
+        img_w, img_h = img.size
+
+        final_path = ad_folder / name
+        if region:
+            dpr = actual["dpr"]
+            left = max(0, int((region["left"] - actual["x"]) * dpr))
+            top = max(0, int((region["top"] - actual["y"]) * dpr))
+            right = min(img_w, int((region["left"] + region["width"] - actual["x"]) * dpr))
+            bottom = min(img_h, int((region["top"] + region["height"] - actual["y"]) * dpr))
+            if right > left and bottom > top:
+                img.crop((left, top, right, bottom)).save(final_path)
+            else:
+                img.save(final_path)
+        else:
+            img.save(final_path)
+
+        img.close()
+        full_path.unlink(missing_ok=True)
+        return str(final_path)
+
+    def render(self, data):
+        """Рендер отложенных скриншотов одного объявления; обновляет data['screenshots']"""
+        screenshots = data.get("screenshots") or {}
+        if not screenshots.get("deferred"):
+            return False
+
+        site = "avito" if "avito" in data.get("url", "") else "cian"
+        geometry = screenshots["geometry"]
+        ad_folder = self.images_dir / screenshots["folder"]
+        ad_folder.mkdir(parents=True, exist_ok=True)
+
+        self._open_snapshot(screenshots["snapshot"], geometry["viewport"])
+
+        shots, flags = plan_shots(site, geometry)
+        paths = [self._shoot(ad_folder, name, scroll_y, region) for name, scroll_y, region in shots]
+
+        screenshots.update(flags)
+        screenshots["rendered"] = paths
+        screenshots["deferred"] = False
+        log.info("  ✓ Отрисовано скриншотов: %s (%s)", len(paths), data.get('title', '')[:40])
+        return True
+
+    def render_rows(self, rows, on_progress=None):
+        """Рендер для строк экспорта, отмеченных как аналоги"""
+        pending = [
+            r["data"] for r in rows
+            if r["is_analog"] and (r["data"].get("screenshots") or {}).get("deferred")
+        ]
+        for i, data in enumerate(pending, 1):
+            try:
+                self.render(data)
+            except Exception as e:
+                log.error("  ✗ Ошибка отложенного скриншота %s: %s", data.get('url'), e)
+            if on_progress:
+                on_progress(i, len(pending))
+        return len(pending)
+
+    def close(self):
+        if self.driver:
+            self.driver.quit()
+            self.driver = None
+        self._tmp_dir.cleanup()
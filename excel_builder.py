@@ -1,131 +1,194 @@
-import re
+"""
+Excel Builder
+Таблица оценки (лист «Оценка») и сводка аналогов (лист «Аналоги») в .xlsx.
+
+Книга пишется в режиме write-only: строки берутся из итератора и сразу
+уходят во временный файл openpyxl, стили заданы заранее именованными
+(NamedStyle), поэтому память не растёт с числом объявлений, а GUI не нужен.
+Ошибки отдельных строк собираются и возвращаются списком.
+
+    python excel_builder.py Результаты/Оценка_20260301_120000.json -o оценка.xlsx
+    python excel_builder.py results.jsonl -o оценка.xlsx --analogs analogs.txt
+"""
+
+import argparse
+
 from openpyxl import Workbook
-from openpyxl.styles import Border, Side, Alignment, Font
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, Side
 from openpyxl.utils import get_column_letter
-from PyQt5.QtWidgets import QMessageBox
-
-def build_excel(self, data_rows):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Оценка"
 
+from listing import Listing, read_results
+
+HEADERS = [
+    "№",
+    "Адрес",
+    "Цена, руб",
+    "Площадь, кв.м",
+    "Цена за м², руб",
+    "Этаж",
+    "Площадь участка, кв.м",
+    "Материал стен",
+    "Год постройки",
+    "Ссылка",
+    "Описание",
+    "Статус аналога"
+]
+WIDTHS = [10, 20, 10, 10, 10, 10, 10, 10, 14, 30, 65, 14]
+
+ANALOG_LABELS = [
+    "Адрес",
+    "Цена, руб",
+    "Площадь, кв.м",
+    "Цена за м², руб",
+    "Этаж",
+    "Площадь участка, кв.м",
+    "Ссылка"
+]
+ANALOG_WIDTH = 20
+
+STATUS_ANALOG = "Выбран в качестве аналога"
+STATUS_EXCLUDED = "Исключен по критерию"
+
+
+def _floor(params):
+    floor = params.get("Этаж")
+    return int(floor) if str(floor).isdigit() else None
+
+
+def _add_styles(wb):
+    """Именованные стили книги: заголовок, ячейка, ячейка жирным"""
     thin = Side(style="thin")
     border = Border(left=thin, right=thin, top=thin, bottom=thin)
-
     align = Alignment(vertical="bottom", wrap_text=True)
-    bold = Font(bold=True)
-
-    headers = [
-        "№",
-        "Адрес",
-        "Цена, руб",
-        "Площадь, кв.м",
-        "Цена за м², руб",
-        "Этаж",
-        "Площадь участка, кв.м",
-        "Материал стен",
-        "Год постройки",
-        "Ссылка",
-        "Описание",
-        "Статус аналога"
+
+    for style in (
+        NamedStyle("header", font=Font(bold=True), border=border,
+                   alignment=Alignment(horizontal="center", vertical="center", wrap_text=True)),
+        NamedStyle("cell", border=border, alignment=align),
+        NamedStyle("cell_bold", font=Font(bold=True), border=border, alignment=align),
+    ):
+        wb.add_named_style(style)
+
+
+def _row(ws, values, style="cell", styles=None):
+    """Строка write-only ячеек; styles — {индекс колонки: стиль} для отдельных ячеек"""
+    cells = []
+    for i, value in enumerate(values):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = styles.get(i, style) if styles else style
+        cells.append(cell)
+    return cells
+
+
+def _main_values(idx, data, is_analog):
+    return [
+        idx,
+        data.address,
+        data.price,
+        data.area_m2,
+        data.price_per_m2,
+        _floor(data.params),
+        data.params.get("Площадь участка"),
+        data.params.get("Материал стен"),
+        data.params.get("Год постройки"),
+        data.url,
+        data.description,
+        STATUS_ANALOG if is_analog else STATUS_EXCLUDED
+    ]
+
+
+def _analog_values(analog):
+    return [
+        analog.address,
+        analog.price,
+        analog.area_m2,
+        analog.price_per_m2,
+        _floor(analog.params),
+        analog.params.get("Площадь участка"),
+        analog.url,
     ]
 
-    ws.append(headers)
-    for col in range(1, len(headers) + 1):
-        cell = ws.cell(row=1, column=col)
-        cell.border = border
-        cell.font = bold
-        cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
+
+def write_excel(data_rows, path):
+    """
+    Записывает книгу в path. data_rows — итератор {"data": результат, "is_analog": bool}.
+    Возвращает список ошибок [(таблица, номер строки, текст)]; строки с ошибкой пропускаются.
+    Исключение из итератора строк прерывает запись, файл при этом не создаётся.
+    """
+    wb = Workbook(write_only=True)
+    _add_styles(wb)
+    errors = []
+
+    ws = wb.create_sheet(title="Оценка")
+    for i, width in enumerate(WIDTHS, start=1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+    ws.append(_row(ws, HEADERS, style="header"))
 
     # --- ОСНОВНАЯ ТАБЛИЦА ---
-    for idx, row in enumerate(data_rows, start=1):
-        data = row["data"]
-        is_analog = row["is_analog"]
-
-        status_text = (
-            "Выбран в качестве аналога"
-            if is_analog else
-            "Исключен по критерию"
-        )
-
-        try:
-            ws.append([
-                idx,
-                data.get("address"),
-                data.get("price"),
-                data.get("area_m2"),
-                data.get("price_per_m2"),
-                int(data.get("params", {}).get("Этаж")) if str(data.get("params", {}).get("Этаж", "")).isdigit() else None,
-                data.get("params", {}).get("Площадь участка"),
-                data.get("params", {}).get("Материал стен"),
-                data.get("params", {}).get("Год постройки"),
-                data.get("url"),
-                data.get("description"),
-                status_text
-            ])
-
-            row_idx = ws.max_row
-            for col in range(1, len(headers) + 1):
-                cell = ws.cell(row=row_idx, column=col)
-                cell.border = border
-                cell.alignment = align
-                if col == 12 and is_analog:
-                    cell.font = bold
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка при составлении основной таблицы", str(e))
-
-
-    # --- ШИРИНА СТОЛБЦОВ ---
-    widths = [10, 20, 10, 10, 10, 10, 10, 10, 14, 30, 65, 14]
-    for i, w in enumerate(widths, start=1):
-        ws.column_dimensions[get_column_letter(i)].width = w
+    # Аналогов единицы — их значения копятся для второго листа (он транспонирован)
+    analog_columns = []
+    status_bold = {len(HEADERS) - 1: "cell_bold"}
+    try:
+        for idx, row in enumerate(data_rows, start=1):
+            try:
+                data = Listing.from_dict(row["data"])
+                is_analog = row["is_analog"]
+                ws.append(_row(ws, _main_values(idx, data, is_analog), styles=status_bold if is_analog else None))
+                if is_analog:
+                    analog_columns.append(_analog_values(data))
+            except Exception as e:
+                errors.append(("Оценка", idx, str(e)))
+    except BaseException:
+        # Итератор строк прервался (отмена экспорта) — дописываем лист, чтобы
+        # openpyxl закрыл временный файл; книга не сохраняется
+        ws.close()
+        raise
 
     # --- ВТОРАЯ ТАБЛИЦА ---
-    analogs = [r["data"] for r in data_rows if r["is_analog"]]
-
-    if analogs:
+    if analog_columns:
         analogs_ws = wb.create_sheet(title="Аналоги")
-        start_row = 1
-        labels = [
-            "Адрес",
-            "Цена, руб",
-            "Площадь, кв.м",
-            "Цена за м², руб",
-            "Этаж",
-            "Площадь участка, кв.м",
-            "Ссылка"
-        ]
-
-        for i, label in enumerate(labels):
-            cell = analogs_ws.cell(row=start_row + i, column=1, value=label)
-            cell.font = bold
-            cell.border = border
-            cell.alignment = align
-
-        for col_idx, analog in enumerate(analogs, start=2):
-
-            if analogs_ws.column_dimensions[get_column_letter(col_idx)].width < 20:
-                analogs_ws.column_dimensions[get_column_letter(col_idx)].width = 20
+        for col_idx in range(2, len(analog_columns) + 2):
+            analogs_ws.column_dimensions[get_column_letter(col_idx)].width = ANALOG_WIDTH
+        for offset, label in enumerate(ANALOG_LABELS):
             try:
-                values = [
-                    analog.get("address"),
-                    analog.get("price"),
-                    analog.get("area_m2"),
-                    analog.get("price_per_m2"),
-                    int(analog.get("params", {}).get("Этаж")) if str(analog.get("params", {}).get("Этаж", "")).isdigit() else None,
-                    analog.get("params", {}).get("Площадь участка"),
-                    analog.get("url"),
-                ]
-
-                for row_offset, value in enumerate(values):
-                    cell = analogs_ws.cell(
-                        row=start_row + row_offset,
-                        column=col_idx,
-                        value=value
-                    )
-                    cell.border = border
-                    cell.alignment = align
+                values = [label] + [column[offset] for column in analog_columns]
+                analogs_ws.append(_row(analogs_ws, values, styles={0: "cell_bold"}))
             except Exception as e:
-                QMessageBox.critical(self, "Ошибка при составлении таблицы с аналогами", str(e))
-
-    return wb
+                errors.append(("Аналоги", offset + 1, str(e)))
+
+    wb.save(path)
+    return errors
+
+
+def format_errors(errors, limit=20):
+    """Текст сводки ошибок для одного сообщения"""
+    lines = [f"{sheet}, строка {number}: {message}" for sheet, number, message in errors[:limit]]
+    if len(errors) > limit:
+        lines.append(f"… и ещё {len(errors) - limit}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Таблица оценки в Excel из сохранённых результатов")
+    arg_parser.add_argument("files", nargs="+", help="результаты .json или .jsonl")
+    arg_parser.add_argument("-o", "--out", required=True, help="файл .xlsx")
+    arg_parser.add_argument("--analogs", help="файл со ссылками аналогов, по одной на строку")
+    args = arg_parser.parse_args()
+
+    analog_urls = set()
+    if args.analogs:
+        with open(args.analogs, "r", encoding="utf-8") as f:
+            analog_urls = {line.strip().split("?")[0] for line in f if line.strip()}
+
+    export_rows = (
+        {"data": data, "is_analog": data.get("url") in analog_urls}
+        for file_name in args.files
+        for data in read_results(file_name)
+        if not data.get("page_not_found") and not data.get("error")
+    )
+    excel_errors = write_excel(export_rows, args.out)
+    if excel_errors:
+        print(f"⚠ Строк с ошибками: {len(excel_errors)}")
+        print(format_errors(excel_errors))
+    print(f"✓ {args.out}")
@@ -0,0 +1,523 @@
+"""
+Fixture Site
+Локальный HTTP-сервер с записанными страницами Avito и Циан — для
+воспроизводимых замеров и проверки parse_ad без сети.
+
+Страницы лежат в fixtures/:
+    fixtures/index.json       — список страниц: путь на сервере, файл, капча
+    fixtures/avito/*.html     — страницы объявлений
+    fixtures/cian/*.html
+    fixtures/images/*         — фото галерей
+
+Пути повторяют адреса сайтов, чтобы парсеры и listing_key работали без правок:
+    http://127.0.0.1:8765/avito/moskva/kvartiry/2-k._kvartira_60m_1000001
+    http://127.0.0.1:8765/cian/sale/flat/2000001/
+В HTML {{BASE}} заменяется адресом сервера (ссылки на фото).
+
+Страница с "file": null — снятое объявление (404).
+Страница с "captcha": true при первом запросе отдаёт страницу блокировки,
+при повторном (после «решения») — объявление. Неизвестный путь — 404.
+
+Команды:
+    python fixture_site.py generate   — синтетические страницы по вёрстке,
+                                        которую ожидают парсеры (tooltip
+                                        истории цен, галерея, капча, 404)
+    python fixture_site.py record     — страницы из архива снимков (MHTML):
+                                        скрипты вырезаются, фото из снимка
+                                        сохраняются локально
+    python fixture_site.py serve      — запустить сервер
+"""
+
+import argparse
+import hashlib
+import html
+import json
+import re
+import threading
+from email import policy
+from email import message_from_bytes
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import applog
+
+log = applog.get_logger(__name__)
+
+FIXTURES_DIR = Path("fixtures")
+DEFAULT_PORT = 8765
+
+CAPTCHA_PAGE = """<!DOCTYPE html>
+<html lang="ru"><head><meta charset="utf-8"><title>Доступ ограничен</title></head>
+<body><h2>Доступ ограничен: проблема с IP</h2>
+<p>Подтвердите, что вы не робот (captcha)</p></body></html>
+"""
+
+NOT_FOUND_PAGE = """<!DOCTYPE html>
+<html lang="ru"><head><meta charset="utf-8"><title>Страница не найдена</title></head>
+<body><h1>Такой страницы не существует</h1><p>Страница не найдена</p></body></html>
+"""
+
+CONTENT_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+    ".gif": "image/gif",
+}
+
+
+# ---------- Синтетические страницы ----------
+
+AVITO_TEMPLATE = """<!DOCTYPE html>
+<html lang="ru"><head><meta charset="utf-8"><title>{title}</title>
+<style>
+  body {{ font-family: Arial, sans-serif; margin: 0; }}
+  .layout {{ width: 1000px; margin: 0 auto; }}
+  .price-history-tooltip {{ display: none; position: absolute; background: #fff;
+      border: 1px solid #ccc; padding: 12px; width: 260px; z-index: 10; }}
+  .gallery img {{ width: 640px; height: 480px; }}
+  .map {{ height: 300px; background: #dde; }}
+  .ads {{ height: 250px; background: #fdd; }}
+  .description {{ min-height: 400px; }}
+  .spacer {{ height: 600px; }}
+</style></head>
+<body>
+<div class="layout">
+ <div class="content">
+  <div>
+   <div>
+    <div>
+     <div data-marker="item-view/title-info"><h1 itemprop="name">{title}</h1></div>
+    </div>
+   </div>
+  </div>
+  <div class="gallery">
+   <div data-marker="image-frame/image-wrapper"><img id="gallery-image" src="{first_image}"></div>
+   <div data-marker="image-frame/right-button" onclick="nextImage()">›</div>
+  </div>
+  <div data-marker="item-view/item-price-container">
+   <span id="item-price-value" content="{price}">{price_text}</span>
+   <button aria-label="История цены" onmouseenter="showHistory(this)" onmouseleave="hideHistory()">История цены</button>
+  </div>
+  <p>{price_info}</p>
+  <div class="price-history-tooltip" role="tooltip" id="price-history">{history}</div>
+  <div data-marker="ads" class="ads">Реклама</div>
+  <div data-marker="item-view/item-params"><ul>{params}</ul></div>
+  <div>
+   <h2>Расположение</h2>
+   <div data-marker="delivery/location" itemprop="address">{address}</div>
+   <div><div data-marker="item-map-wrapper" class="map">Карта</div></div>
+  </div>
+  <div id="item-description" class="item-view-description">
+   <div data-marker="item-view/item-description" itemprop="description" class="description">{description}</div>
+  </div>
+  <div data-marker="seller-info/name">{seller}</div>
+  <div class="spacer"></div>
+  <span data-marker="item-view/item-date">{published}</span>
+ </div>
+</div>
+<script>
+  var images = {images};
+  var current = 0;
+  function nextImage() {{
+    current = (current + 1) % images.length;
+    document.getElementById('gallery-image').src = images[current];
+  }}
+  function showHistory(button) {{
+    var tip = document.getElementById('price-history');
+    var r = button.getBoundingClientRect();
+    tip.style.left = (r.left + window.scrollX) + 'px';
+    tip.style.top = (r.bottom + window.scrollY + 4) + 'px';
+    tip.style.display = 'block';
+  }}
+  function hideHistory() {{ document.getElementById('price-history').style.display = 'none'; }}
+</script>
+</body></html>
+"""
+
+CIAN_TEMPLATE = """<!DOCTYPE html>
+<html lang="ru"><head><meta charset="utf-8"><title>{title}</title>
+<style>
+  body {{ font-family: Arial, sans-serif; margin: 0; }}
+  [data-name=OfferCardPageLayout] {{ width: 1000px; margin: 0 auto; }}
+  .tooltip {{ display: none; position: absolute; background: #fff; border: 1px solid #ccc;
+      padding: 12px; width: 260px; z-index: 10; }}
+  .description-text {{ max-height: 120px; overflow: hidden; }}
+  .description-text.expanded {{ max-height: none; }}
+  .stats-popup {{ display: none; position: fixed; top: 100px; left: 300px; background: #fff;
+      border: 1px solid #ccc; padding: 24px; z-index: 20; }}
+  .gallery img {{ width: 200px; height: 150px; }}
+  .spacer {{ height: 500px; }}
+</style></head>
+<body>
+<div data-name="OfferCardPageLayout">
+ <h1 data-name="OfferTitle">{title}</h1>
+ <div data-name="GalleryInnerComponent" class="gallery"><ul>{gallery}</ul></div>
+ <div data-name="PriceInfo"><span data-testid="price-amount">{price_text}</span></div>
+ <button data-name="PriceHistory" onmouseenter="showHistory(this)" onmouseleave="hideHistory()">История цены</button>
+ <div class="tooltip" id="price-history">{history}</div>
+ <div data-name="OfferFactItem"><span>{fact_title}</span><span>{fact_value}</span></div>
+ <div data-name="Geo">{address} На карте</div>
+ <div data-name="ObjectFactoids">{factoids}</div>
+ <div data-name="Description">
+  <div class="description-text" id="description-text">{description}</div>
+  <span data-mark="ShutterToggle" data-id="toggle" onclick="expand()">Узнать больше</span>
+ </div>
+ <div class="spacer"></div>
+ <button data-name="OfferStats" onclick="openStats()">Статистика</button>
+ <div class="stats-popup" id="stats-popup">
+  <div data-name="PublicationDate">{published}</div>
+  <div role="button" aria-label="Закрыть" onclick="closeStats()">×</div>
+ </div>
+</div>
+<script>
+  function showHistory(button) {{
+    var tip = document.getElementById('price-history');
+    var r = button.getBoundingClientRect();
+    tip.style.left = (r.left + window.scrollX) + 'px';
+    tip.style.top = (r.bottom + window.scrollY + 4) + 'px';
+    tip.style.display = 'block';
+  }}
+  function hideHistory() {{ document.getElementById('price-history').style.display = 'none'; }}
+  function expand() {{ document.getElementById('description-text').className += ' expanded'; }}
+  function openStats() {{ document.getElementById('stats-popup').style.display = 'block'; }}
+  function closeStats() {{ document.getElementById('stats-popup').style.display = 'none'; }}
+</script>
+</body></html>
+"""
+
+# Варианты объявлений: квартира, участок (цена за сотку), аренда за м² в месяц
+AVITO_ADS = [
+    {
+        "path": "/avito/moskva/kvartiry/2-k._kvartira_60m_59et._1000001",
+        "title": "2-к. квартира, 60 м², 5/9 эт.",
+        "price": 12500000,
+        "price_text": "12 500 000 ₽",
+        "price_info": "208 333 ₽ за м²",
+        "params": {"Общая площадь": "60 м²", "Количество комнат": "2", "Этаж": "5 из 9"},
+        "history": [("12 января 2025", 13100000), ("3 марта 2025", 12800000), ("20 апреля 2025", 12500000)],
+        "images": 6,
+    },
+    {
+        "path": "/avito/moskovskaya_oblast/zemelnye_uchastki/uchastok_10sot._izhs_1000002",
+        "title": "Участок 10 сот. (ИЖС)",
+        "price": 3200000,
+        "price_text": "3 200 000 ₽",
+        "price_info": "320 000 ₽ за сотку",
+        "params": {"Площадь": "10 сот.", "Категория земель": "ИЖС"},
+        "history": [("5 февраля 2025", 3500000), ("1 апреля 2025", 3200000)],
+        "images": 4,
+    },
+    {
+        "path": "/avito/moskva/kommercheskaya_nedvizhimost/ofis_120m_1000003",
+        "title": "Офис, 120 м²",
+        "price": 1500,
+        "price_text": "1 500 ₽ в месяц за м²",
+        "price_info": "1 500 ₽ в месяц за м²",
+        "params": {"Общая площадь": "120 м²", "Этаж": "2"},
+        "history": [],
+        "images": 3,
+        "captcha": True,
+    },
+]
+
+CIAN_ADS = [
+    {
+        "path": "/cian/sale/flat/2000001/",
+        "title": "Продается 3-комн. квартира, 85 м²",
+        "price_text": "25 000 000 ₽",
+        "fact": ("Цена за метр", "294 118 ₽/м²"),
+        "factoids": {"Общая площадь": "85 м²", "Этаж": "7 из 16", "Год постройки": "2015"},
+        "history": [("10 января 2025", 26000000), ("15 марта 2025", 25000000)],
+        "images": 5,
+    },
+    {
+        "path": "/cian/rent/commercial/2000002/",
+        "title": "Сдается офис, 200 м²",
+        "price_text": "3 600 000 ₽/год",
+        "fact": ("Цена за метр", "18 000 ₽/м² в год"),
+        "factoids": {"Площадь": "200 м²", "Этаж": "3 из 5"},
+        "history": [],
+        "images": 3,
+        "captcha": True,
+    },
+]
+
+REMOVED_PATHS = {
+    "avito": "/avito/moskva/kvartiry/1-k._kvartira_33m_1000099",
+    "cian": "/cian/sale/flat/2000099/",
+}
+
+DESCRIPTION = (
+    "Продаётся объект в хорошем состоянии. Развитая инфраструктура, рядом школа, "
+    "детский сад и парк. Документы готовы, один собственник. "
+) * 12
+
+
+def _image_names(site, number, count):
+    return [f"{site}_{number}_{i}.jpg" for i in range(1, count + 1)]
+
+
+def _write_images(images_dir, names):
+    from PIL import Image, ImageDraw
+
+    images_dir.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        digest = hashlib.md5(name.encode()).digest()
+        img = Image.new("RGB", (1280, 960), tuple(digest[:3]))
+        ImageDraw.Draw(img).text((40, 40), name, fill=(255, 255, 255))
+        img.save(images_dir / name, quality=85)
+
+
+def _avito_page(ad, images):
+    history = " ".join(f"{date} {price:,} ₽".replace(",", " ") for date, price in ad["history"])
+    return AVITO_TEMPLATE.format(
+        title=html.escape(ad["title"]),
+        price=ad["price"],
+        price_text=ad["price_text"],
+        price_info=ad["price_info"],
+        history=history,
+        params="".join(f"<li><span>{k}: </span>{v}</li>" for k, v in ad["params"].items()),
+        address="Москва, ул. Тестовая, д. 1\nСокол, 5 мин.",
+        description=DESCRIPTION,
+        seller="Агентство «Тест»",
+        published="· 3 марта в 12:00",
+        first_image=images[0],
+        images=json.dumps(images),
+    )
+
+
+def _cian_page(ad, images):
+    history = "\n".join(f"{date} {price:,} ₽".replace(",", " ") for date, price in ad["history"])
+    return CIAN_TEMPLATE.format(
+        title=html.escape(ad["title"]),
+        price_text=ad["price_text"],
+        history=history or "—",
+        fact_title=ad["fact"][0],
+        fact_value=ad["fact"][1],
+        address="Москва, ул. Тестовая, д. 2",
+        factoids="".join(f"<div><span>{k}</span>\n<span>{v}</span></div>" for k, v in ad["factoids"].items()),
+        description=DESCRIPTION,
+        published="Опубликовано 3 марта 2025",
+        gallery="".join(f'<li><img src="{src}"></li>' for src in images),
+    )
+
+
+def generate(directory=FIXTURES_DIR):
+    """Синтетические страницы и фото. Возвращает число страниц"""
+    directory = Path(directory)
+    entries = []
+    for site, ads, render in (("avito", AVITO_ADS, _avito_page), ("cian", CIAN_ADS, _cian_page)):
+        (directory / site).mkdir(parents=True, exist_ok=True)
+        for number, ad in enumerate(ads, 1):
+            names = _image_names(site, number, ad["images"])
+            _write_images(directory / "images", names)
+            page = render(ad, ["{{BASE}}/images/" + name for name in names])
+            file_name = f"{site}/synthetic_{number}.html"
+            (directory / file_name).write_text(page, encoding="utf-8")
+            entries.append({"path": ad["path"], "file": file_name, "captcha": ad.get("captcha", False)})
+        # Снятое объявление: страница «не найдено» с кодом 404
+        entries.append({"path": REMOVED_PATHS[site], "file": None, "captcha": False})
+
+    _write_index(directory, entries, replace_prefix=("avito/synthetic_", "cian/synthetic_"))
+    return len(entries)
+
+
+# ---------- Запись из архива снимков ----------
+
+SCRIPT_RE = re.compile(r"<script\b.*?</script>", re.IGNORECASE | re.DOTALL)
+
+
+def _server_path(url):
+    """https://www.avito.ru/moskva/... → /avito/moskva/..."""
+    parts = urlsplit(url)
+    site = "avito" if "avito" in parts.netloc else "cian" if "cian" in parts.netloc else None
+    return f"/{site}{parts.path}" if site else None
+
+
+def record(archive, directory=FIXTURES_DIR, latest_only=True):
+    """
+    Страницы из архива снимков: HTML без скриптов (страница не ходит в сеть
+    и не меняется между прогонами), фото из частей MHTML — в fixtures/images.
+    """
+    directory = Path(directory)
+    images_dir = directory / "images"
+    images_dir.mkdir(parents=True, exist_ok=True)
+    entries = []
+
+    for entry in archive.entries(latest_only=latest_only):
+        path = _server_path(entry["url"])
+        if not path:
+            continue
+        site = path.split("/")[1]
+        message = message_from_bytes(archive.load(entry["sha256"]), policy=policy.default)
+
+        page_html = None
+        local_images = {}
+        for part in message.walk():
+            content_type = part.get_content_type()
+            if content_type == "text/html" and page_html is None:
+                payload = part.get_payload(decode=True)
+                page_html = payload.decode(part.get_content_charset() or "utf-8", errors="replace")
+            elif content_type.startswith("image/") and part["Content-Location"]:
+                payload = part.get_payload(decode=True)
+                extension = "." + content_type.split("/")[1].split("+")[0]
+                name = hashlib.sha1(payload).hexdigest()[:16] + extension
+                (images_dir / name).write_bytes(payload)
+                local_images[part["Content-Location"]] = "{{BASE}}/images/" + name
+
+        if page_html is None:
+            continue
+
+        page_html = SCRIPT_RE.sub("", page_html)
+        for original, local in local_images.items():
+            page_html = page_html.replace(original, local)
+
+        file_name = f"{site}/{entry['sha256'][:16]}.html"
+        (directory / site).mkdir(parents=True, exist_ok=True)
+        (directory / file_name).write_text(page_html, encoding="utf-8")
+        entries.append({"path": path, "file": file_name, "captcha": False})
+
+    _write_index(directory, entries)
+    return len(entries)
+
+
+def _write_index(directory, entries, replace_prefix=None):
+    """Дописывает страницы в index.json (повторная запись того же пути заменяет её)"""
+    index_path = directory / "index.json"
+    existing = load_index(directory)
+    if replace_prefix:
+        existing = [e for e in existing
+                    if e["file"] is not None and not e["file"].startswith(replace_prefix)
+                    and e["path"] not in REMOVED_PATHS.values()]
+    by_path = {e["path"]: e for e in existing}
+    by_path.update({e["path"]: e for e in entries})
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(list(by_path.values()), f, ensure_ascii=False, indent=2)
+
+
+def load_index(directory=FIXTURES_DIR):
+    index_path = Path(directory) / "index.json"
+    if not index_path.exists():
+        return []
+    with open(index_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ---------- Сервер ----------
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    site = None  # FixtureServer, задаётся в подклассе
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        fixtures = self.site
+
+        if path.startswith("/images/"):
+            self._send_file(fixtures.directory / "images" / Path(path).name)
+            return
+
+        entry = fixtures.pages.get(path) or fixtures.pages.get(path.rstrip("/") + "/")
+        if entry is None or entry.get("file") is None:
+            self._send_body(404, NOT_FOUND_PAGE.encode("utf-8"), CONTENT_TYPES[".html"])
+            return
+
+        if entry.get("captcha") and fixtures.first_visit(path):
+            self._send_body(200, CAPTCHA_PAGE.encode("utf-8"), CONTENT_TYPES[".html"])
+            return
+
+        page = (fixtures.directory / entry["file"]).read_text(encoding="utf-8")
+        self._send_body(200, page.replace("{{BASE}}", fixtures.base_url).encode("utf-8"), CONTENT_TYPES[".html"])
+
+    def _send_file(self, path):
+        if not path.is_file():
+            self.send_error(404)
+            return
+        content_type = CONTENT_TYPES.get(path.suffix.lower(), "application/octet-stream")
+        self._send_body(200, path.read_bytes(), content_type)
+
+    def _send_body(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug("fixture %s", format % args)
+
+
+class FixtureServer:
+    """HTTP-сервер страниц из fixtures/ в фоновом потоке"""
+
+    def __init__(self, directory=FIXTURES_DIR, port=0, host="127.0.0.1"):
+        self.directory = Path(directory)
+        self.pages = {entry["path"]: entry for entry in load_index(self.directory)}
+        self._visited = set()
+        self._lock = threading.Lock()
+        handler = type("FixtureHandler", (_FixtureHandler,), {"site": self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.base_url = f"http://{host}:{self.server.server_address[1]}"
+        self._thread = None
+
+    def first_visit(self, path):
+        """True при первом запросе страницы с капчей (до «решения»)"""
+        with self._lock:
+            if path in self._visited:
+                return False
+            self._visited.add(path)
+            return True
+
+    def reset_captchas(self):
+        """Следующий запрос каждой страницы с капчей снова отдаст капчу"""
+        with self._lock:
+            self._visited.clear()
+
+    def urls(self, site=None):
+        return [
+            self.base_url + path for path, entry in self.pages.items()
+            if site is None or path.startswith(f"/{site}/")
+        ]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fixture-site", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Локальный сайт с записанными страницами")
+    arg_parser.add_argument("--dir", default=str(FIXTURES_DIR))
+    sub = arg_parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("generate", help="синтетические страницы Avito и Циан")
+    record_cmd = sub.add_parser("record", help="страницы из архива снимков")
+    record_cmd.add_argument("--root", default="Скриншоты/_snapshots")
+    record_cmd.add_argument("--all", action="store_true", help="все снимки, а не только последние")
+    serve_cmd = sub.add_parser("serve", help="запустить сервер")
+    serve_cmd.add_argument("--port", type=int, default=DEFAULT_PORT)
+
+    args = arg_parser.parse_args()
+    applog.setup()
+
+    if args.command == "generate":
+        print(f"✓ Создано страниц: {generate(args.dir)} в {args.dir}")
+
+    elif args.command == "record":
+        from snapshot_archive import SnapshotArchive
+        print(f"✓ Записано страниц: {record(SnapshotArchive(args.root), args.dir, latest_only=not args.all)}")
+
+    elif args.command == "serve":
+        fixture_server = FixtureServer(args.dir, port=args.port)
+        print(f"✓ Сервер: {fixture_server.base_url}")
+        for url in fixture_server.urls():
+            print(f"  {url}")
+        try:
+            fixture_server.server.serve_forever()
+        except KeyboardInterrupt:
+            fixture_server.server.server_close()
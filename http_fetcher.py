@@ -0,0 +1,369 @@
+"""
+HTTP Fetcher
+Быстрый сбор данных объявлений без браузера: aiohttp + lxml.
+
+Страница скачивается обычным HTTP-запросом, поля (заголовок, цена, адрес,
+описание, параметры) извлекаются скомпилированными XPath по серверной
+разметке — тем же атрибутам data-marker / data-name, что и в парсерах.
+Пересчёт площадей и цен выполняет _fill_derived_fields парсера сайта,
+поэтому результат совпадает с parse_ad по ключам и смыслу.
+
+Если страница заблокирована, отдала капчу или в ней нет заголовка/цены,
+fetch возвращает None — такое объявление нужно парсить через браузер.
+"""
+
+import asyncio
+import json
+import re
+import time
+from datetime import datetime
+
+import aiohttp
+from lxml import etree, html as lxml_html
+
+import applog
+import browser_profile
+import metrics
+from listing_cache import detect_site, listing_key
+
+log = applog.get_logger(__name__)
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+
+PRICE_INFO_KEYWORDS = ['м²', 'залог', 'сотку', 'в год', 'за гектар', 'за га']
+
+SPACES_RE = re.compile(r"[ \t\r\f\v\xa0]+")
+
+
+def _xpaths(*expressions):
+    return [etree.XPath(expr) for expr in expressions]
+
+
+# Списки XPath в порядке приоритета — как списки CSS-селекторов в parse_ad
+XPATHS = {
+    "avito": {
+        "title": _xpaths(
+            "//*[@data-marker='item-view/title-info']//h1",
+            "//h1[@itemprop='name']",
+            "//h1",
+        ),
+        "price": _xpaths(
+            "//*[contains(@id, 'item-price-value')]",
+            "//*[@data-marker='item-view/item-price']",
+        ),
+        "address": _xpaths(
+            "//*[@data-marker='delivery/location']",
+            "//*[@itemprop='address']",
+        ),
+        "description": _xpaths(
+            "//*[@data-marker='item-view/item-description']",
+            "//*[@itemprop='description']",
+        ),
+        "seller_name": _xpaths(
+            "//*[@data-marker='seller-info/name']",
+        ),
+        "published_date": _xpaths(
+            "//*[@data-marker='item-view/item-date']",
+        ),
+        "params": _xpaths(
+            "//*[@data-marker='item-view/item-params']//li",
+            "//*[contains(@class, 'params-paramsList')]//li",
+        ),
+        "paragraphs": _xpaths("//p"),
+    },
+    "cian": {
+        "title": _xpaths(
+            "//h1[@data-name='OfferTitle']",
+            "//*[@data-name='OfferTitle']//h1",
+            "//h1",
+        ),
+        "price": _xpaths(
+            "//*[@data-testid='price-amount']",
+            "//*[@data-name='PriceInfo']",
+            "//*[@data-name='OfferPrice']",
+            "//*[@itemprop='price']",
+        ),
+        "address": _xpaths(
+            "//*[@data-name='Geo']",
+            "//*[@data-name='Address']",
+            "//*[@itemprop='address']",
+        ),
+        "description": _xpaths(
+            "//*[@data-name='Description']",
+            "//*[@data-name='OfferCardDescription']",
+            "//*[@itemprop='description']",
+        ),
+        "published_date": _xpaths(
+            "//*[@data-name='PublicationDate']",
+        ),
+        "params": _xpaths(
+            "//*[contains(@data-name, 'ObjectFactoids')]//div",
+            "//*[@data-name='OfferCardFeatures']//li",
+        ),
+        "facts": _xpaths("//*[@data-name='OfferFactItem']"),
+    },
+}
+
+
+def element_text(el):
+    """Видимый текст элемента: строки блоков через \\n, пробелы схлопнуты"""
+    for bad in el.xpath(".//script | .//style | .//noscript"):
+        bad.drop_tree()
+
+    lines = []
+    for chunk in el.itertext():
+        for line in chunk.split("\n"):
+            line = SPACES_RE.sub(" ", line).strip()
+            if line:
+                lines.append(line)
+    return "\n".join(lines)
+
+
+def first_text(tree, xpaths):
+    for xpath in xpaths:
+        for el in xpath(tree):
+            text = element_text(el)
+            if text:
+                return text
+    return ""
+
+
+def params_from_items(items):
+    """Та же логика, что _extract_params: 'Ключ: значение' или 'Ключ\\nзначение'"""
+    params = {}
+    for item in items:
+        text = element_text(item)
+        if ':' in text:
+            key, value = text.split(':', 1)
+            params[key.strip()] = value.strip().replace("\n", " ")
+        elif '\n' in text:
+            parts = text.split('\n')
+            if len(parts) >= 2:
+                params[parts[0].strip()] = parts[1].strip()
+    return params
+
+
+def page_state(text, parser):
+    """
+    'not_found', 'blocked' или None по тексту страницы.
+    Фразы берутся у адаптера сайта (NOT_FOUND_PHRASES / BLOCK_PHRASES) —
+    те же, что проверяет браузерный парсер.
+    """
+    lowered = text.lower()
+    if any(phrase in lowered for phrase in parser.NOT_FOUND_PHRASES):
+        return "not_found"
+    if any(phrase in lowered for phrase in parser.BLOCK_PHRASES):
+        return "blocked"
+    return None
+
+
+def extract_avito(tree, url, parser):
+    paths = XPATHS["avito"]
+    ad_id = listing_key(url).split(":")[-1]
+
+    data = {
+        "id": ad_id,
+        "url": url,
+        "parsed_at": datetime.now().isoformat(),
+        "source": "http",
+    }
+
+    data["title"] = first_text(tree, paths["title"])
+    price_text = first_text(tree, paths["price"]).replace("\n", " ").strip()
+    data["price_text"] = price_text
+    data["price"], data["price_type"] = parser._parse_price(price_text)
+
+    price_info = None
+    for p in paths["paragraphs"][0](tree):
+        text = element_text(p).replace("\n", " ")
+        if '₽' in text and any(x in text for x in PRICE_INFO_KEYWORDS):
+            price_info = text
+            break
+    data["price_info"] = price_info
+    data["price_per_m2"] = parser.extract_price_per_m2(price_info)
+
+    data["address"] = parser._clean_address(first_text(tree, paths["address"]))
+    data["description"] = first_text(tree, paths["description"])
+
+    params = {}
+    for xpath in paths["params"]:
+        params = params_from_items(xpath(tree))
+        if params:
+            break
+    data["params"] = params
+
+    data["seller_name"] = first_text(tree, paths["seller_name"])
+    data["published_date"] = first_text(tree, paths["published_date"])
+    data["screenshots"] = {}
+
+    return data
+
+
+def extract_cian(tree, url, parser):
+    paths = XPATHS["cian"]
+
+    data = {
+        "url": url,
+        "parsed_at": datetime.now().isoformat(),
+        "source": "http",
+    }
+
+    data["title"] = first_text(tree, paths["title"])
+    price_text = first_text(tree, paths["price"]).replace("\n", " ").strip()
+    data["price_text"] = price_text
+    data["price"], data["price_type"] = parser._parse_price(price_text)
+
+    facts = []
+    for item in paths["facts"][0](tree):
+        spans = item.xpath(".//span")
+        if len(spans) >= 2:
+            facts.append((element_text(spans[0]), element_text(spans[1])))
+    price_per_m2 = parser._price_per_m2_from_facts(facts)
+    if price_per_m2:
+        data["price_per_m2"] = price_per_m2
+
+    data["address"] = parser._clean_address(first_text(tree, paths["address"]).replace("\n", " "))
+    data["description"] = first_text(tree, paths["description"]).replace("Свернуть", "").strip()
+
+    params = {}
+    for xpath in paths["params"]:
+        params = params_from_items(xpath(tree))
+        if params:
+            break
+    data["params"] = params
+
+    data["published_date"] = first_text(tree, paths["published_date"])
+    data["screenshots"] = {}
+
+    return data
+
+
+EXTRACTORS = {
+    "avito": extract_avito,
+    "cian": extract_cian,
+}
+
+
+def extract(site, url, page_html, parser):
+    """
+    Разбор HTML страницы объявления.
+    Возвращает dict как у parse_ad, {'url', 'page_not_found'} или None,
+    если страница заблокирована либо в ней нет основных полей.
+    """
+    tree = lxml_html.fromstring(page_html)
+
+    body = tree.find("body")
+    state = page_state(body.text_content() if body is not None else page_html, parser)
+    if state == "not_found":
+        return {"url": url, "page_not_found": True}
+    if state == "blocked":
+        return None
+
+    data = EXTRACTORS[site](tree, url, parser)
+
+    # Неполная страница (данные подгружаются скриптами) — нужен браузер
+    if not data["title"] or data["price"] is None:
+        return None
+
+    parser._fill_derived_fields(data)
+    return data
+
+
+def _load_cookies(site):
+    path = browser_profile.cookie_jar_path(site)
+    if not path.exists():
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return {c["name"]: c["value"] for c in json.load(f) if "name" in c}
+    except (OSError, ValueError, TypeError):
+        return {}
+
+
+class HttpFetcher:
+    """Параллельная загрузка объявлений по HTTP"""
+
+    def __init__(self, parsers, concurrency=8, timeout=20, proxy_pool=None):
+        # parsers: {"avito": AvitoParser, "cian": CianParser} — для пересчёта полей
+        self.parsers = parsers
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.proxy_pool = proxy_pool
+
+    async def _fetch_one(self, session, semaphore, url, cookies):
+        site = detect_site(url)
+        if site not in EXTRACTORS or self.parsers.get(site) is None:
+            return url, None
+
+        async with semaphore:
+            proxy = self.proxy_pool.acquire() if self.proxy_pool else None
+            started = time.monotonic()
+            try:
+                async with session.get(
+                    url,
+                    proxy=proxy.url if proxy else None,
+                    cookies=cookies.get(site)
+                ) as resp:
+                    page_html = await resp.text(errors="replace")
+                    status = resp.status
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                log.warning("  ✗ HTTP %s: %s", url, e)
+                if proxy:
+                    self.proxy_pool.report(proxy, ok=False)
+                    self.proxy_pool.release(proxy)
+                return url, None
+
+            latency = time.monotonic() - started
+
+        if status == 404:
+            data = {"url": url, "page_not_found": True}
+        elif status != 200:
+            data = None
+        else:
+            try:
+                data = extract(site, url, page_html, self.parsers[site])
+            except Exception as e:
+                log.warning("  ✗ Ошибка разбора %s: %s", url, e)
+                data = None
+
+        if proxy:
+            # Капча — только страница блокировки или 429; неполная страница
+            # (данные подгружаются скриптами) прокси не в вину
+            captcha = status == 429 or (data is None and status == 200 and page_state(page_html, self.parsers[site]) == "blocked")
+            self.proxy_pool.report(proxy, latency=latency, ok=status < 500, captcha=captcha)
+            self.proxy_pool.release(proxy)
+
+        return url, data
+
+    async def _fetch_all(self, urls, cookies):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        headers = {
+            "User-Agent": USER_AGENT,
+            "Accept-Language": "ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7",
+        }
+        async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session:
+            return await asyncio.gather(
+                *(self._fetch_one(session, semaphore, url, cookies) for url in urls)
+            )
+
+    def fetch_many(self, urls):
+        """
+        Загружает объявления параллельно.
+        Возвращает (dict url → данные, список ссылок для парсинга в браузере).
+        """
+        urls = list(urls)
+        # Cookies браузерного профиля читаются один раз на сайт, а не на каждую ссылку
+        cookies = {site: _load_cookies(site) for site in {detect_site(url) for url in urls} & set(EXTRACTORS)}
+        results = {}
+        fallback = []
+        for url, data in asyncio.run(self._fetch_all(urls, cookies)):
+            if data is None:
+                fallback.append(url)
+                metrics.RETRIES.inc(site=detect_site(url) or "", stage="http_fallback")
+            else:
+                results[url] = data
+        return results, fallback
@@ -0,0 +1,480 @@
+"""
+Job Scheduler
+Повторяющиеся задачи парсинга по расписанию с приоритетами.
+
+Задача — сохранённый набор ссылок, ссылка на поисковую выдачу или мониторинг
+кэша, плюс интервал повтора. Задачи хранятся в jobs.json и выполняются
+по одной в порядке (приоритет, время запуска):
+    urgent      — срочная оценка, вытесняет остальные
+    normal      — обычные наборы ссылок
+    background  — мониторинг и сбор выдачи
+
+Срочная задача прерывает выполняющуюся менее приоритетную между объявлениями:
+необработанные ссылки остаются в задаче и дорабатываются при следующем запуске.
+
+Нагрузка на сайты ограничена бюджетом страниц в час на сайт (скользящее окно).
+Когда бюджет исчерпан, задача откладывается до освобождения окна — так
+работа распределяется по суткам, а не упирается в блокировки.
+
+Запуск без GUI:
+    python job_scheduler.py add --name Оценка --urls-file urls.txt --every 0 --priority urgent
+    python job_scheduler.py add --name Выдача --search "https://www.avito.ru/..." --every 360
+    python job_scheduler.py list
+    python job_scheduler.py run
+    python job_scheduler.py run --metrics-port 9108   # с эндпоинтом метрик
+    python job_scheduler.py run --profile             # с профилированием объявлений
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+import applog
+import columnar_export
+import metrics
+from profiling import profiler
+from listing_cache import detect_site
+from listing_monitor import ListingMonitor
+from search_crawler import SearchCrawler
+
+PRIORITIES = {"urgent": 0, "normal": 1, "background": 2}
+
+# Страниц объявлений в час на сайт
+DEFAULT_BUDGETS = {"avito": 120, "cian": 120}
+
+RESULTS_DIR = Path("Результаты")
+
+# Попыток разбора ссылки за один запуск задачи; после ошибки ссылка уходит в конец очереди
+MAX_ATTEMPTS = 3
+
+
+class Job:
+    """Задача расписания; every — интервал повтора в минутах, 0 — однократно"""
+
+    KINDS = ("urls", "search", "monitor")
+
+    def __init__(self, name, kind, urls=None, search_url=None, every=0, priority="normal",
+                 next_run=None, pending=None, last_run=None):
+        if kind not in self.KINDS:
+            raise ValueError(f"Неизвестный тип задачи: {kind}")
+        if priority not in PRIORITIES:
+            raise ValueError(f"Неизвестный приоритет: {priority}")
+        self.name = name
+        self.kind = kind
+        self.urls = list(urls or [])
+        self.search_url = search_url
+        self.every = every
+        self.priority = priority
+        self.next_run = next_run if next_run is not None else time.time()
+        # Ссылки, оставшиеся после прерывания или исчерпания бюджета
+        self.pending = list(pending or [])
+        self.last_run = last_run
+
+    @property
+    def rank(self):
+        return PRIORITIES[self.priority]
+
+    def sites(self):
+        if self.kind == "search":
+            return {detect_site(self.search_url)}
+        if self.kind == "urls":
+            return {detect_site(url) for url in (self.pending or self.urls)} - {None}
+        return set(DEFAULT_BUDGETS)
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+class RateBudget:
+    """Скользящее окно: не больше limit страниц сайта за window секунд"""
+
+    def __init__(self, limits=None, window=3600):
+        self.limits = dict(limits or DEFAULT_BUDGETS)
+        self.window = window
+        self._events = {site: deque() for site in self.limits}
+        self._lock = threading.Lock()
+
+    def _trim(self, site, now):
+        events = self._events.setdefault(site, deque())
+        while events and events[0] <= now - self.window:
+            events.popleft()
+        return events
+
+    def available(self, site, now=None):
+        if site not in self.limits:
+            return True
+        with self._lock:
+            return len(self._trim(site, now or time.time())) < self.limits[site]
+
+    def spend(self, site, now=None):
+        """Списывает одну страницу; False, если бюджет исчерпан"""
+        if site not in self.limits:
+            return True
+        now = now or time.time()
+        with self._lock:
+            events = self._trim(site, now)
+            if len(events) >= self.limits[site]:
+                return False
+            events.append(now)
+            return True
+
+    def next_free(self, site, now=None):
+        """Время, когда у сайта освободится страница в окне"""
+        now = now or time.time()
+        with self._lock:
+            events = self._trim(site, now)
+            if site not in self.limits or len(events) < self.limits[site]:
+                return now
+            # Нулевой лимит: сайт отключён, проверка — через окно
+            return events[0] + self.window if events else now + self.window
+
+
+class JobScheduler:
+    """Очередь задач с приоритетами, хранится в jobs.json"""
+
+    def __init__(self, path="jobs.json", budgets=None):
+        self.path = Path(path)
+        self.budget = RateBudget(budgets)
+        self.jobs = {}
+        self._lock = threading.Lock()
+
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for data in json.load(f):
+                    job = Job.from_dict(data)
+                    self.jobs[job.name] = job
+
+    def save(self):
+        with self._lock:
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump([job.to_dict() for job in self.jobs.values()], f, ensure_ascii=False, indent=2)
+            tmp_path.replace(self.path)
+
+    def add(self, job):
+        with self._lock:
+            self.jobs[job.name] = job
+        self.save()
+
+    def remove(self, name):
+        with self._lock:
+            self.jobs.pop(name, None)
+        self.save()
+
+    def runnable(self, job, now=None):
+        """Есть ли бюджет хотя бы у одного сайта задачи"""
+        return any(self.budget.available(site, now) for site in job.sites())
+
+    def next_job(self, now=None):
+        """Самая приоритетная задача, срок которой наступил и у сайтов которой есть бюджет"""
+        now = now or time.time()
+        with self._lock:
+            due = [job for job in self.jobs.values() if job.next_run <= now]
+        for job in sorted(due, key=lambda j: (j.rank, j.next_run)):
+            if self.runnable(job, now):
+                return job
+        return None
+
+    def preempts(self, job, now=None):
+        """
+        Есть ли наступившая задача приоритетнее job, которую next_job запустил бы.
+        Задача без бюджета не вытесняет: иначе вытесненная сразу запускалась бы снова.
+        """
+        now = now or time.time()
+        with self._lock:
+            higher = [
+                other for other in self.jobs.values()
+                if other.rank < job.rank and other.next_run <= now
+            ]
+        return any(self.runnable(other, now) for other in higher)
+
+    def finish(self, job, interrupted=False, now=None, blocked=None):
+        """
+        Планирует следующий запуск; однократные выполненные задачи удаляются.
+        blocked — сайты, на которых задача упёрлась в бюджет: продолжение — когда
+        освободится первый из них. Вытесненная задача (blocked пуст) продолжится
+        сразу после более приоритетной.
+        """
+        now = now or time.time()
+        job.last_run = datetime.now().isoformat()
+        if interrupted:
+            job.next_run = min((self.budget.next_free(site, now) for site in blocked or ()), default=now)
+        elif job.every:
+            job.next_run = now + job.every * 60
+        else:
+            self.remove(job.name)
+            return
+        self.save()
+
+    def seconds_until_next(self, now=None):
+        """Секунд до запуска ближайшей задачи: наступления срока и освобождения бюджета её сайтов"""
+        now = now or time.time()
+        with self._lock:
+            jobs = list(self.jobs.values())
+        if not jobs:
+            return None
+        ready = (
+            max(job.next_run, min((self.budget.next_free(site, now) for site in job.sites()), default=now))
+            for job in jobs
+        )
+        return max(0.0, min(ready) - now)
+
+
+class JobRunner:
+    """Выполнение задач планировщика парсерами сайтов"""
+
+    def __init__(self, scheduler, get_parser, listing_cache=None, proxy_pool=None,
+                 on_log=print, results_dir=RESULTS_DIR):
+        # get_parser(site) → парсер сайта (создаётся по требованию)
+        self.scheduler = scheduler
+        self.get_parser = get_parser
+        self.listing_cache = listing_cache
+        self.proxy_pool = proxy_pool
+        self.on_log = on_log
+        self.results_dir = Path(results_dir)
+        self._stop = False
+
+    def stop(self):
+        self._stop = True
+
+    def _save_results(self, job, results):
+        if not results:
+            return None
+        self.results_dir.mkdir(parents=True, exist_ok=True)
+        path = self.results_dir / f"{job.name}_{datetime.now():%Y%m%d_%H%M%S}.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        if columnar_export.available():
+            # Колоночная копия для анализа сканов за длительный период
+            try:
+                columnar_export.export(results, path.with_suffix(".parquet"))
+            except Exception as e:
+                self.on_log(f"⚠ Не удалось сохранить {path.with_suffix('.parquet')}: {e}")
+        return path
+
+    def _parse_urls(self, job, urls):
+        """
+        Парсит ссылки с учётом бюджета и вытеснения.
+        Ссылки сайта без бюджета пропускаются (остаются в очереди), остальные сайты продолжают.
+        Ссылка с ошибкой разбора повторяется в конце очереди, до MAX_ATTEMPTS раз.
+        Возвращает (результаты, остаток, сайты без бюджета).
+        """
+        results = []
+        queue = list(urls)
+        blocked = set()
+        attempts = {}
+        while queue and not self._stop:
+            url = next((u for u in queue if detect_site(u) not in blocked), None)
+            if url is None:
+                self.on_log(f"⏸ Бюджет на час исчерпан ({', '.join(sorted(blocked))}), задача «{job.name}» отложена")
+                break
+            if self.scheduler.preempts(job):
+                self.on_log(f"⏸ Задача «{job.name}» уступает очередь срочной")
+                # Продолжение — сразу после срочной, а не по освобождению бюджета
+                blocked = set()
+                break
+
+            site = detect_site(url)
+            metrics.WORKER_QUEUE.set(len(queue), worker="scheduler")
+            parser = self.get_parser(site)
+            if parser is None:
+                queue.remove(url)
+                self.on_log(f"✗ {url}: сайт не поддерживается, ссылка пропущена")
+                continue
+            if not self.scheduler.budget.spend(site):
+                blocked.add(site)
+                continue
+
+            try:
+                parser.recycle_if_needed()
+                ad_started = time.monotonic()
+                with profiler.profile_ad(site, url):
+                    data = parser.parse_ad(url.split("?")[0])
+            except Exception as e:
+                metrics.ADS_PROCESSED.inc(site=site, status="error")
+                queue.remove(url)
+                attempts[url] = attempts.get(url, 0) + 1
+                if attempts[url] < MAX_ATTEMPTS:
+                    queue.append(url)
+                    self.on_log(f"✗ {url}: {e} — повтор в конце очереди")
+                else:
+                    self.on_log(f"✗ {url}: {e} — пропущена после {MAX_ATTEMPTS} попыток")
+                continue
+            queue.remove(url)
+            if data.get("page_not_found"):
+                metrics.ADS_PROCESSED.inc(site=site, status="not_found")
+                continue
+
+            metrics.AD_SECONDS.observe(time.monotonic() - ad_started, site=site)
+            metrics.ADS_PROCESSED.inc(site=site, status="ok")
+            results.append(data)
+            if self.listing_cache is not None:
+                self.listing_cache.add(data)
+
+        metrics.WORKER_QUEUE.set(len(queue), worker="scheduler")
+        return results, queue, blocked
+
+    def run_job(self, job):
+        """Выполняет задачу. Возвращает True, если задача завершена, а не прервана"""
+        self.on_log(f"▶ Задача «{job.name}» ({job.kind}, {job.priority})")
+
+        blocked = set()
+        crawl_blocked = set()
+        if job.kind == "monitor":
+            monitor = ListingMonitor(self.listing_cache, self.get_parser, self.proxy_pool,
+                                     budget=self.scheduler.budget)
+            results = monitor.run(should_stop=lambda: self._stop or self.scheduler.preempts(job))
+            self.on_log(f"✓ Мониторинг: {monitor.summary()}")
+            interrupted = monitor.interrupted
+            blocked = monitor.blocked
+        else:
+            urls = job.pending
+            if not urls and job.kind == "search":
+                parser = self.get_parser(detect_site(job.search_url))
+                crawler = SearchCrawler(parser, cache=self.listing_cache, budget=self.scheduler.budget)
+                cards = crawler.crawl(job.search_url)
+                urls = [card["url"] for card in cards]
+                self.on_log(f"✓ Из выдачи новых объявлений: {len(urls)}")
+                if crawler.budget_exhausted:
+                    crawl_blocked = {detect_site(job.search_url)}
+                    self.on_log(f"⏸ Бюджет {detect_site(job.search_url)} исчерпан на странице выдачи, "
+                                f"обход остановлен")
+            elif not urls:
+                urls = job.urls
+
+            results, job.pending, blocked = self._parse_urls(job, urls)
+            # Недообойдённая выдача — задача повторится, когда освободится бюджет
+            blocked |= crawl_blocked
+            interrupted = bool(job.pending) or bool(crawl_blocked)
+
+        if self.listing_cache is not None:
+            self.listing_cache.save()
+
+        path = self._save_results(job, results)
+        self.on_log(f"✓ Задача «{job.name}»: объявлений {len(results)}" + (f", сохранено в {path}" if path else ""))
+        self.scheduler.finish(job, interrupted=interrupted, blocked=blocked)
+        return not interrupted
+
+    def loop(self, idle_sleep=30):
+        """Выполняет задачи по расписанию до stop()"""
+        while not self._stop:
+            job = self.scheduler.next_job()
+            if job is None:
+                # Срок задачи без бюджета уже наступил — ждём освобождения окна, а не опрашиваем каждую секунду
+                wait = self.scheduler.seconds_until_next()
+                time.sleep(max(1, min(idle_sleep, wait if wait is not None else idle_sleep)))
+                continue
+            try:
+                self.run_job(job)
+            except Exception as e:
+                self.on_log(f"✗ Ошибка задачи «{job.name}»: {e}")
+                self.scheduler.finish(job, interrupted=True, now=time.time() + idle_sleep)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Планировщик задач парсинга")
+    arg_parser.add_argument("--jobs", default="jobs.json")
+    sub = arg_parser.add_subparsers(dest="command", required=True)
+
+    add_cmd = sub.add_parser("add", help="добавить задачу")
+    add_cmd.add_argument("--name", required=True)
+    source = add_cmd.add_mutually_exclusive_group(required=True)
+    source.add_argument("--urls-file", help="файл со ссылками, по одной в строке")
+    source.add_argument("--search", help="ссылка на поисковую выдачу")
+    source.add_argument("--monitor", action="store_true", help="проверка изменений в кэше")
+    add_cmd.add_argument("--every", type=int, default=0, help="интервал повтора, минут (0 — однократно)")
+    add_cmd.add_argument("--priority", choices=list(PRIORITIES), default=None)
+
+    sub.add_parser("list", help="список задач")
+
+    remove_cmd = sub.add_parser("remove", help="удалить задачу")
+    remove_cmd.add_argument("name")
+
+    run_cmd = sub.add_parser("run", help="выполнять задачи по расписанию")
+    run_cmd.add_argument("--avito-budget", type=int, default=DEFAULT_BUDGETS["avito"], help="страниц в час")
+    run_cmd.add_argument("--cian-budget", type=int, default=DEFAULT_BUDGETS["cian"], help="страниц в час")
+    run_cmd.add_argument("--metrics-port", type=int, default=0,
+                         help=f"порт эндпоинта метрик Prometheus (0 — выключен, обычно {metrics.DEFAULT_PORT})")
+    run_cmd.add_argument("--profile", action="store_true",
+                         help="профилировать каждое объявление (cProfile, tracemalloc)")
+
+    args = arg_parser.parse_args()
+    applog.setup()
+
+    if args.command == "add":
+        if args.urls_file:
+            with open(args.urls_file, "r", encoding="utf-8") as f:
+                job = Job(args.name, "urls", urls=[line.strip() for line in f if line.strip()],
+                          every=args.every, priority=args.priority or "normal")
+        elif args.search:
+            job = Job(args.name, "search", search_url=args.search,
+                      every=args.every, priority=args.priority or "background")
+        else:
+            job = Job(args.name, "monitor", every=args.every, priority=args.priority or "background")
+        JobScheduler(args.jobs).add(job)
+        print(f"✓ Задача «{job.name}» добавлена")
+
+    elif args.command == "list":
+        for job in sorted(JobScheduler(args.jobs).jobs.values(), key=lambda j: (j.rank, j.next_run)):
+            next_run = datetime.fromtimestamp(job.next_run).strftime("%d.%m %H:%M")
+            print(f"{job.priority:<10} {job.name:<30} {job.kind:<8} каждые {job.every} мин, "
+                  f"следующий запуск {next_run}, в очереди ссылок {len(job.pending)}")
+
+    elif args.command == "remove":
+        JobScheduler(args.jobs).remove(args.name)
+
+    elif args.command == "run":
+        from avito_parser import AvitoParser
+        from cian_parser import CianParser
+        from listing_cache import ListingCache
+        from proxy_pool import ProxyPool
+
+        proxy_pool = ProxyPool.from_file("proxies.txt")
+        parsers = {}
+
+        def on_captcha(site):
+            def handler():
+                input(f"⚠ {site}: решите капчу в браузере и нажмите Enter...")
+                parsers[site].continue_after_captcha()
+            return handler
+
+        def get_parser(site):
+            if site not in parsers:
+                parser_cls = {"avito": AvitoParser, "cian": CianParser}.get(site)
+                if parser_cls is None:
+                    return None
+                parsers[site] = parser_cls(slow_mode=True, on_captcha=on_captcha(site), proxy_pool=proxy_pool)
+            return parsers[site]
+
+        scheduler = JobScheduler(args.jobs, budgets={"avito": args.avito_budget, "cian": args.cian_budget})
+        runner = JobRunner(scheduler, get_parser, ListingCache(), proxy_pool)
+
+        if args.profile:
+            profiler.set_enabled(True)
+            print(f"✓ Профилирование: {profiler.directory}")
+
+        metrics_server = snapshots = None
+        if args.metrics_port:
+            metrics_server = metrics.serve(port=args.metrics_port)
+            snapshots = metrics.SnapshotWriter().start()
+            print(f"✓ Метрики: http://127.0.0.1:{args.metrics_port}/metrics, снимок {snapshots.path}")
+        try:
+            runner.loop()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for parser in parsers.values():
+                parser.close()
+            applog.shutdown()
+            if metrics_server:
+                metrics_server.shutdown()
+                metrics_server.server_close()
+                snapshots.stop()
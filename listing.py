@@ -0,0 +1,251 @@
+"""
+Listing
+Компактная запись объявления для результатов парсинга.
+
+parse_ad обоих парсеров возвращает словарь, а в окне и экспорте держатся
+тысячи таких результатов. Listing хранит основные поля в __slots__
+(без __dict__ на каждое объявление), params — в Params: значения лежат
+в кортеже, а набор ключей (он почти одинаков у объявлений одного сайта)
+хранится один раз на все записи с тем же набором. Ключи интернируются.
+
+Для старого кода запись ведёт себя как словарь: data.get("price"),
+data["screenshots"], data.get("params", {}).get("Этаж") работают как прежде.
+
+Сохранение построчно:
+    dump_jsonl(listings, path)       — по объекту JSON на строку
+    load_jsonl(path)                 — генератор Listing
+    read_results(path)               — результаты из .json (как в Результаты/) или .jsonl
+"""
+
+import json
+import sys
+from pathlib import Path
+
+from listing_cache import detect_site
+
+
+class Params:
+    """Характеристики объявления: значения в кортеже, словарь ключей общий для записей с тем же набором"""
+
+    __slots__ = ("_index", "_values")
+
+    # Кортеж ключей → {ключ: позиция}; один на каждый встреченный набор ключей
+    _layouts = {}
+
+    def __init__(self, items=()):
+        if isinstance(items, Params):
+            self._index, self._values = items._index, items._values
+            return
+        if isinstance(items, dict):
+            items = items.items()
+        keys, values = [], []
+        for key, value in items:
+            keys.append(sys.intern(str(key)))
+            values.append(value)
+        self._index = self._layout(tuple(keys))
+        self._values = tuple(values)
+
+    @classmethod
+    def _layout(cls, keys):
+        index = cls._layouts.get(keys)
+        if index is None:
+            index = cls._layouts[keys] = {key: i for i, key in enumerate(keys)}
+        return index
+
+    def get(self, key, default=None):
+        i = self._index.get(key)
+        return default if i is None else self._values[i]
+
+    def __getitem__(self, key):
+        return self._values[self._index[key]]
+
+    def __setitem__(self, key, value):
+        # Редкий случай (дозаполнение площади участка) — новый набор ключей
+        items = dict(self.items())
+        items[key] = value
+        other = Params(items)
+        self._index, self._values = other._index, other._values
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __eq__(self, other):
+        if isinstance(other, (Params, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def keys(self):
+        return self._index.keys()
+
+    def values(self):
+        return self._values
+
+    def items(self):
+        return zip(self._index, self._values)
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return f"Params({self.to_dict()!r})"
+
+
+def _number(value):
+    """Число из поля результата: int/float как есть, строка '5 200 000' → float, иначе None"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(str(value).replace(" ", "").replace("\xa0", "").replace(",", "."))
+    except ValueError:
+        return None
+
+
+def _text(value):
+    return None if value is None else str(value)
+
+
+# Основные поля: имя → приведение типа при загрузке. Остальные ключи результата
+# (page_metrics, page_not_found, error …) попадают в extra.
+FIELDS = {
+    "id": _text,
+    "url": _text,
+    "site": _text,
+    "parsed_at": _text,
+    "title": _text,
+    "address": _text,
+    "description": _text,
+    "price_text": _text,
+    "price_info": _text,
+    "price": _number,
+    "price_type": _text,
+    "price_per_m2": _number,
+    "area_m2": _number,
+    "published_date": _text,
+    "published_at": _text,
+    "seller_name": _text,
+    "images_count": _number,
+    "price_history": None,
+    "screenshots": None,
+    "snapshot": None,
+}
+
+
+class Listing:
+    """Результат parse_ad: основные поля в слотах, params — Params, прочее — extra"""
+
+    __slots__ = tuple(FIELDS) + ("params", "extra")
+
+    def __init__(self, data=None):
+        for name in FIELDS:
+            setattr(self, name, None)
+        self.params = Params()
+        self.extra = None
+        for key, value in (data or {}).items():
+            self[key] = value
+        if self.site is None and self.url:
+            self.site = detect_site(self.url)
+
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, Listing):
+            return data
+        return cls(data)
+
+    def to_dict(self):
+        """Словарь в формате parse_ad (пустые поля не попадают)"""
+        data = {name: getattr(self, name) for name in FIELDS if getattr(self, name) is not None}
+        if self.params:
+            data["params"] = self.params.to_dict()
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    # --- доступ как к словарю результата ---
+
+    def get(self, key, default=None):
+        if key in FIELDS:
+            value = getattr(self, key)
+            return default if value is None else value
+        if key == "params":
+            return self.params
+        if self.extra:
+            return self.extra.get(key, default)
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None and key not in self:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        convert = FIELDS.get(key, False)
+        if convert is False:
+            if key == "params":
+                self.params = Params(value or ())
+            else:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[sys.intern(key)] = value
+            return
+        setattr(self, key, convert(value) if convert else value)
+
+    def __contains__(self, key):
+        if key in FIELDS:
+            return getattr(self, key) is not None
+        if key == "params":
+            return True
+        return bool(self.extra) and key in self.extra
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self.get(key)
+
+    def __repr__(self):
+        return f"Listing({self.url!r}, price={self.price!r})"
+
+
+def as_listings(rows):
+    """Список Listing из результатов (словари или уже Listing)"""
+    return [Listing.from_dict(data) for data in rows]
+
+
+def dump_jsonl(listings, path):
+    """Запись по объявлению на строку; возвращает число записанных"""
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for item in listings:
+            data = item.to_dict() if isinstance(item, Listing) else item
+            f.write(json.dumps(data, ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    return count
+
+
+def load_jsonl(path):
+    """Listing из файла JSONL по одной строке, без чтения файла целиком"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield Listing.from_dict(json.loads(line))
+
+
+def read_results(path):
+    """Результаты из сохранённого JSON (список или {'rows': [...]}) или JSONL"""
+    path = Path(path)
+    if path.suffix.lower() == ".jsonl":
+        yield from load_jsonl(path)
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        payload = json.load(f)
+    yield from payload if isinstance(payload, list) else payload.get("rows", [])
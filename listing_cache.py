@@ -0,0 +1,139 @@
+"""
+Listing Cache
+Реестр уже обработанных объявлений (ключ сайт:ID → ссылка и время парсинга).
+
+Используется для дедупликации ссылок, собранных из поисковой выдачи:
+объявления, которые уже парсились, повторно в очередь не попадают.
+Вместе с ключом хранится отпечаток (цена, хэши параметров и описания) —
+по нему мониторинг определяет, изменилось ли объявление.
+"""
+
+import hashlib
+import json
+import re
+import threading
+from pathlib import Path
+
+import applog
+
+log = applog.get_logger(__name__)
+
+AVITO_ID_RE = re.compile(r'_(\d+)(?:\?|$)')
+CIAN_ID_RE = re.compile(r'/(\d+)/?(?:\?|$)')
+SPACES_RE = re.compile(r"\s+")
+
+# Меняется вместе со способом подсчёта отпечатка: старые отпечатки не сравниваются с новыми
+FINGERPRINT_VERSION = 2
+
+
+def detect_site(url):
+    if "avito" in url:
+        return "avito"
+    if "cian" in url:
+        return "cian"
+    return None
+
+
+def listing_key(url):
+    """Ключ объявления вида 'avito:1234567'; для нераспознанных ссылок — сама ссылка"""
+    url = url.split("#")[0]
+    site = detect_site(url)
+    if site == "avito":
+        match = AVITO_ID_RE.search(url.split("?")[0])
+    elif site == "cian":
+        match = CIAN_ID_RE.search(url.split("?")[0])
+    else:
+        match = None
+
+    if match:
+        return f"{site}:{match.group(1)}"
+    return url.split("?")[0]
+
+
+def _digest(value):
+    if not value:
+        return None
+    text = json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _squash(value):
+    """Пробелы и переводы строк схлопнуты: браузерный innerText и текст из HTTP дают одну строку"""
+    return SPACES_RE.sub(" ", value).strip() if isinstance(value, str) else value
+
+
+def fingerprint(data):
+    """Отпечаток объявления: цена как есть, параметры и описание (без учёта пробелов) — хэшами"""
+    params = {_squash(key): _squash(value) for key, value in (data.get("params") or {}).items()}
+    return {
+        "version": FINGERPRINT_VERSION,
+        "price": data.get("price"),
+        "params": _digest(params),
+        "description": _digest(_squash(data.get("description") or "")),
+    }
+
+
+class ListingCache:
+    """JSON-файл с ключами обработанных объявлений"""
+
+    def __init__(self, path="listing_cache.json"):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries = {}
+
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError) as e:
+                log.warning("  ℹ Кэш объявлений повреждён, начинаем заново: %s", e)
+
+    def __contains__(self, url):
+        return listing_key(url) in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, url):
+        return self._entries.get(listing_key(url))
+
+    def urls(self):
+        return [entry["url"] for entry in self._entries.values()]
+
+    def add(self, data):
+        """Запоминает результат парсинга (нужны url и parsed_at)"""
+        url = data.get("url")
+        if not url:
+            return
+        with self._lock:
+            self._entries[listing_key(url)] = {
+                "url": url,
+                "parsed_at": data.get("parsed_at"),
+                "fingerprint": fingerprint(data),
+            }
+
+    def touch(self, url, checked_at):
+        """Отмечает проверку объявления без изменений"""
+        with self._lock:
+            entry = self._entries.get(listing_key(url))
+            if entry is not None:
+                entry["checked_at"] = checked_at
+
+    def filter_new(self, urls):
+        """Ссылки, которых ещё нет в кэше (с сохранением порядка и без дублей)"""
+        seen = set()
+        result = []
+        for url in urls:
+            key = listing_key(url)
+            if key in seen or key in self._entries:
+                continue
+            seen.add(key)
+            result.append(url)
+        return result
+
+    def save(self):
+        with self._lock:
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            tmp_path.replace(self.path)
@@ -0,0 +1,192 @@
+"""
+Listing Monitor
+Повторная проверка уже обработанных объявлений с записью только изменений.
+
+Объявления из кэша загружаются по HTTP (как в режиме «только данные»),
+отпечаток (цена, хэши параметров и описания) сравнивается с сохранённым.
+Полный parse_ad со скриншотами выполняется только для изменившихся
+объявлений — поэтому проверка стоит почти как загрузка без браузера.
+Браузер нужен и для страниц, которые не отдались по HTTP.
+
+Изменения дописываются в историю объявления:
+    История/avito_1234567.jsonl — одна строка JSON на изменение
+"""
+
+import json
+from datetime import datetime
+from pathlib import Path
+
+import applog
+from http_fetcher import HttpFetcher
+from listing_cache import detect_site, fingerprint, listing_key
+
+log = applog.get_logger(__name__)
+
+HISTORY_DIR = Path("История")
+
+
+def history_path(url, history_dir=HISTORY_DIR):
+    return Path(history_dir) / (listing_key(url).replace(":", "_") + ".jsonl")
+
+
+def read_history(url, history_dir=HISTORY_DIR):
+    path = history_path(url, history_dir)
+    if not path.exists():
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(old, new):
+    """Список изменившихся полей отпечатка"""
+    return [field for field in new if old.get(field) != new[field]]
+
+
+class ListingMonitor:
+    """Проверка объявлений из кэша на изменения"""
+
+    def __init__(self, cache, get_parser, proxy_pool=None, history_dir=HISTORY_DIR, budget=None):
+        # get_parser(site) → парсер сайта; вызывается только когда нужен браузер
+        self.cache = cache
+        self.get_parser = get_parser
+        self.proxy_pool = proxy_pool
+        self.history_dir = Path(history_dir)
+        # RateBudget планировщика: каждая загрузка страницы списывает бюджет сайта
+        self.budget = budget
+        self.stats = {"checked": 0, "unchanged": 0, "changed": 0, "removed": 0, "failed": 0}
+        self.interrupted = False
+        # Сайты, на которых проверка остановилась из-за исчерпания бюджета
+        self.blocked = set()
+
+    def _append_history(self, url, entry):
+        path = history_path(url, self.history_dir)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def _parse_in_browser(self, url):
+        parser = self.get_parser(detect_site(url))
+        if parser is None:
+            return None
+        parser.recycle_if_needed()
+        return parser.parse_ad(url)
+
+    def _record(self, url, data, captured):
+        """
+        Сравнивает данные с кэшем. Возвращает полный результат для
+        изменившегося объявления или None.
+        captured — data уже получены браузером со скриншотами.
+        """
+        checked_at = datetime.now().isoformat()
+        entry = self.cache.get(url) or {}
+        old = entry.get("fingerprint")
+
+        if data.get("page_not_found"):
+            self.stats["removed"] += 1
+            self._append_history(url, {"checked_at": checked_at, "changed": ["removed"]})
+            self.cache.touch(url, checked_at)
+            return None
+
+        new = fingerprint(data)
+
+        # Запись кэша без отпечатка (до мониторинга) или с отпечатком старой версии —
+        # это базовое состояние
+        if old is None or old.get("version") != new["version"]:
+            self.cache.add(data)
+            self.cache.touch(url, checked_at)
+            self.stats["unchanged"] += 1
+            return None
+
+        changed = compare(old, new)
+        if not changed:
+            self.cache.touch(url, checked_at)
+            self.stats["unchanged"] += 1
+            return None
+
+        if not captured:
+            site = detect_site(url)
+            if self.budget is None or self.budget.spend(site):
+                log.info("  ↻ Изменилось (%s), повторные скриншоты: %s", ', '.join(changed), url)
+                data = self._parse_in_browser(url) or data
+            else:
+                log.info("  ↻ Изменилось (%s), бюджет %s исчерпан — без скриншотов: %s",
+                         ', '.join(changed), site, url)
+
+        history_entry = {"checked_at": checked_at, "changed": changed}
+        if "price" in changed:
+            history_entry["price"] = [old.get("price"), data.get("price")]
+        if "params" in changed:
+            history_entry["params"] = data.get("params")
+        if "description" in changed:
+            history_entry["description"] = data.get("description")
+        if data.get("screenshots"):
+            history_entry["screenshots"] = data["screenshots"]
+        self._append_history(url, history_entry)
+
+        self.cache.add(data)
+        self.stats["changed"] += 1
+        return data
+
+    def run(self, urls=None, on_progress=None, should_stop=None):
+        """
+        Проверяет объявления (по умолчанию — все из кэша).
+        Возвращает список полных результатов изменившихся объявлений.
+        should_stop() проверяется между объявлениями — для вытеснения срочными задачами.
+        """
+        if urls is None:
+            # Сначала давно не проверенные — при исчерпании бюджета они не застревают в конце
+            urls = sorted(self.cache.urls(), key=lambda u: (self.cache.get(u) or {}).get("checked_at") or "")
+        urls = [url for url in urls if detect_site(url)]
+        self.stats = dict.fromkeys(self.stats, 0)
+        self.interrupted = False
+        self.blocked = set()
+
+        if self.budget is not None:
+            allowed = []
+            for url in urls:
+                site = detect_site(url)
+                if site not in self.blocked and self.budget.spend(site):
+                    allowed.append(url)
+                else:
+                    self.blocked.add(site)
+            if self.blocked:
+                log.info("  ⏸ Бюджет исчерпан (%s): проверено будет %s из %s",
+                         ', '.join(sorted(self.blocked)), len(allowed), len(urls))
+                self.interrupted = True
+            urls = allowed
+
+        parsers = {site: self.get_parser(site) for site in ("avito", "cian")}
+        fetched, fallback = HttpFetcher(parsers, proxy_pool=self.proxy_pool).fetch_many(urls)
+
+        changed = []
+        for i, url in enumerate(urls, 1):
+            if should_stop and should_stop():
+                self.interrupted = True
+                break
+            self.stats["checked"] += 1
+            try:
+                if url in fetched:
+                    data, captured = fetched[url], False
+                else:
+                    data, captured = self._parse_in_browser(url), True
+                if data is None:
+                    self.stats["failed"] += 1
+                    continue
+                result = self._record(url, data, captured)
+            except Exception as e:
+                log.error("  ✗ Ошибка проверки %s: %s", url, e)
+                self.stats["failed"] += 1
+                continue
+
+            if result is not None:
+                changed.append(result)
+            if on_progress:
+                on_progress(i, len(urls))
+
+        self.cache.save()
+        return changed
+
+    def summary(self):
+        s = self.stats
+        return (f"проверено {s['checked']}, без изменений {s['unchanged']}, изменилось {s['changed']}, "
+                f"снято с публикации {s['removed']}, ошибок {s['failed']}")
@@ -1,10 +1,15 @@
 import sys
 import os
+import json
+import logging
+import time
+from datetime import datetime
 from PyQt5.QtCore import QThread, pyqtSignal, Qt, QMetaObject, pyqtSlot
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QPushButton,
     QLabel, QMessageBox, QHBoxLayout, QFileDialog,
-    QTableWidget, QTableWidgetItem, QCheckBox, QHeaderView, QMenuBar, QAction, QDialog, QDialogButtonBox
+    QTableWidget, QTableWidgetItem, QCheckBox, QHeaderView, QMenuBar, QAction, QDialog, QDialogButtonBox,
+    QInputDialog, QFormLayout, QLineEdit, QProgressBar
 )
 from PyQt5.QtGui import QIcon
 
@@ -12,8 +17,25 @@ from selenium.common.exceptions import TimeoutException
 
 from avito_parser import AvitoParser
 from cian_parser import CianParser
-from excel_builder import build_excel
+from excel_builder import format_errors, write_excel
 from word_builder import build_word_with_screenshots
+from proxy_pool import ProxyPool
+from listing import Listing, as_listings
+from listing_cache import ListingCache, detect_site
+from search_crawler import SearchCrawler
+from card_filter import CardFilter
+from http_fetcher import HttpFetcher
+from snapshot_archive import SnapshotArchive
+from deferred_screens import DeferredRenderer
+from site_engine import create_driver
+from listing_monitor import ListingMonitor
+from job_scheduler import Job, JobScheduler, JobRunner
+import applog
+import metrics
+import page_metrics
+import timing
+from profiling import profiler
+from timing import span, tracer
 
 
 
@@ -27,21 +49,30 @@ class ParserWorker(QThread):
     finished = pyqtSignal(dict)
     error = pyqtSignal(str)
 
-    def __init__(self, urls, parserAvito=None, parserCian=None, download_photos=False):
+    def __init__(self, urls, parserAvito=None, parserCian=None, download_photos=False, proxy_pool=None, listing_cache=None,
+                 data_only=False, snapshot_archive=None, defer_screenshots=False):
         super().__init__()
         self.urls = urls
         self.parserAvito = parserAvito
         self.parserCian = parserCian
         self.download_photos = download_photos
+        self.proxy_pool = proxy_pool
+        self.listing_cache = listing_cache
+        self.data_only = data_only
+        self.snapshot_archive = snapshot_archive
+        self.defer_screenshots = defer_screenshots
 
     def run(self):
+        # Сообщения парсеров из этого потока (INFO и выше) — в таблицу лога
+        log_handler = applog.attach(self.log.emit)
         try:
             # Проверяем и переиспользуем или создаем новый парсер Avito
             if self.parserAvito is None or self.parserAvito.driver is None:
                 self.parserAvito = AvitoParser(
                     headless=False,
                     slow_mode=True,
-                    on_captcha=self.on_captcha
+                    on_captcha=self.on_captcha,
+                    proxy_pool=self.proxy_pool
                 )
             else:
                 # Проверяем, что браузер еще жив
@@ -52,7 +83,8 @@ class ParserWorker(QThread):
                     self.parserAvito = AvitoParser(
                         headless=False,
                         slow_mode=True,
-                        on_captcha=self.on_captcha
+                        on_captcha=self.on_captcha,
+                        proxy_pool=self.proxy_pool
                     )
 
             # Проверяем и переиспользуем или создаем новый парсер Cian
@@ -61,7 +93,8 @@ class ParserWorker(QThread):
                     headless=False,
                     slow_mode=True,
                     on_captcha=self.on_captcha,
-                    on_auth=self.on_auth
+                    on_auth=self.on_auth,
+                    proxy_pool=self.proxy_pool
                 )
             else:
                 # Проверяем, что браузер еще жив
@@ -73,43 +106,106 @@ class ParserWorker(QThread):
                         headless=False,
                         slow_mode=True,
                         on_captcha=self.on_captcha,
-                        on_auth=self.on_auth
+                        on_auth=self.on_auth,
+                        proxy_pool=self.proxy_pool
                     )
 
             if self.parserAvito:
                 self.parserAvito.download_photos = self.download_photos
+                self.parserAvito.snapshot_archive = self.snapshot_archive
+                self.parserAvito.defer_screenshots = self.defer_screenshots
 
             if self.parserCian:
                 self.parserCian.download_photos = self.download_photos
+                self.parserCian.snapshot_archive = self.snapshot_archive
+                self.parserCian.defer_screenshots = self.defer_screenshots
+
+            # Режим "только данные": сначала HTTP без браузера, браузер — только для неудачных
+            prefetched = {}
+            if self.data_only:
+                self.log.emit("ℹ Загрузка данных без браузера...")
+                fetcher = HttpFetcher(
+                    {"avito": self.parserAvito, "cian": self.parserCian},
+                    proxy_pool=self.proxy_pool
+                )
+                with span("http_prefetch", urls=len(self.urls)):
+                    prefetched, fallback = fetcher.fetch_many(url.split("?")[0] for url in self.urls)
+                self.log.emit(f"✓ Получено без браузера: {len(prefetched)}, через браузер: {len(fallback)}")
 
             parsed_data = []
 
             for i, url in enumerate(self.urls, 1):
                 url = url.split("?")[0]
+                metrics.WORKER_QUEUE.set(len(self.urls) - i + 1, worker="parser")
+
+                if url in prefetched:
+                    data = prefetched[url]
+                    if data.get("page_not_found"):
+                        metrics.ADS_PROCESSED.inc(site=detect_site(url), status="not_found")
+                        self.log.emit(f"❌ [{i}] Страница не существует")
+                        continue
+                    metrics.ADS_PROCESSED.inc(site=detect_site(url), status="http")
+                    if self.listing_cache is not None:
+                        self.listing_cache.add(data)
+                    parsed_data.append(Listing.from_dict(data))
+                    continue
 
                 if "avito" in url:
+                    tracer.set_ad("avito", url)
+                    self._recycle_if_needed(self.parserAvito, "Avito")
+                    ad_started = time.monotonic()
                     try:
-                        data = self.parserAvito.parse_ad(url)
+                        with span("parse_ad"), profiler.profile_ad("avito", url):
+                            data = self.parserAvito.parse_ad(url)
 
                         if data.get("page_not_found"):
+                            metrics.ADS_PROCESSED.inc(site="avito", status="not_found")
                             self.log.emit(f"❌ [{i}] Страница не существует")
                             continue
                     except TimeoutException:
+                        metrics.ADS_PROCESSED.inc(site="avito", status="timeout")
                         self.log.emit(f"❌ [{i}] Таймаут загрузки страницы")
                         continue
-                    parsed_data.append(data)
+                    except Exception:
+                        metrics.ADS_PROCESSED.inc(site="avito", status="error")
+                        raise
+                    metrics.AD_SECONDS.observe(time.monotonic() - ad_started, site="avito")
+                    metrics.ADS_PROCESSED.inc(site="avito", status="ok")
+                    if self.listing_cache is not None:
+                        self.listing_cache.add(data)
+                    parsed_data.append(Listing.from_dict(data))
 
                 elif "cian" in url:
+                    tracer.set_ad("cian", url)
+                    self._recycle_if_needed(self.parserCian, "Cian")
+                    ad_started = time.monotonic()
                     try:
-                        data = self.parserCian.parse_ad(url)
+                        with span("parse_ad"), profiler.profile_ad("cian", url):
+                            data = self.parserCian.parse_ad(url)
 
                         if data.get("page_not_found"):
+                            metrics.ADS_PROCESSED.inc(site="cian", status="not_found")
                             self.log.emit(f"❌ [{i}] Страница не существует")
                             continue
                     except TimeoutException:
+                        metrics.ADS_PROCESSED.inc(site="cian", status="timeout")
                         self.log.emit(f"❌ [{i}] Таймаут загрузки страницы")
                         continue
-                    parsed_data.append(data)
+                    except Exception:
+                        metrics.ADS_PROCESSED.inc(site="cian", status="error")
+                        raise
+                    metrics.AD_SECONDS.observe(time.monotonic() - ad_started, site="cian")
+                    metrics.ADS_PROCESSED.inc(site="cian", status="ok")
+                    if self.listing_cache is not None:
+                        self.listing_cache.add(data)
+                    parsed_data.append(Listing.from_dict(data))
+
+            if self.listing_cache is not None:
+                self.listing_cache.save()
+
+            metrics.WORKER_QUEUE.set(0, worker="parser")
+            self._report_timing()
+            self._report_page_metrics(parsed_data)
 
             result = {
                 "rows": parsed_data
@@ -119,6 +215,183 @@ class ParserWorker(QThread):
 
         except Exception as e:
             self.error.emit(str(e))
+        finally:
+            applog.detach(log_handler)
+
+    def _recycle_if_needed(self, parser, name):
+        """Плановый перезапуск браузера между объявлениями"""
+        try:
+            with span("recycle"):
+                reason = parser.recycle_if_needed()
+        except Exception as e:
+            self.log.emit(f"⚠ Не удалось перезапустить браузер {name}: {e}")
+            return
+        if reason:
+            self.log.emit(f"↻ Браузер {name} перезапущен ({reason})")
+
+    def _report_timing(self):
+        """Выгрузка спанов прогона и самые долгие этапы в лог"""
+        spans = tracer.take()
+        try:
+            base = tracer.export(spans=spans)
+        except OSError as e:
+            self.log.emit(f"⚠ Не удалось сохранить замеры времени: {e}")
+            return
+        if not base:
+            return
+
+        self.log.emit(f"⏱ Замеры этапов: {base}.jsonl, {base}.trace.json")
+        # parse_ad охватывает все этапы — в списке самых долгих он не нужен
+        phases = sorted(
+            (item for item in timing.summarize(spans).items() if item[0][1] != "parse_ad"),
+            key=lambda item: -item[1][1]
+        )
+        for (site, name), (count, total, longest) in phases[:5]:
+            self.log.emit(f"   {site or '—'}/{name}: {total:.1f} с всего, {total / count:.2f} с в среднем, "
+                          f"макс. {longest:.2f} с (×{count})")
+
+    def _report_page_metrics(self, rows):
+        """Сводка метрик страниц по сайтам: в лог и в Диагностика/page_metrics_*.json"""
+        summary = page_metrics.aggregate(rows)
+        if not summary:
+            return
+        path = timing.DIAGNOSTICS_DIR / f"page_metrics_{datetime.now():%Y%m%d_%H%M%S}.json"
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            self.log.emit(f"⚠ Не удалось сохранить метрики страниц: {e}")
+        self.log.emit(f"📊 Метрики страниц: {path}")
+        for line in page_metrics.format_summary(summary):
+            self.log.emit(f"   {line}")
+
+    def on_captcha(self):
+        self.captcha_detected.emit()
+
+    def on_auth(self):
+        self.auth_required.emit()
+
+    @pyqtSlot()
+    def continue_after_captcha(self):
+        if self.parserAvito:
+            self.parserAvito.continue_after_captcha()
+        if self.parserCian:
+            self.parserCian.continue_after_captcha()
+
+
+class DiscoveryWorker(QThread):
+    """Сбор ссылок из поисковой выдачи в фоне"""
+    log = pyqtSignal(str)
+    captcha_detected = pyqtSignal()
+    finished = pyqtSignal(list)
+    error = pyqtSignal(str)
+
+    def __init__(self, search_url, parser=None, listing_cache=None, proxy_pool=None, card_filter=None):
+        super().__init__()
+        self.search_url = search_url
+        self.site = detect_site(search_url)
+        self.parser = parser
+        self.listing_cache = listing_cache
+        self.proxy_pool = proxy_pool
+        self.card_filter = card_filter
+
+    def run(self):
+        try:
+            if self.site is None:
+                raise ValueError("Ссылка поиска должна вести на Avito или Cian")
+
+            # Переиспользуем браузер, если он ещё жив
+            if self.parser is not None and self.parser.driver is not None:
+                try:
+                    self.parser.driver.current_url
+                except:
+                    self.parser = None
+
+            if self.parser is None or self.parser.driver is None:
+                parser_cls = AvitoParser if self.site == "avito" else CianParser
+                self.parser = parser_cls(
+                    headless=False,
+                    slow_mode=True,
+                    on_captcha=self.on_captcha,
+                    proxy_pool=self.proxy_pool
+                )
+
+            crawler = SearchCrawler(self.parser, cache=self.listing_cache)
+            cards = crawler.crawl(
+                self.search_url,
+                on_page=lambda page, total: self.log.emit(f"ℹ Страница {page}: найдено новых объявлений {total}")
+            )
+
+            self.log.emit(f"✓ Собрано объявлений: {len(cards)} (уже обработаны ранее: {crawler.skipped_known})")
+
+            if self.card_filter is not None and not self.card_filter.is_empty:
+                cards, pruned = self.card_filter.apply(cards)
+                details = self.card_filter.summary()
+                self.log.emit(
+                    f"✓ Отсеяно по фильтру: {pruned}" + (f" ({details})" if details else "")
+                    + f", к парсингу: {len(cards)}"
+                )
+            self.finished.emit(cards)
+
+        except Exception as e:
+            self.error.emit(str(e))
+
+    def on_captcha(self):
+        self.captcha_detected.emit()
+
+    @pyqtSlot()
+    def continue_after_captcha(self):
+        if self.parser:
+            self.parser.continue_after_captcha()
+
+
+class MonitorWorker(QThread):
+    """Повторная проверка объявлений из кэша; браузер — только для изменившихся"""
+    log = pyqtSignal(str)
+    captcha_detected = pyqtSignal()
+    auth_required = pyqtSignal()
+    finished = pyqtSignal(dict)
+    error = pyqtSignal(str)
+
+    def __init__(self, listing_cache, parserAvito=None, parserCian=None, proxy_pool=None):
+        super().__init__()
+        self.listing_cache = listing_cache
+        self.parserAvito = parserAvito
+        self.parserCian = parserCian
+        self.proxy_pool = proxy_pool
+
+    def get_parser(self, site):
+        if site == "avito":
+            if self.parserAvito is None:
+                self.parserAvito = AvitoParser(
+                    headless=False,
+                    slow_mode=True,
+                    on_captcha=self.on_captcha,
+                    proxy_pool=self.proxy_pool
+                )
+            return self.parserAvito
+        if site == "cian":
+            if self.parserCian is None:
+                self.parserCian = CianParser(
+                    headless=False,
+                    slow_mode=True,
+                    on_captcha=self.on_captcha,
+                    on_auth=self.on_auth,
+                    proxy_pool=self.proxy_pool
+                )
+            return self.parserCian
+        return None
+
+    def run(self):
+        try:
+            self.log.emit(f"ℹ Проверка объявлений из кэша: {len(self.listing_cache)}")
+            monitor = ListingMonitor(self.listing_cache, self.get_parser, self.proxy_pool)
+            changed = monitor.run()
+            self.log.emit(f"✓ Мониторинг: {monitor.summary()}")
+            self.finished.emit({"rows": changed})
+        except Exception as e:
+            self.error.emit(str(e))
 
     def on_captcha(self):
         self.captcha_detected.emit()
@@ -134,6 +407,181 @@ class ParserWorker(QThread):
             self.parserCian.continue_after_captcha()
 
 
+class ExportCancelled(Exception):
+    """Экспорт отменён пользователем"""
+
+
+class ExportWorker(QThread):
+    """Запись Excel или Word в фоне: окно не блокируется, можно запускать новый парсинг"""
+    log = pyqtSignal(str)
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(dict)
+    error = pyqtSignal(str)
+
+    LABELS = {"excel": "Excel", "word": "Word"}
+
+    def __init__(self, kind, rows, path):
+        super().__init__()
+        self.kind = kind
+        self.rows = rows
+        self.path = path
+        self._cancelled = False
+
+    def cancel(self):
+        """Остановка на следующем объявлении; файл не записывается"""
+        self._cancelled = True
+
+    def _step(self, done, total):
+        if self._cancelled:
+            raise ExportCancelled()
+        self.progress.emit(done, total)
+
+    def _excel_rows(self):
+        total = len(self.rows)
+        for i, row in enumerate(self.rows, 1):
+            self._step(i, total)
+            yield row
+
+    def run(self):
+        result = {"kind": self.kind, "path": self.path, "errors": [], "cancelled": False}
+        try:
+            if self.kind == "excel":
+                result["errors"] = write_excel(self._excel_rows(), self.path)
+            else:
+                self._render_deferred_screenshots()
+                build_word_with_screenshots(self.rows, self.path, on_progress=self._step)
+        except ExportCancelled:
+            result["cancelled"] = True
+        except Exception as e:
+            self.error.emit(str(e))
+            return
+        self.finished.emit(result)
+
+    def _render_deferred_screenshots(self):
+        """Отрисовка отложенных скриншотов для отмеченных аналогов"""
+        pending = [
+            r for r in self.rows
+            if r["is_analog"] and (r["data"].get("screenshots") or {}).get("deferred")
+        ]
+        if not pending:
+            return
+
+        self.log.emit(f"ℹ Отрисовка скриншотов из снимков: {len(pending)}")
+        renderer = DeferredRenderer(
+            SnapshotArchive(),
+            # Снимки открываются локально: обычный headless-браузер без cookies и привязки к сайту
+            driver_factory=lambda: create_driver(headless=True)[0]
+        )
+        try:
+            renderer.render_rows(pending, on_progress=self._step)
+        finally:
+            renderer.close()
+
+
+class SchedulerWorker(QThread):
+    """Выполнение задач по расписанию в фоне, отдельными браузерами без профиля"""
+    log = pyqtSignal(str)
+    captcha_detected = pyqtSignal()
+    auth_required = pyqtSignal()
+    error = pyqtSignal(str)
+
+    def __init__(self, scheduler, listing_cache=None, proxy_pool=None):
+        super().__init__()
+        self.scheduler = scheduler
+        self.listing_cache = listing_cache
+        self.proxy_pool = proxy_pool
+        self.parsers = {}
+        self.runner = None
+
+    def get_parser(self, site):
+        if site not in self.parsers:
+            if site == "avito":
+                self.parsers[site] = AvitoParser(
+                    slow_mode=True,
+                    on_captcha=self.on_captcha,
+                    persistent_profile=False,
+                    proxy_pool=self.proxy_pool
+                )
+            elif site == "cian":
+                self.parsers[site] = CianParser(
+                    slow_mode=True,
+                    on_captcha=self.on_captcha,
+                    on_auth=self.on_auth,
+                    persistent_profile=False,
+                    proxy_pool=self.proxy_pool
+                )
+            else:
+                return None
+        return self.parsers[site]
+
+    def run(self):
+        try:
+            self.runner = JobRunner(
+                self.scheduler, self.get_parser, self.listing_cache, self.proxy_pool,
+                on_log=self.log.emit
+            )
+            self.runner.loop()
+        except Exception as e:
+            self.error.emit(str(e))
+        finally:
+            for parser in self.parsers.values():
+                parser.close()
+            self.parsers = {}
+
+    def stop(self):
+        if self.runner:
+            self.runner.stop()
+
+    def on_captcha(self):
+        self.captcha_detected.emit()
+
+    def on_auth(self):
+        self.auth_required.emit()
+
+    @pyqtSlot()
+    def continue_after_captcha(self):
+        for parser in self.parsers.values():
+            parser.continue_after_captcha()
+
+
+class CardFilterDialog(QDialog):
+    """Границы цены, площади и цены за м² для отбора карточек выдачи"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Фильтр объявлений")
+
+        self.inputs = {}
+        form = QFormLayout(self)
+        for key, label in [
+            ("min_price", "Цена от, руб"),
+            ("max_price", "Цена до, руб"),
+            ("min_area", "Площадь от, кв.м"),
+            ("max_area", "Площадь до, кв.м"),
+            ("min_price_per_m2", "Цена за м² от, руб"),
+            ("max_price_per_m2", "Цена за м² до, руб"),
+        ]:
+            edit = QLineEdit()
+            edit.setPlaceholderText("не ограничено")
+            self.inputs[key] = edit
+            form.addRow(label, edit)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        form.addRow(buttons)
+
+    def card_filter(self):
+        bounds = {}
+        for key, edit in self.inputs.items():
+            text = edit.text().replace(" ", "").replace(",", ".")
+            try:
+                bounds[key] = float(text) if text else None
+            except ValueError:
+                bounds[key] = None
+        return CardFilter(**bounds)
+
+
 # =========================
 # GUI
 # =========================
@@ -151,6 +599,24 @@ class AvitoApp(QWidget):
         self.parserCian = None
 
         self.save_photos = False
+        self.data_only = False
+        self.save_snapshots = False
+        self.defer_screenshots = False
+
+        # Пул прокси из proxies.txt в рабочей папке (если файл есть)
+        self.proxy_pool = ProxyPool.from_file("proxies.txt")
+
+        # Уже обработанные объявления — для дедупликации ссылок из поиска
+        self.listing_cache = ListingCache()
+        self.discovered_cards = []
+
+        # Задачи по расписанию (jobs.json) и фоновый исполнитель
+        self.scheduler = JobScheduler()
+        self.scheduler_worker = None
+
+        # Эндпоинт метрик Prometheus и периодический снимок (меню Диагностика)
+        self.metrics_server = None
+        self.metrics_snapshots = None
 
         menubar = QMenuBar(self)
 
@@ -160,6 +626,50 @@ class AvitoApp(QWidget):
         self.save_photos_action.toggled.connect(self.on_save_photos_toggled)
         photo_menu.addAction(self.save_photos_action)
 
+        # Меню Режим
+        mode_menu = menubar.addMenu("Режим")
+        self.data_only_action = QAction("Только данные (без скриншотов)", self, checkable=True)
+        self.data_only_action.toggled.connect(self.on_data_only_toggled)
+        mode_menu.addAction(self.data_only_action)
+        self.save_snapshots_action = QAction("Сохранять снимки страниц (MHTML)", self, checkable=True)
+        self.save_snapshots_action.toggled.connect(self.on_save_snapshots_toggled)
+        mode_menu.addAction(self.save_snapshots_action)
+        self.defer_screenshots_action = QAction("Отложенные скриншоты (при экспорте в Word)", self, checkable=True)
+        self.defer_screenshots_action.toggled.connect(self.on_defer_screenshots_toggled)
+        mode_menu.addAction(self.defer_screenshots_action)
+
+        # Меню Поиск
+        search_menu = menubar.addMenu("Поиск")
+        discover_action = QAction("Собрать ссылки из выдачи…", self)
+        discover_action.triggered.connect(self.start_discovery)
+        search_menu.addAction(discover_action)
+        monitor_action = QAction("Проверить изменения в объявлениях", self)
+        monitor_action.triggered.connect(self.start_monitoring)
+        search_menu.addAction(monitor_action)
+
+        # Меню Расписание
+        schedule_menu = menubar.addMenu("Расписание")
+        self.scheduler_action = QAction("Выполнять задачи по расписанию", self, checkable=True)
+        self.scheduler_action.toggled.connect(self.on_scheduler_toggled)
+        schedule_menu.addAction(self.scheduler_action)
+        add_job_action = QAction("Добавить ссылки из таблицы как задачу…", self)
+        add_job_action.triggered.connect(self.add_scheduled_job)
+        schedule_menu.addAction(add_job_action)
+
+        # Меню Диагностика
+        diagnostics_menu = menubar.addMenu("Диагностика")
+        self.metrics_action = QAction(
+            f"Метрики (http://127.0.0.1:{metrics.DEFAULT_PORT}/metrics)", self, checkable=True
+        )
+        self.metrics_action.toggled.connect(self.on_metrics_toggled)
+        diagnostics_menu.addAction(self.metrics_action)
+        self.profiling_action = QAction("Профилирование объявлений (cProfile, tracemalloc)", self, checkable=True)
+        self.profiling_action.toggled.connect(self.on_profiling_toggled)
+        diagnostics_menu.addAction(self.profiling_action)
+        self.debug_log_action = QAction(f"Подробный журнал ({applog.LOG_DIR}/parser.log)", self, checkable=True)
+        self.debug_log_action.toggled.connect(self.on_debug_log_toggled)
+        diagnostics_menu.addAction(self.debug_log_action)
+
         # Меню Контакты
         contacts_action = QAction("Контакты", self)
         contacts_action.triggered.connect(self.show_contacts)
@@ -187,11 +697,15 @@ class AvitoApp(QWidget):
         self.continue_btn = QPushButton("⏯ Продолжить парсинг")
         self.export_excel_btn = QPushButton("Экспорт Excel")
         self.export_word_btn = QPushButton("Экспорт Word")
+        self.cancel_export_btn = QPushButton("⏹ Отменить экспорт")
         self.clear_btn = QPushButton("🗑 Очистить поля")
+        self.export_progress = QProgressBar()
 
         self.continue_btn.setEnabled(False)
         self.export_excel_btn.setEnabled(False)
         self.export_word_btn.setEnabled(False)
+        self.cancel_export_btn.setVisible(False)
+        self.export_progress.setVisible(False)
 
         # ---------- Лог ----------
         self.log = QTableWidget(0, 1)
@@ -206,9 +720,14 @@ class AvitoApp(QWidget):
         btns.addWidget(self.export_word_btn)
         btns.addWidget(self.clear_btn)
 
+        export_status = QHBoxLayout()
+        export_status.addWidget(self.export_progress)
+        export_status.addWidget(self.cancel_export_btn)
+
         layout.addWidget(QLabel("Ссылки на объявления:"))
         layout.addWidget(self.table)
         layout.addLayout(btns)
+        layout.addLayout(export_status)
         layout.addWidget(QLabel("Журнал:"))
         layout.addWidget(self.log)
 
@@ -217,9 +736,11 @@ class AvitoApp(QWidget):
         self.continue_btn.clicked.connect(self.continue_parsing)
         self.export_excel_btn.clicked.connect(self.export_excel)
         self.export_word_btn.clicked.connect(self.export_word)
+        self.cancel_export_btn.clicked.connect(self.cancel_export)
         self.clear_btn.clicked.connect(self.clear_fields)
 
         self.worker = None
+        self.export_worker = None
 
         # 5 строк при старте
         for _ in range(5):
@@ -243,6 +764,18 @@ class AvitoApp(QWidget):
         self.save_photos = checked
         self.log_msg(f"{'✓ Фото будут сохраняться' if checked else 'ℹ Сохранение фото отключено'}")
 
+    def on_data_only_toggled(self, checked):
+        self.data_only = checked
+        self.log_msg(f"{'✓ Режим только данных: браузер только для заблокированных страниц' if checked else 'ℹ Полный режим со скриншотами'}")
+
+    def on_save_snapshots_toggled(self, checked):
+        self.save_snapshots = checked
+        self.log_msg(f"{'✓ Снимки страниц будут сохраняться' if checked else 'ℹ Сохранение снимков отключено'}")
+
+    def on_defer_screenshots_toggled(self, checked):
+        self.defer_screenshots = checked
+        self.log_msg(f"{'✓ Скриншоты будут отрисованы из снимков при экспорте, только для аналогов' if checked else 'ℹ Скриншоты делаются во время парсинга'}")
+
     def show_contacts(self):
         dlg = QDialog(self)
         dlg.setWindowTitle("Контакты")
@@ -302,10 +835,17 @@ class AvitoApp(QWidget):
 
     def closeEvent(self, event):
         """Закрытие браузеров при выходе из приложения"""
+        if self.scheduler_worker:
+            self.scheduler_worker.stop()
+        if self.export_worker:
+            self.export_worker.cancel()
+            self.export_worker.wait()
+        self._stop_metrics()
         if self.parserAvito:
             self.parserAvito.close()
         if self.parserCian:
             self.parserCian.close()
+        applog.shutdown()
         event.accept()
 
     # ---------- Parsing ----------
@@ -332,7 +872,12 @@ class AvitoApp(QWidget):
         self.start_btn.setEnabled(False)
         self.log.setRowCount(0)
 
-        self.worker = ParserWorker(urls, self.parserAvito, self.parserCian, self.save_photos)
+        # Отложенным скриншотам нужен архив снимков, даже если сохранение снимков не включено
+        use_archive = self.save_snapshots or self.defer_screenshots
+        self.worker = ParserWorker(
+            urls, self.parserAvito, self.parserCian, self.save_photos, self.proxy_pool, self.listing_cache,
+            self.data_only, SnapshotArchive() if use_archive else None, self.defer_screenshots
+        )
         self.worker.log.connect(self.log_msg)
         self.worker.captcha_detected.connect(self.on_captcha)
         self.worker.auth_required.connect(self.on_auth)
@@ -340,6 +885,178 @@ class AvitoApp(QWidget):
         self.worker.error.connect(self.on_error)
         self.worker.start()
 
+    # ---------- Discovery ----------
+    def start_discovery(self):
+        search_url, ok = QInputDialog.getText(
+            self,
+            "Сбор ссылок из выдачи",
+            "Ссылка на поиск Avito или Cian (с фильтрами):"
+        )
+        search_url = search_url.strip()
+        if not ok or not search_url:
+            return
+
+        site = detect_site(search_url)
+        if site is None:
+            QMessageBox.warning(self, "Ошибка", "Ссылка должна вести на Avito или Cian")
+            return
+
+        filter_dialog = CardFilterDialog(self)
+        if not filter_dialog.exec_():
+            return
+
+        self.start_btn.setEnabled(False)
+        self.log_msg(f"▶ Сбор ссылок: {search_url}")
+
+        parser = self.parserAvito if site == "avito" else self.parserCian
+        self.worker = DiscoveryWorker(
+            search_url, parser, self.listing_cache, self.proxy_pool, filter_dialog.card_filter()
+        )
+        self.worker.log.connect(self.log_msg)
+        self.worker.captcha_detected.connect(self.on_captcha)
+        self.worker.finished.connect(self.on_discovery_finished)
+        self.worker.error.connect(self.on_error)
+        self.worker.start()
+
+    def on_discovery_finished(self, cards):
+        self.start_btn.setEnabled(True)
+
+        if self.worker.site == "avito":
+            self.parserAvito = self.worker.parser
+        else:
+            self.parserCian = self.worker.parser
+
+        self.discovered_cards = cards
+        self.add_urls([card["url"] for card in cards])
+
+    # ---------- Monitoring ----------
+    def start_monitoring(self):
+        if not len(self.listing_cache):
+            QMessageBox.information(self, "Мониторинг", "Нет ранее обработанных объявлений")
+            return
+
+        self.start_btn.setEnabled(False)
+        self.parsed_rows = []
+        self.export_excel_btn.setEnabled(False)
+        self.export_word_btn.setEnabled(False)
+        self.log_msg("▶ Проверка изменений в объявлениях")
+
+        self.worker = MonitorWorker(self.listing_cache, self.parserAvito, self.parserCian, self.proxy_pool)
+        self.worker.log.connect(self.log_msg)
+        self.worker.captcha_detected.connect(self.on_captcha)
+        self.worker.auth_required.connect(self.on_auth)
+        self.worker.finished.connect(self.on_monitoring_finished)
+        self.worker.error.connect(self.on_error)
+        self.worker.start()
+
+    def on_monitoring_finished(self, result):
+        # Экспорт сопоставляет parsed_rows со строками таблицы по индексу,
+        # поэтому таблица заменяется изменившимися объявлениями в том же порядке
+        rows = result["rows"] if result else []
+        if rows:
+            self.table.setRowCount(0)
+            self.add_urls(data.get("url", "") for data in rows)
+            self.log_msg(f"ℹ В таблицу загружены изменившиеся объявления: {len(rows)}")
+        self.on_finished(result)
+
+    # ---------- Schedule ----------
+    def table_urls(self):
+        urls = []
+        for row in range(self.table.rowCount()):
+            item = self.table.item(row, 0)
+            if item and item.text().strip():
+                urls.append(item.text().strip())
+        return urls
+
+    def add_scheduled_job(self):
+        urls = self.table_urls()
+        if not urls:
+            QMessageBox.warning(self, "Ошибка", "Добавьте хотя бы одну ссылку")
+            return
+
+        name, ok = QInputDialog.getText(self, "Новая задача", "Название задачи:")
+        name = name.strip()
+        if not ok or not name:
+            return
+
+        priorities = ["urgent — срочная оценка", "normal — обычная", "background — фоновая"]
+        priority, ok = QInputDialog.getItem(self, "Новая задача", "Приоритет:", priorities, 1, False)
+        if not ok:
+            return
+
+        every, ok = QInputDialog.getInt(self, "Новая задача", "Повторять каждые, минут (0 — однократно):", 0, 0, 100000)
+        if not ok:
+            return
+
+        self.scheduler.add(Job(name, "urls", urls=urls, every=every, priority=priority.split(" ")[0]))
+        self.log_msg(f"✓ Задача «{name}» добавлена в расписание ({len(urls)} ссылок)")
+
+    def on_scheduler_toggled(self, checked):
+        if checked:
+            self.scheduler_worker = SchedulerWorker(self.scheduler, self.listing_cache, self.proxy_pool)
+            self.scheduler_worker.log.connect(self.log_msg)
+            self.scheduler_worker.captcha_detected.connect(self.on_scheduler_captcha)
+            self.scheduler_worker.auth_required.connect(self.on_scheduler_captcha)
+            self.scheduler_worker.error.connect(self.on_error)
+            self.scheduler_worker.start()
+            self.log_msg(f"▶ Планировщик запущен, задач: {len(self.scheduler.jobs)}")
+        elif self.scheduler_worker:
+            self.scheduler_worker.stop()
+            self.log_msg("ℹ Планировщик остановится после текущего объявления")
+
+    def on_metrics_toggled(self, checked):
+        if checked:
+            try:
+                self.metrics_server = metrics.serve()
+            except OSError as e:
+                QMessageBox.warning(self, "Метрики", f"Не удалось открыть порт {metrics.DEFAULT_PORT}:\n{e}")
+                self.metrics_action.setChecked(False)
+                return
+            self.metrics_snapshots = metrics.SnapshotWriter().start()
+            self.log_msg(f"✓ Метрики: http://127.0.0.1:{metrics.DEFAULT_PORT}/metrics, "
+                         f"снимок каждые {self.metrics_snapshots.interval} с в {self.metrics_snapshots.path}")
+        else:
+            self._stop_metrics()
+
+    def on_profiling_toggled(self, checked):
+        profiler.set_enabled(checked)
+        if checked:
+            self.log_msg(f"✓ Профилирование включено, файлы: {profiler.directory}")
+        else:
+            self.log_msg("ℹ Профилирование выключено")
+
+    def on_debug_log_toggled(self, checked):
+        # В таблицу лога по-прежнему идут только INFO и выше, DEBUG пишется в файл
+        applog.setup(level=logging.DEBUG if checked else logging.INFO)
+
+    def _stop_metrics(self):
+        if self.metrics_server:
+            self.metrics_server.shutdown()
+            self.metrics_server.server_close()
+            self.metrics_server = None
+        if self.metrics_snapshots:
+            self.metrics_snapshots.stop()
+            self.metrics_snapshots = None
+
+    def on_scheduler_captcha(self):
+        self.log_msg("⚠ Планировщик: капча или авторизация в браузере задачи")
+        QMessageBox.warning(self, "Требуется действие", "Решите капчу или авторизуйтесь в браузере планировщика,\nзатем нажмите OK")
+        QMetaObject.invokeMethod(self.scheduler_worker, "continue_after_captcha", Qt.QueuedConnection)
+
+    def add_urls(self, urls):
+        """Добавляет ссылки в таблицу, сначала заполняя пустые строки"""
+        urls = list(urls)
+        for row in range(self.table.rowCount()):
+            if not urls:
+                return
+            item = self.table.item(row, 0)
+            if item is None or not item.text().strip():
+                self.table.setItem(row, 0, QTableWidgetItem(urls.pop(0)))
+
+        for url in urls:
+            self.add_row()
+            self.table.setItem(self.table.rowCount() - 1, 0, QTableWidgetItem(url))
+
     def on_captcha(self):
         self.log_msg("⚠ Обнаружена капча")
         self.continue_btn.setEnabled(True)
@@ -386,10 +1103,8 @@ class AvitoApp(QWidget):
             QMessageBox.information(self, "Готово", "Нет успешно обработанных объявлений")
             return
 
-        self.parsed_rows = result["rows"]
-
-        self.export_excel_btn.setEnabled(True)
-        self.export_word_btn.setEnabled(True)
+        self.parsed_rows = as_listings(result["rows"])
+        self.update_export_buttons()
 
         msg_box = QMessageBox(self)
         msg_box.setWindowTitle("Готово")
@@ -402,14 +1117,17 @@ class AvitoApp(QWidget):
         self.start_btn.setEnabled(True)
         QMessageBox.critical(self, "Ошибка", msg)
 
+    # ---------- Export ----------
+    def update_export_buttons(self):
+        """Экспорт доступен, когда есть результаты и предыдущий экспорт завершён"""
+        enabled = bool(self.parsed_rows) and self.export_worker is None
+        self.export_excel_btn.setEnabled(enabled)
+        self.export_word_btn.setEnabled(enabled)
+
     def export_excel(self):
         if not self.parsed_rows:
             return
 
-        rows = self.get_current_rows_with_analogs()
-
-        wb = build_excel(self, rows)
-
         path, _ = QFileDialog.getSaveFileName(
             self,
             "Сохранить Excel",
@@ -420,11 +1138,7 @@ class AvitoApp(QWidget):
         if not path:
             return
 
-        try:
-            wb.save(path)
-            QMessageBox.information(self, "Готово", "Excel файл сохранён")
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", str(e))
+        self.start_export("excel", path)
 
     def export_word(self):
         if not self.parsed_rows:
@@ -440,22 +1154,73 @@ class AvitoApp(QWidget):
         if not path:
             return
 
+        self.start_export("word", path)
+
+    def start_export(self, kind, path):
+        # Строки и отметки аналогов читаются из таблицы здесь, в потоке окна;
+        # новый парсинг заменит parsed_rows, не затрагивая список экспорта
         rows = self.get_current_rows_with_analogs()
 
-        try:
-            build_word_with_screenshots(
-                rows,
-                path
+        self.export_worker = ExportWorker(kind, rows, path)
+        self.export_worker.log.connect(self.log_msg)
+        self.export_worker.progress.connect(self.on_export_progress)
+        self.export_worker.finished.connect(self.on_export_finished)
+        self.export_worker.error.connect(self.on_export_error)
+
+        self.update_export_buttons()
+        self.export_progress.setRange(0, 0)
+        self.export_progress.setVisible(True)
+        self.cancel_export_btn.setEnabled(True)
+        self.cancel_export_btn.setVisible(True)
+        self.log_msg(f"▶ Экспорт {ExportWorker.LABELS[kind]}: {path}")
+        self.export_worker.start()
+
+    def cancel_export(self):
+        if self.export_worker:
+            self.export_worker.cancel()
+            self.cancel_export_btn.setEnabled(False)
+            self.log_msg("ℹ Экспорт остановится после текущего объявления")
+
+    def on_export_progress(self, done, total):
+        self.export_progress.setRange(0, total)
+        self.export_progress.setValue(done)
+
+    def _export_done(self):
+        # Сигнал приходит из конца run(): дожидаемся выхода потока, прежде чем отпустить объект
+        self.export_worker.wait()
+        self.export_worker = None
+        self.export_progress.setVisible(False)
+        self.cancel_export_btn.setVisible(False)
+        self.update_export_buttons()
+
+    def on_export_finished(self, result):
+        self._export_done()
+        label = ExportWorker.LABELS[result["kind"]]
+
+        if result["cancelled"]:
+            self.log_msg(f"ℹ Экспорт {label} отменён, файл не сохранён")
+            return
+
+        errors = result["errors"]
+        self.log_msg(f"✓ {label} файл сохранён: {result['path']}")
+        if errors:
+            QMessageBox.warning(
+                self, f"{label} файл сохранён с ошибками",
+                f"Пропущено строк: {len(errors)}\n\n{format_errors(errors)}"
             )
-            QMessageBox.information(self, "Готово", "Word файл сохранён")
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", str(e))
+        else:
+            QMessageBox.information(self, "Готово", f"{label} файл сохранён")
+
+    def on_export_error(self, msg):
+        self._export_done()
+        QMessageBox.critical(self, "Ошибка", msg)
 
 
 # =========================
 # ENTRY POINT
 # =========================
 if __name__ == "__main__":
+    applog.setup()
     app = QApplication(sys.argv)
     window = AvitoApp()
     window.show()
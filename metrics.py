@@ -0,0 +1,323 @@
+"""
+Metrics
+Счётчики и распределения работы парсеров в формате Prometheus.
+
+Парсеры и воркеры пишут в общий реестр (REGISTRY): сколько объявлений
+обработано, сколько длился разбор и загрузка страницы, сколько раз
+встретилась капча, сколько было повторов и перезапусков браузера.
+
+Снаружи метрики доступны двумя способами:
+    http://127.0.0.1:9108/metrics         — текст в формате Prometheus
+                                              (serve(), для scrape/алертов)
+    Диагностика/metrics.json              — периодический снимок
+                                              (SnapshotWriter, для истории
+                                              и подбора нагрузки)
+
+Перцентили считаются по скользящему окну последних наблюдений,
+поэтому отражают текущую работу, а не всё время с запуска.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import applog
+from timing import DIAGNOSTICS_DIR
+
+log = applog.get_logger(__name__)
+
+DEFAULT_PORT = 9108
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+def quantile(sorted_values, q):
+    """Перцентиль по отсортированному списку (линейная интерполяция)"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class Metric:
+    """Общая часть метрик: имя, описание и значения по наборам меток"""
+    TYPE = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self):
+        """[(суффикс имени, значения меток, доп. метка, значение)]"""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.TYPE}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.label_names, values, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    TYPE = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [("", key, None, value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(Metric):
+    TYPE = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [("", key, None, value) for key, value in sorted(self._values.items())]
+
+
+class Summary(Metric):
+    """Сумма, число и перцентили по окну последних window наблюдений"""
+    TYPE = "summary"
+
+    def __init__(self, name, help_text, labels=(), window=1024):
+        super().__init__(name, help_text, labels)
+        self.window = window
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"count": 0, "sum": 0.0, "recent": deque(maxlen=self.window)}
+            state["count"] += 1
+            state["sum"] += value
+            state["recent"].append(value)
+
+    def quantiles(self, **labels):
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            recent = sorted(state["recent"]) if state else []
+        return {q: quantile(recent, q) for q in QUANTILES}
+
+    def samples(self):
+        result = []
+        with self._lock:
+            states = [(key, state["count"], state["sum"], sorted(state["recent"]))
+                      for key, state in sorted(self._values.items())]
+        for key, count, total, recent in states:
+            for q in QUANTILES:
+                result.append(("", key, ("quantile", q), quantile(recent, q)))
+            result.append(("_sum", key, None, total))
+            result.append(("_count", key, None, count))
+        return result
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, help_text, labels, **kwargs):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help_text, labels, **kwargs)
+            return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=()):
+        return self._register(Gauge, name, help_text, labels)
+
+    def summary(self, name, help_text, labels=(), window=1024):
+        return self._register(Summary, name, help_text, labels, window=window)
+
+    def render(self):
+        """Текст в формате Prometheus exposition 0.0.4"""
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """{метрика: [{метки…, value}]} — для JSON-снимка"""
+        result = {}
+        for name, metric in list(self.metrics.items()):
+            for suffix, values, extra, value in metric.samples():
+                row = dict(zip(metric.label_names, values))
+                if extra:
+                    row[extra[0]] = extra[1]
+                row["value"] = value
+                result.setdefault(name + suffix, []).append(row)
+        return result
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Запросы scrape не засоряют вывод
+        pass
+
+
+def serve(registry=None, port=DEFAULT_PORT, host="127.0.0.1"):
+    """Запускает HTTP-эндпоинт в фоновом потоке. Возвращает сервер (server.shutdown() — остановка)"""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry or REGISTRY})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+class SnapshotWriter:
+    """Периодическая запись снимка метрик в JSON (атомарно, поверх прошлого)"""
+
+    def __init__(self, registry=None, path=DIAGNOSTICS_DIR / "metrics.json", interval=60):
+        self.registry = registry or REGISTRY
+        self.path = Path(path)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._previous = None
+
+    def _rates(self, snapshot, now):
+        """Прирост счётчиков в минуту с прошлого снимка — текущая пропускная способность"""
+        counters = {
+            name: {json.dumps({k: v for k, v in row.items() if k != "value"}, sort_keys=True): row["value"]
+                   for row in snapshot.get(name, [])}
+            for name, metric in self.registry.metrics.items() if metric.TYPE == "counter"
+        }
+        rates = {}
+        if self._previous:
+            then, old_counters = self._previous
+            minutes = max((now - then) / 60, 1e-9)
+            for name, rows in counters.items():
+                for labels, value in rows.items():
+                    delta = value - old_counters.get(name, {}).get(labels, 0)
+                    rates.setdefault(name, []).append(dict(json.loads(labels), per_minute=round(delta / minutes, 3)))
+        self._previous = (now, counters)
+        return rates
+
+    def write(self):
+        now = time.monotonic()
+        snapshot = self.registry.snapshot()
+        payload = {
+            "written_at": datetime.now().isoformat(),
+            "metrics": snapshot,
+            "rates": self._rates(snapshot, now),
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        tmp_path.replace(self.path)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                log.warning("  ⚠ Не удалось записать снимок метрик: %s", e)
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="metrics-snapshot", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        try:
+            self.write()
+        except OSError:
+            pass
+
+
+# Общий реестр процесса и метрики, которые пишут парсеры и воркеры
+REGISTRY = MetricsRegistry()
+
+ADS_PROCESSED = REGISTRY.counter(
+    "parser_ads_total", "Обработанные объявления по результату (ok, http, not_found, timeout, error)",
+    ("site", "status"))
+AD_SECONDS = REGISTRY.summary(
+    "parser_ad_seconds", "Длительность parse_ad одного объявления, сек", ("site",))
+PAGE_LOAD_SECONDS = REGISTRY.summary(
+    "parser_page_load_seconds", "Загрузка страницы объявления в браузере (driver.get), сек", ("site",))
+CAPTCHAS = REGISTRY.counter(
+    "parser_captchas_total", "Страницы с капчей/блокировкой или без контента", ("site", "kind"))
+CAPTCHA_WAIT_SECONDS = REGISTRY.summary(
+    "parser_captcha_wait_seconds", "Ожидание прохождения капчи или авторизации пользователем, сек", ("site",))
+RETRIES = REGISTRY.counter(
+    "parser_retries_total", "Повторные попытки (ожидание готовности, откат HTTP → браузер, таймауты)",
+    ("site", "stage"))
+BROWSER_RESTARTS = REGISTRY.counter(
+    "parser_browser_restarts_total", "Перезапуски браузера", ("site",))
+WORKER_QUEUE = REGISTRY.gauge(
+    "parser_worker_queue", "Объявлений осталось в текущем прогоне", ("worker",))
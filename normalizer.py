@@ -0,0 +1,139 @@
+"""
+Normalizer
+Пересчёт цен, площадей и цен за м² в сохранённых результатах без повторного парсинга.
+
+После изменения таблиц единиц в text_parsing (или исправления пересчёта)
+старые результаты приводятся к новым правилам по сохранённым исходным
+строкам: price_text, price_info, title и params. Пересчитываются:
+    price, price_type   — из price_text (годовая цена → месячная)
+    price_per_m2        — Avito: из price_info; Циан: остаётся как было
+                          (факты со страницы не сохраняются)
+    area_m2, params     — _fill_derived_fields парсера сайта
+    published_at,       — ISO-время из published_date и дат истории цен
+    price_history[].date_iso  относительно parsed_at («сегодня в 14:02»)
+
+Проход идёт по колонкам: каждая уникальная строка разбирается один раз
+(даты — через кэш разбора text_parsing),
+поэтому набор из десятков тысяч объявлений с повторяющимися ценами
+пересчитывается примерно за секунду.
+
+    python normalizer.py Результаты/*.json              — рядом, *.normalized.json
+    python normalizer.py --in-place Результаты/*.json   — поверх (с копией .bak)
+"""
+
+import argparse
+import copy
+import json
+import shutil
+from pathlib import Path
+
+import applog
+from listing_cache import detect_site
+from text_parsing import normalize_dates, parse_price, price_per_m2_from_info
+
+log = applog.get_logger(__name__)
+
+# Поля, по которым сравнивается результат до и после
+NORMALIZED_FIELDS = ("price", "price_type", "price_per_m2", "area_m2")
+
+
+def _column(results, field, func):
+    """{значение: func(значение)} для уникальных строк колонки"""
+    return {value: func(value) for value in {data.get(field) for data in results} if value}
+
+
+def renormalize(results, parsers):
+    """
+    Пересчитывает результаты на месте. parsers — {"avito": AvitoParser, "cian": CianParser}
+    (нужен только _fill_derived_fields). Возвращает число изменившихся объявлений.
+    """
+    rows = [
+        data for data in results
+        if data.get("price_text") and not data.get("page_not_found") and not data.get("error")
+    ]
+    prices = _column(rows, "price_text", parse_price)
+    prices_per_m2 = _column(rows, "price_info", price_per_m2_from_info)
+
+    changed = 0
+    for data in rows:
+        site = detect_site(data.get("url", ""))
+        parser = parsers.get(site)
+        if parser is None:
+            continue
+
+        before = {field: data.get(field) for field in NORMALIZED_FIELDS}
+        params_before = copy.deepcopy(data.get("params"))
+
+        data["price"], data["price_type"] = prices[data["price_text"]]
+        data.setdefault("params", {})
+        data.pop("area_m2", None)
+        if site == "avito":
+            data["price_per_m2"] = prices_per_m2.get(data.get("price_info"))
+            if data["price_per_m2"] is None:
+                # _fill_derived_fields посчитает из цены и площади
+                data.pop("price_per_m2")
+
+        try:
+            parser._fill_derived_fields(data)
+        except Exception as e:
+            log.warning("  ⚠ %s: %s", data.get("url"), e)
+
+        if {field: data.get(field) for field in NORMALIZED_FIELDS} != before or data["params"] != params_before:
+            changed += 1
+
+    return changed
+
+
+def renormalize_dates(results):
+    """ISO-даты для всех результатов (включая объявления без цены). Возвращает число изменившихся"""
+    changed = 0
+    for data in results:
+        before = (data.get("published_at"), [e.get("date_iso") for e in data.get("price_history") or []])
+        normalize_dates(data)
+        if (data.get("published_at"), [e.get("date_iso") for e in data.get("price_history") or []]) != before:
+            changed += 1
+    return changed
+
+
+def _load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save(path, payload):
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    tmp_path.replace(path)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Пересчёт единиц в сохранённых результатах")
+    arg_parser.add_argument("files", nargs="+")
+    arg_parser.add_argument("--in-place", action="store_true", help="перезаписать файлы (копия — .bak)")
+    args = arg_parser.parse_args()
+
+    applog.setup()
+
+    from avito_parser import AvitoParser
+    from cian_parser import CianParser
+
+    site_parsers = {
+        "avito": AvitoParser(download_screens=False, persistent_profile=False),
+        "cian": CianParser(download_images=False, persistent_profile=False),
+    }
+
+    for file_name in args.files:
+        source = Path(file_name)
+        payload = _load(source)
+        results = payload if isinstance(payload, list) else payload.get("rows", [])
+        count = renormalize(results, site_parsers)
+        dates_count = renormalize_dates(results)
+
+        if args.in_place:
+            shutil.copy2(source, source.with_suffix(source.suffix + ".bak"))
+            target = source
+        else:
+            target = source.with_name(source.stem + ".normalized.json")
+        _save(target, payload)
+        print(f"✓ {source}: цены и площади изменены у {count}, даты — у {dates_count} из {len(results)} → {target}")
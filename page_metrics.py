@@ -0,0 +1,198 @@
+"""
+Page Metrics
+Диагностика медленных страниц: метрики браузера по каждому объявлению.
+
+Для каждой страницы собирается:
+    cdp         — Performance.getMetrics (DevTools): время скриптов, вёрстки,
+                  пересчёта стилей и задач за загрузку, размер JS-кучи, число узлов
+    navigation  — Navigation Timing: DNS, соединение, ответ сервера (TTFB),
+                  DOMContentLoaded, load, объём документа
+    resources   — число и объём загруженных ресурсов и самые медленные запросы
+    waits       — наши ожидания: загрузка в driver.get и время до готовности
+                  страницы (включая LOAD_DELAY и ожидание tooltip)
+
+Результат кладётся в data["page_metrics"]. Сводка по сайтам (aggregate)
+показывает, что тормозит — сеть, скрипты или наши ожидания, — и какие
+хосты чаще всего попадают в медленные запросы (кандидаты в блок-лист).
+
+Сводка по сохранённым результатам:
+    python page_metrics.py Результаты/*.json
+"""
+
+import json
+import sys
+from collections import Counter
+from urllib.parse import urlparse
+
+import applog
+from metrics import quantile
+
+log = applog.get_logger(__name__)
+
+# Накопительные метрики CDP: считаем прирост за загрузку страницы
+CUMULATIVE_METRICS = ("ScriptDuration", "LayoutDuration", "RecalcStyleDuration", "TaskDuration", "LayoutCount")
+# Мгновенные значения на момент готовности
+CURRENT_METRICS = ("JSHeapUsedSize", "Nodes", "Documents", "JSEventListeners")
+
+PAGE_TIMING_JS = """
+    var top = arguments[0];
+    var nav = performance.getEntriesByType('navigation')[0];
+    var navigation = null;
+    if (nav) {
+        navigation = {
+            dns: nav.domainLookupEnd - nav.domainLookupStart,
+            connect: nav.connectEnd - nav.connectStart,
+            ttfb: nav.responseStart - nav.requestStart,
+            response: nav.responseEnd - nav.responseStart,
+            dom_interactive: nav.domInteractive,
+            dom_content_loaded: nav.domContentLoadedEventEnd,
+            load: nav.loadEventEnd,
+            transfer_size: nav.transferSize
+        };
+    }
+    var resources = performance.getEntriesByType('resource');
+    var bytes = 0;
+    for (var i = 0; i < resources.length; i++) bytes += resources[i].transferSize || 0;
+    var slowest = resources.slice().sort(function (a, b) { return b.duration - a.duration; })
+        .slice(0, top).map(function (r) {
+            return {url: r.name.split('?')[0].slice(0, 200), type: r.initiatorType,
+                    duration: r.duration, size: r.transferSize || 0};
+        });
+    return {navigation: navigation, resources: {count: resources.length, bytes: bytes, slowest: slowest}};
+"""
+
+
+def enable(driver):
+    """Включает домен Performance DevTools; вызывается после запуска браузера"""
+    try:
+        driver.execute_cdp_cmd("Performance.enable", {})
+        return True
+    except Exception as e:
+        log.debug("  ℹ Метрики DevTools недоступны: %s", e)
+        return False
+
+
+def cdp_metrics(driver):
+    """{имя: значение} из Performance.getMetrics или {} если недоступно"""
+    try:
+        result = driver.execute_cdp_cmd("Performance.getMetrics", {})
+    except Exception:
+        return {}
+    return {m["name"]: m["value"] for m in result.get("metrics", [])}
+
+
+def collect(driver, baseline=None, top=5):
+    """
+    Метрики текущей страницы. baseline — cdp_metrics() перед driver.get,
+    чтобы накопительные значения относились только к этой загрузке.
+    """
+    current = cdp_metrics(driver)
+    baseline = baseline or {}
+    cdp = {}
+    for name in CUMULATIVE_METRICS:
+        if name in current:
+            cdp[name] = round(current[name] - baseline.get(name, 0), 4)
+    for name in CURRENT_METRICS:
+        if name in current:
+            cdp[name] = current[name]
+
+    try:
+        timing = driver.execute_script(PAGE_TIMING_JS, top) or {}
+    except Exception as e:
+        log.debug("  ℹ Не удалось получить Navigation Timing: %s", e)
+        timing = {}
+
+    return {
+        "cdp": cdp,
+        "navigation": timing.get("navigation"),
+        "resources": timing.get("resources"),
+    }
+
+
+def _site(url):
+    host = urlparse(url or "").netloc
+    return "avito" if "avito" in host else "cian" if "cian" in host else host or "?"
+
+
+def _percentiles(values):
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    return {
+        "count": len(values),
+        "p50": round(quantile(values, 0.5), 3),
+        "p90": round(quantile(values, 0.9), 3),
+        "max": round(values[-1], 3),
+    }
+
+
+def aggregate(results, top_hosts=10):
+    """
+    Сводка по сайтам для результатов с page_metrics:
+    перцентили по сети, скриптам и ожиданиям и хосты медленных запросов.
+    """
+    by_site = {}
+    for data in results:
+        page = data.get("page_metrics")
+        if not page:
+            continue
+        by_site.setdefault(_site(data.get("url")), []).append(page)
+
+    summary = {}
+    for site, pages in by_site.items():
+        navigation = [p.get("navigation") or {} for p in pages]
+        cdp = [p.get("cdp") or {} for p in pages]
+        waits = [p.get("waits") or {} for p in pages]
+        hosts = Counter(
+            urlparse(r["url"]).netloc
+            for p in pages
+            for r in (p.get("resources") or {}).get("slowest", [])
+        )
+        summary[site] = {
+            "pages": len(pages),
+            # мс, из Navigation Timing
+            "ttfb_ms": _percentiles(n.get("ttfb") for n in navigation),
+            "dom_content_loaded_ms": _percentiles(n.get("dom_content_loaded") for n in navigation),
+            "load_ms": _percentiles(n.get("load") for n in navigation),
+            # сек, из DevTools
+            "script_s": _percentiles(c.get("ScriptDuration") for c in cdp),
+            "layout_s": _percentiles(c.get("LayoutDuration") for c in cdp),
+            "task_s": _percentiles(c.get("TaskDuration") for c in cdp),
+            # сек, наши ожидания
+            "page_load_s": _percentiles(w.get("page_load") for w in waits),
+            "until_ready_s": _percentiles(w.get("until_ready") for w in waits),
+            "resource_mb": _percentiles(((p.get("resources") or {}).get("bytes", 0) / 1e6) for p in pages),
+            "slow_hosts": hosts.most_common(top_hosts),
+        }
+    return summary
+
+
+def format_summary(summary):
+    """Короткие строки сводки для лога"""
+    lines = []
+    for site, s in summary.items():
+        def p(key):
+            value = s.get(key)
+            return f"{value['p50']}/{value['p90']}" if value else "—"
+        lines.append(
+            f"{site}: страниц {s['pages']}, p50/p90 — TTFB {p('ttfb_ms')} мс, load {p('load_ms')} мс, "
+            f"скрипты {p('script_s')} с, до готовности {p('until_ready_s')} с"
+        )
+        if s["slow_hosts"]:
+            hosts = ", ".join(f"{host} ({n})" for host, n in s["slow_hosts"][:5])
+            lines.append(f"   медленные хосты: {hosts}")
+    return lines
+
+
+if __name__ == "__main__":
+    results = []
+    for path in sys.argv[1:]:
+        with open(path, "r", encoding="utf-8") as f:
+            loaded = json.load(f)
+        results.extend(loaded if isinstance(loaded, list) else loaded.get("rows", []))
+
+    summary = aggregate(results)
+    if not summary:
+        print("В результатах нет page_metrics")
+    for line in format_summary(summary):
+        print(line)
@@ -0,0 +1,428 @@
+"""
+Parsing Bench
+Самопроверка и замер скорости функций text_parsing.
+
+На корпусе строк цен, площадей, дат, фактов Циан и tooltip истории цен:
+    1. проверяются свойства — совпадение с прежней реализацией парсеров
+       (она сохранена здесь как эталон) там, где поведение не менялось,
+       устойчивость к неразрывным пробелам, обратимость форматирования
+       (число → текст → число, время → строка даты → время), пересчёт
+       единиц и периодов;
+    2. замеряется время на вызов для text_parsing и эталона.
+
+Корпус — синтетические строки в формате сайтов плюс строки из сохранённых
+результатов, если переданы файлы:
+    python parsing_bench.py
+    python parsing_bench.py --size 50000 Результаты/*.json
+
+Код выхода 1, если хоть одно свойство нарушено, — перед оптимизацией
+text_parsing достаточно запустить этот файл до и после.
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+import text_parsing
+
+MONTHS = ["января", "февраля", "марта", "апреля", "мая", "июня", "июля",
+          "августа", "сентября", "октября", "ноября", "декабря"]
+
+PRICE_TEMPLATES = [
+    "{n} ₽", "{n} ₽ в месяц", "{n} ₽ в месяц за м²", "{n} ₽ в год", "{n} ₽/мес.",
+    "{n} ₽/год", "от {n} ₽", "{n} ₽ за м²", "{n} руб.", "Цена {n} ₽",
+]
+PRICE_INFO_TEMPLATES = [
+    "{n} ₽ за м²", "{n} ₽ за сотку", "{n} ₽ за гектар", "{n} ₽ в год за м²",
+    "{n} ₽ в месяц за м²", "Залог {n} ₽", "{n} ₽ за м² · ипотека",
+]
+FACT_TEMPLATES = [
+    ("Цена за метр", "{n} ₽/м²"), ("Цена за метр", "{n} ₽/м² в год"),
+    ("Цена за метр", "{n} ₽/м² в месяц"), ("Цена за сотку", "{n} ₽"),
+    ("Цена за гектар", "{n} ₽"), ("Налог", "включён"), ("Залог", "{n} ₽"),
+]
+AREA_TEMPLATES = ["{v} м²", "{v} м2", "{v}м²", "Общая площадь {v} м²", "{v} м² · 5/9 эт."]
+NON_NUMERIC = ["Цена по запросу", "", "Договорная", "—"]
+# Время разбора, относительно которого проверяются даты корпуса
+REFERENCE_TIME = datetime(2025, 6, 15, 18, 0)
+
+
+def _group(n, sep=" "):
+    return f"{n:,}".replace(",", sep)
+
+
+def _decimal(rng):
+    value = round(rng.uniform(5, 500), rng.choice((0, 1, 2)))
+    return value, str(value).replace(".0", "") if value == int(value) else str(value)
+
+
+def _tooltip(rng, entries, with_changes=True):
+    parts = []
+    for i, (date, price) in enumerate(entries):
+        parts.append(f"{date}\n{_group(price, rng.choice((' ', chr(0xa0))))} ₽")
+        if with_changes and i:
+            delta = price - entries[i - 1][1]
+            parts.append(f"{'+' if delta >= 0 else '−'}{_group(abs(delta))} ₽")
+        elif with_changes:
+            parts.append("Публикация")
+    return "История цены\n" + "\n".join(parts)
+
+
+def build_corpus(size=5000, seed=1):
+    rng = random.Random(seed)
+    corpus = {"prices": [], "price_infos": [], "facts": [], "areas": [], "plots": [], "tooltips": [],
+              "dates": [], "date_texts": []}
+
+    for _ in range(size):
+        n = rng.choice((rng.randint(100, 9999), rng.randint(10000, 999999), rng.randint(1000000, 300000000)))
+        sep = rng.choice((" ", chr(0xa0)))
+        corpus["prices"].append(rng.choice(PRICE_TEMPLATES).format(n=_group(n, sep)))
+        corpus["price_infos"].append(rng.choice(PRICE_INFO_TEMPLATES).format(n=_group(n)))
+        title, value = rng.choice(FACT_TEMPLATES)
+        corpus["facts"].append([(title, value.format(n=_group(n)))])
+
+        value, text = _decimal(rng)
+        corpus["areas"].append((value, rng.choice(AREA_TEMPLATES).format(v=text)))
+        factor = rng.choice(list(text_parsing.PLOT_UNITS.factors.values()))
+        suffix = {100: rng.choice(("сот.", "сот", "соток")), 10000: rng.choice(("га", "га."))}[factor]
+        corpus["plots"].append((value * factor, f"{text.replace('.', rng.choice(('.', ',')))} {suffix}"))
+
+        if len(corpus["tooltips"]) < size // 5:
+            entries = [
+                (f"{rng.randint(1, 28)} {rng.choice(MONTHS)} {rng.randint(2018, 2026)}", rng.randint(1000, 90000000))
+                for _ in range(rng.randint(1, 8))
+            ]
+            with_changes = rng.random() < 0.5
+            corpus["tooltips"].append((entries, _tooltip(rng, entries, with_changes), with_changes))
+
+        corpus["dates"].append(_date_case(rng))
+
+    corpus["prices"].extend(NON_NUMERIC)
+    corpus["price_infos"].extend(NON_NUMERIC)
+    corpus["date_texts"] = [text for _, text in corpus["dates"]]
+    return corpus
+
+
+def _date_case(rng):
+    """(ожидаемое время, строка даты в одном из форматов сайтов)"""
+    moment = REFERENCE_TIME - timedelta(minutes=rng.randint(0, 3 * 365 * 24 * 60))
+    moment = moment.replace(second=0)
+    month = MONTHS[moment.month - 1]
+    clock = f"{moment.hour:02d}:{moment.minute:02d}"
+    days_ago = (REFERENCE_TIME.date() - moment.date()).days
+    choice = rng.randrange(6)
+    if choice == 0 and days_ago == 0:
+        return moment, f"сегодня в {clock}"
+    if choice == 1 and days_ago == 1:
+        return moment, f"вчера в {clock}"
+    if choice == 2 and days_ago < 300:
+        return moment, f"· {moment.day} {month} в {clock}"
+    if choice == 3:
+        return moment.replace(hour=0, minute=0), f"{moment.day} {month[:3]}. {moment.year}"
+    if choice == 4:
+        hours = rng.randint(1, 23)
+        return REFERENCE_TIME - timedelta(hours=hours), f"{hours} ч. назад"
+    return moment.replace(hour=0, minute=0), f"Опубликовано {moment.day} {month} {moment.year}"
+
+
+def add_results(corpus, paths):
+    """Строки из сохранённых результатов парсинга"""
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            loaded = json.load(f)
+        for data in loaded if isinstance(loaded, list) else loaded.get("rows", []):
+            if data.get("price_text"):
+                corpus["prices"].append(data["price_text"])
+            if data.get("price_info"):
+                corpus["price_infos"].append(data["price_info"])
+            if data.get("published_date"):
+                corpus["date_texts"].append(data["published_date"])
+
+
+# ---------- Эталон: прежняя реализация из парсеров ----------
+
+def _reference_parse_price(price_text):
+    if not price_text:
+        return None, None
+    numbers = re.findall(r'[\d\s]+', price_text)
+    if numbers:
+        price_str = numbers[0].replace(' ', '').replace('\xa0', '')
+        try:
+            price = int(price_str)
+        except ValueError:
+            price = None
+    else:
+        price = None
+    price_type = "месяц"
+    if "м²" in price_text or "м2" in price_text:
+        price_type = "м²/месяц"
+    elif "год" in price_text:
+        price_type = "год"
+    return price, price_type
+
+
+def _reference_cian_parse_price(price_text):
+    price, price_type = _reference_parse_price(price_text)
+    if price_type == "год" and price is not None:
+        price /= 12
+    return price, price_type
+
+
+def _reference_extract_num(text):
+    text = text.replace("²", "")
+    num = ""
+    for i, c in enumerate(text):
+        if c.isdigit():
+            num += c
+        elif i != 0 and text[i-1].isdigit() and c == '.':
+            num += c
+    return float(num)
+
+
+def _reference_price_per_m2_from_info(price_info):
+    if not price_info:
+        return None
+    match = re.search(r'([\d\s]+)\s*₽', price_info)
+    if match:
+        try:
+            if 'за сотку' in price_info:
+                return float(match.group(1).replace(" ", "")) / 100
+            if 'за гектар' in price_info:
+                return float(match.group(1).replace(" ", "")) * 10000
+            if 'в год' in price_info:
+                return float(match.group(1).replace(" ", "")) / 12
+            return float(match.group(1).replace(" ", ""))
+        except:
+            pass
+    return None
+
+
+def _reference_price_per_m2_from_facts(facts):
+    try:
+        for title, value in facts:
+            if "Цена за метр" in title:
+                if 'в год' in value:
+                    value = _reference_extract_num(value) / 12
+                elif "в месяц" in value:
+                    value = _reference_extract_num(value)
+                else:
+                    value = float(value.replace("₽/м²", "").replace("₽", "").replace(" ", ""))
+                return value
+            elif "Цена за сотку" in title:
+                return _reference_extract_num(value) / 100
+            elif "Цена за гектар" in title:
+                return _reference_extract_num(value) / 10000
+        return None
+    except Exception:
+        return None
+
+
+def _reference_price_history(text):
+    price_history = []
+    text = text.replace("\xa0", " ")
+    text = re.sub(r"\s+", " ", text).strip()
+    tokens = text.split(" ")
+    i = 0
+    while i < len(tokens):
+        if (
+                i + 2 < len(tokens)
+                and re.match(r"\d{1,2}", tokens[i])
+                and re.match(r"[А-Яа-я]+", tokens[i + 1])
+                and re.match(r"\d{4}", tokens[i + 2])
+        ):
+            date = f"{tokens[i]} {tokens[i + 1]} {tokens[i + 2]}"
+            i += 3
+            num_parts = []
+            while i < len(tokens) and tokens[i].isdigit():
+                num_parts.append(tokens[i])
+                i += 1
+            if i < len(tokens) and tokens[i] == "₽":
+                price_history.append({"date": date, "price": int("".join(num_parts))})
+                i += 1
+        i += 1
+    return price_history
+
+
+# ---------- Свойства ----------
+
+def _close(a, b):
+    if a is None or b is None:
+        return a is b
+    return abs(a - b) <= 1e-9 * max(1.0, abs(a), abs(b))
+
+
+def _same_outcome(func, reference, arg):
+    """Обе функции вернули одно и то же или обе бросили ValueError"""
+    try:
+        expected = reference(arg)
+    except ValueError:
+        expected = ValueError
+    try:
+        actual = func(arg)
+    except ValueError:
+        actual = ValueError
+    if expected is ValueError or actual is ValueError:
+        return expected is actual
+    return _close(actual, expected)
+
+
+def check_properties(corpus):
+    """Список нарушений: (свойство, вход, подробности)"""
+    failures = []
+
+    def fail(name, arg, detail=""):
+        if sum(1 for f in failures if f[0] == name) < 5:
+            failures.append((name, arg, detail))
+
+    for text in corpus["prices"]:
+        actual = text_parsing.parse_price(text)
+        # Прежний Циан делил на 12 только тип «год»; цену за м² в год не пересчитывал
+        if actual[1] != "м²/месяц" and actual != _reference_cian_parse_price(text):
+            fail("parse_price = эталон Циан", text, actual)
+        if text_parsing.parse_price(text.replace(" ", "\xa0")) != actual:
+            fail("parse_price: nbsp ≡ пробел", text)
+
+    rng = random.Random(2)
+    for _ in range(len(corpus["prices"])):
+        n = rng.randint(0, 10 ** 9)
+        if text_parsing.parse_price(f"{_group(n)} ₽") != (n, "месяц"):
+            fail("parse_price: число → текст → число", n)
+        for text in (f"{_group(n)} ₽ в год", f"{_group(n)} ₽/м² в год"):
+            if not _close(text_parsing.parse_price(text)[0] * 12, n):
+                fail("parse_price: годовая цена = месячная × 12", text)
+        # Единица ищется с начала слова: «год» в «выгодно» — не период
+        text = f"{_group(n)} ₽ выгодно"
+        if text_parsing.parse_price(text) != (n, "месяц"):
+            fail("parse_price: «выгодно» — не годовая цена", text)
+
+    for text in corpus["prices"] + [value for facts in corpus["facts"] for _, value in facts]:
+        if not _same_outcome(text_parsing.extract_num, _reference_extract_num, text):
+            fail("extract_num = эталон", text)
+
+    for text in corpus["price_infos"]:
+        actual = text_parsing.price_per_m2_from_info(text)
+        # Прежняя версия умножала цену за гектар на 10000 и считала залог ценой за м²
+        unit = text_parsing.unit_factor(text, text_parsing.PRICE_UNITS)
+        if unit == 1 or (unit == 100 and "год" not in text):
+            if not _close(actual, _reference_price_per_m2_from_info(text)):
+                fail("price_per_m2_from_info = эталон", text, actual)
+
+    for _ in range(len(corpus["price_infos"])):
+        n = rng.randint(1, 10 ** 8)
+        expected = {
+            f"{_group(n)} ₽ за м²": n,
+            f"{_group(n)} ₽ за сотку": n / 100,
+            f"{_group(n)} ₽ за гектар": n / 10000,
+            f"{_group(n)} ₽ в год за м²": n / 12,
+            f"{_group(n)} ₽ в год за сотку": n / 1200,
+            f"Залог {_group(n)} ₽": None,
+        }
+        for text, value in expected.items():
+            if not _close(text_parsing.price_per_m2_from_info(text), value):
+                fail("price_per_m2_from_info: единицы и период", text, text_parsing.price_per_m2_from_info(text))
+
+    for facts in corpus["facts"]:
+        actual = text_parsing.price_per_m2_from_facts(facts)
+        if not _close(actual, _reference_price_per_m2_from_facts(facts)):
+            fail("price_per_m2_from_facts = эталон", facts, actual)
+
+    for value, text in corpus["areas"]:
+        if not _close(text_parsing.area_from_text(text), value):
+            fail("area_from_text: число → текст → число", text)
+
+    for value, text in corpus["plots"]:
+        if not _close(text_parsing.plot_area_m2(text), value):
+            fail("plot_area_m2: сотки и гектары в м²", text, text_parsing.plot_area_m2(text))
+
+    for entries, text, with_changes in corpus["tooltips"]:
+        expected = [{"date": date, "price": price} for date, price in entries]
+        actual = text_parsing.parse_price_history(text)
+        if actual != expected:
+            fail("parse_price_history: записи → tooltip → записи", text, actual)
+        # Прежний токенизатор пропускал токен после «₽» и терял запись,
+        # идущую сразу за предыдущей, — сравниваем только tooltip с подписью после каждой цены
+        if with_changes:
+            if actual != _reference_price_history(text):
+                fail("parse_price_history = эталон", text, actual)
+
+    for expected, text in corpus["dates"]:
+        actual = text_parsing.resolve_date(text, REFERENCE_TIME)
+        if actual != expected:
+            fail("resolve_date: время → строка → время", text, actual)
+
+    for text in corpus["date_texts"]:
+        actual = text_parsing.resolve_date(text, REFERENCE_TIME)
+        if actual is not None and actual > REFERENCE_TIME + timedelta(days=1):
+            fail("resolve_date: не позже времени разбора", text, actual)
+
+    return failures
+
+
+# ---------- Замер ----------
+
+def _time_per_call(func, args, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for arg in args:
+            try:
+                func(arg)
+            except ValueError:
+                pass
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / max(len(args), 1) * 1e6
+
+
+def benchmark(corpus, repeat=5):
+    """{функция: (мкс на вызов, мкс эталона)}"""
+    tooltips = [text for _, text, _ in corpus["tooltips"]]
+    fact_values = [value for facts in corpus["facts"] for _, value in facts]
+    cases = {
+        "parse_price": (text_parsing.parse_price, _reference_cian_parse_price, corpus["prices"]),
+        "extract_num": (text_parsing.extract_num, _reference_extract_num, fact_values),
+        "price_per_m2_from_info": (text_parsing.price_per_m2_from_info, _reference_price_per_m2_from_info,
+                                   corpus["price_infos"]),
+        "price_per_m2_from_facts": (text_parsing.price_per_m2_from_facts, _reference_price_per_m2_from_facts,
+                                    corpus["facts"]),
+        "parse_price_history": (text_parsing.parse_price_history, _reference_price_history, tooltips),
+        "area_from_text": (text_parsing.area_from_text, None, [text for _, text in corpus["areas"]]),
+        "plot_area_m2": (text_parsing.plot_area_m2, None, [text for _, text in corpus["plots"]]),
+        "resolve_date": (lambda text: text_parsing.resolve_date(text, REFERENCE_TIME), None, corpus["date_texts"]),
+    }
+    return {
+        name: (_time_per_call(func, args, repeat), _time_per_call(reference, args, repeat) if reference else None)
+        for name, (func, reference, args) in cases.items()
+    }
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Самопроверка и замер text_parsing")
+    arg_parser.add_argument("results", nargs="*", help="JSON с результатами парсинга — строки в корпус")
+    arg_parser.add_argument("--size", type=int, default=5000)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    arg_parser.add_argument("--seed", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    bench_corpus = build_corpus(args.size, args.seed)
+    add_results(bench_corpus, args.results)
+
+    property_failures = check_properties(bench_corpus)
+    if property_failures:
+        print(f"✗ Нарушено свойств: {len({f[0] for f in property_failures})}")
+        for name, arg, detail in property_failures:
+            print(f"   {name}: {arg!r} → {detail!r}")
+    else:
+        print("✓ Свойства выполнены")
+
+    for name, (current, reference) in benchmark(bench_corpus, args.repeat).items():
+        line = f"{name:<26} {current:8.2f} мкс"
+        if reference:
+            line += f"   эталон {reference:8.2f} мкс   ×{reference / current:.2f}"
+        print(line)
+
+    sys.exit(1 if property_failures else 0)
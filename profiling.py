@@ -0,0 +1,135 @@
+"""
+Profiling
+Профилирование разбора объявлений изнутри приложения (по запросу).
+
+В режиме диагностики каждый вызов parse_ad оборачивается в cProfile,
+а каждые memory_every объявлений снимается tracemalloc-снимок и
+сравнивается с предыдущим. Файлы складываются в Диагностика/Профили:
+    20250101_120000_123_avito_1234567.prof        — открывается snakeviz, pstats
+    20250101_120000_123_avito_1234567.alloc.txt   — рост памяти по строкам кода
+
+Включается на ходу: меню Диагностика в GUI или --profile у job_scheduler.py run.
+Выключенный профилировщик — одна проверка флага на объявление.
+
+Просмотр .prof без сторонних программ:
+    python profiling.py Диагностика/Профили/….prof [число строк]
+"""
+
+import cProfile
+import pstats
+import re
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+import applog
+from timing import DIAGNOSTICS_DIR
+
+log = applog.get_logger(__name__)
+
+PROFILES_DIR = DIAGNOSTICS_DIR / "Профили"
+
+
+def _ad_name(site, url):
+    match = re.search(r"(\d{5,})", url or "")
+    # Миллисекунды — чтобы повторный разбор той же ссылки не перезаписал файл
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+    return f"{stamp}_{site or 'ad'}_{match.group(1) if match else 'page'}"
+
+
+class Profiler:
+    """cProfile на каждое объявление и диффы tracemalloc между объявлениями"""
+
+    def __init__(self, directory=PROFILES_DIR, memory_every=1, top=25, frames=5):
+        self.directory = directory
+        self.memory_every = memory_every
+        self.top = top
+        self.frames = frames
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._previous_snapshot = None
+        self._ads = 0
+
+    def set_enabled(self, enabled):
+        """Включение/выключение на ходу; tracemalloc работает только пока включено"""
+        with self._lock:
+            self.enabled = enabled
+            if enabled and not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+                self._previous_snapshot = None
+            elif not enabled and tracemalloc.is_tracing():
+                tracemalloc.stop()
+                self._previous_snapshot = None
+
+    @contextmanager
+    def profile_ad(self, site, url):
+        if not self.enabled:
+            yield
+            return
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # В процессе уже работает другой профилировщик (второй воркер)
+            profile = None
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            self._write(site, url, profile)
+
+    def _write(self, site, url, profile):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        base = self.directory / _ad_name(site, url)
+        try:
+            if profile is not None:
+                profile.dump_stats(str(base) + ".prof")
+            self._write_allocations(base, url)
+        except OSError as e:
+            log.warning("  ⚠ Не удалось сохранить профиль: %s", e)
+
+    def _write_allocations(self, base, url):
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                return
+            self._ads += 1
+            if self._ads % self.memory_every:
+                return
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            ))
+            previous, self._previous_snapshot = self._previous_snapshot, snapshot
+
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [
+            f"{url}",
+            f"Память под отслеживанием: {current / 1e6:.1f} МБ, пик {peak / 1e6:.1f} МБ",
+            "",
+        ]
+        if previous is None:
+            lines.append(f"Первый снимок — крупнейшие размещения (топ {self.top}):")
+            stats = snapshot.statistics("lineno")[:self.top]
+        else:
+            lines.append(f"Прирост с предыдущего снимка (топ {self.top}):")
+            stats = snapshot.compare_to(previous, "lineno")[:self.top]
+        lines.extend(str(stat) for stat in stats)
+
+        with open(str(base) + ".alloc.txt", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+# Общий профилировщик процесса: воркеры оборачивают им parse_ad
+profiler = Profiler()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Использование: python profiling.py файл.prof [число строк]")
+        sys.exit(1)
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    pstats.Stats(sys.argv[1]).sort_stats("cumulative").print_stats(limit)
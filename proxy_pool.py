@@ -0,0 +1,190 @@
+"""
+Proxy Pool
+Пул прокси с оценкой здоровья и привязкой к браузеру.
+
+Каждый драйвер при запуске берёт из пула один прокси и работает через него
+до перезапуска. Парсеры сообщают пулу время загрузки, ошибки и капчи;
+прокси с низкой оценкой автоматически исключаются, а привязанный к ним
+драйвер перезапускается с другим прокси.
+
+Формат файла proxies.txt — один прокси на строку:
+    http://10.0.0.1:3128
+    socks5://127.0.0.1:1080
+Chrome не поддерживает логин/пароль в --proxy-server, поэтому нужны прокси
+с авторизацией по IP.
+
+Проверка пула (например, против локального прокси-заглушки):
+    python proxy_pool.py proxies.txt --check-url http://127.0.0.1:8000/
+"""
+
+import argparse
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+import applog
+from avito_parser import AvitoParser
+from cian_parser import CianParser
+from http_fetcher import page_state
+from listing_cache import detect_site
+
+log = applog.get_logger(__name__)
+
+# Адаптеры, чьи BLOCK_PHRASES распознают страницу блокировки при проверке прокси
+ADAPTERS = {"avito": AvitoParser, "cian": CianParser}
+
+
+class Proxy:
+    """Прокси и накопленная статистика по нему"""
+
+    # Сглаживание задержки (экспоненциальное скользящее среднее)
+    LATENCY_ALPHA = 0.3
+    # Задержка, при которой штраф за скорость максимален, сек
+    LATENCY_CEILING = 15.0
+    # Капча дороже ошибки: страница не разобрана и нужен пользователь.
+    # Прокси, на котором капчей больше половины запросов, опускается
+    # ниже min_score пула (0.5) и исключается
+    CAPTCHA_WEIGHT = 1.0
+
+    def __init__(self, url):
+        self.url = url
+        self.requests = 0
+        self.errors = 0
+        self.captchas = 0
+        self.latency = None
+        self.bound = 0
+        self.evicted = False
+
+    def record(self, latency=None, ok=True, captcha=False):
+        self.requests += 1
+        if not ok:
+            self.errors += 1
+        if captcha:
+            self.captchas += 1
+        if latency is not None:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += self.LATENCY_ALPHA * (latency - self.latency)
+
+    @property
+    def score(self):
+        """Оценка здоровья 0..1 (1 — идеальный прокси)"""
+        # +1 в знаменателе смягчает оценку, пока запросов мало
+        error_rate = self.errors / (self.requests + 1)
+        captcha_rate = self.captchas / (self.requests + 1)
+        latency_penalty = min((self.latency or 0) / self.LATENCY_CEILING, 1.0)
+        return max(0.0, 1.0 - 0.8 * error_rate - self.CAPTCHA_WEIGHT * captcha_rate - 0.2 * latency_penalty)
+
+    def __repr__(self):
+        return f"Proxy({self.url!r}, score={self.score:.2f}, requests={self.requests})"
+
+
+class ProxyPool:
+    """Потокобезопасный пул прокси с выбором по оценке"""
+
+    def __init__(self, proxy_urls, min_score=0.5, min_samples=5):
+        self.proxies = [Proxy(url) for url in dict.fromkeys(proxy_urls)]
+        self.min_score = min_score
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path="proxies.txt", **kwargs):
+        """Загрузка пула из файла. Возвращает None, если файла нет или он пуст"""
+        path = Path(path)
+        if not path.exists():
+            return None
+
+        urls = []
+        for line in path.read_text(encoding="utf-8").splitlines():
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            if "://" not in line:
+                line = "http://" + line
+            urls.append(line)
+
+        return cls(urls, **kwargs) if urls else None
+
+    @property
+    def alive(self):
+        return [p for p in self.proxies if not p.evicted]
+
+    def acquire(self):
+        """Лучший живой прокси; при равной оценке — наименее загруженный"""
+        with self._lock:
+            candidates = self.alive
+            if not candidates:
+                return None
+            proxy = max(candidates, key=lambda p: (round(p.score, 2), -p.bound))
+            proxy.bound += 1
+            return proxy
+
+    def release(self, proxy):
+        if proxy is None:
+            return
+        with self._lock:
+            proxy.bound = max(0, proxy.bound - 1)
+
+    def report(self, proxy, latency=None, ok=True, captcha=False):
+        """Учёт результата запроса. Возвращает False, если прокси исключён"""
+        if proxy is None:
+            return True
+        with self._lock:
+            proxy.record(latency=latency, ok=ok, captcha=captcha)
+            if proxy.requests >= self.min_samples and proxy.score < self.min_score:
+                if not proxy.evicted:
+                    log.warning("  ✗ Прокси исключён из пула: %s", proxy)
+                    proxy.evicted = True
+                    if not self.alive:
+                        log.warning("⚠ В пуле не осталось живых прокси, запросы пойдут напрямую")
+            return not proxy.evicted
+
+    def check(self, proxy, url, timeout=10):
+        """Пробный запрос через прокси, результат (включая страницу блокировки) учитывается в оценке"""
+        started = time.monotonic()
+        captcha = False
+        try:
+            resp = requests.get(
+                url,
+                proxies={"http": proxy.url, "https": proxy.url},
+                timeout=timeout
+            )
+            ok = resp.status_code < 500
+            # Адрес не Avito/Циан (например, заглушка) — подходят фразы любого адаптера
+            site = detect_site(url)
+            adapters = [ADAPTERS[site]] if site in ADAPTERS else ADAPTERS.values()
+            captcha = resp.status_code == 429 or (
+                ok and any(page_state(resp.text, adapter) == "blocked" for adapter in adapters)
+            )
+        except requests.RequestException:
+            ok = False
+        return self.report(proxy, latency=time.monotonic() - started, ok=ok, captcha=captcha)
+
+    def check_all(self, url, timeout=10):
+        for proxy in list(self.alive):
+            self.check(proxy, url, timeout=timeout)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Проверка пула прокси")
+    arg_parser.add_argument("path", nargs="?", default="proxies.txt")
+    arg_parser.add_argument("--check-url", default="https://www.avito.ru/")
+    arg_parser.add_argument("--rounds", type=int, default=5)
+    args = arg_parser.parse_args()
+
+    pool = ProxyPool.from_file(args.path)
+    if pool is None:
+        raise SystemExit(f"Прокси не найдены в {args.path}")
+
+    for _ in range(args.rounds):
+        pool.check_all(args.check_url)
+
+    for proxy in sorted(pool.proxies, key=lambda p: p.score, reverse=True):
+        latency = f"{proxy.latency:.2f} с" if proxy.latency is not None else "—"
+        status = "исключён" if proxy.evicted else "активен"
+        print(f"{proxy.url:40} оценка {proxy.score:.2f}  задержка {latency}  ошибок {proxy.errors}  "
+              f"капч {proxy.captchas}  {status}")
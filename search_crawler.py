@@ -0,0 +1,181 @@
+"""
+Search Crawler
+Сбор ссылок на объявления из поисковой выдачи Avito и Циан.
+
+Обходит страницы выдачи (параметр p=N), за один вызов JavaScript на страницу
+забирает ссылки и данные с карточек (цена, площадь, адрес) и отбрасывает
+объявления, которые уже есть в кэше. Браузер берётся у парсера сайта,
+поэтому профиль, прокси и капча-пауза работают так же, как при парсинге.
+"""
+
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from selenium.webdriver.common.by import By
+
+import applog
+import text_parsing
+from listing_cache import detect_site, listing_key
+
+log = applog.get_logger(__name__)
+
+# Карточки выдачи: ссылка, заголовок, цена и адрес одной строкой на карточку
+CARDS_JS = {
+    "avito": """
+        var result = [];
+        document.querySelectorAll("[data-marker='item']").forEach(function(card) {
+            var link = card.querySelector("a[data-marker='item-title'], a[itemprop='url']");
+            if (!link) return;
+            var price = card.querySelector("[itemprop='price']");
+            var priceText = card.querySelector("[data-marker='item-price']");
+            var address = card.querySelector("[data-marker='item-address'], [class*='geo-root']");
+            result.push({
+                url: link.href,
+                title: (link.getAttribute('title') || link.innerText || '').trim(),
+                price: price ? price.getAttribute('content') : null,
+                price_text: priceText ? priceText.innerText : '',
+                address: address ? address.innerText : ''
+            });
+        });
+        return result;
+    """,
+    "cian": """
+        var result = [];
+        document.querySelectorAll("article[data-name='CardComponent']").forEach(function(card) {
+            var link = card.querySelector("a[href*='/sale/'], a[href*='/rent/']");
+            if (!link) return;
+            var title = card.querySelector("[data-mark='OfferTitle']");
+            var subtitle = card.querySelector("[data-mark='OfferSubtitle']");
+            var price = card.querySelector("[data-mark='MainPrice']");
+            var pricePerM2 = card.querySelector("[data-mark='PriceInfo']");
+            var geo = card.querySelectorAll("[data-name='GeoLabel']");
+            result.push({
+                url: link.href,
+                title: ((title ? title.innerText : '') + ' ' + (subtitle ? subtitle.innerText : '')).trim(),
+                price: null,
+                price_text: price ? price.innerText : '',
+                price_per_m2_text: pricePerM2 ? pricePerM2.innerText : '',
+                address: Array.prototype.map.call(geo, function(g) { return g.innerText; }).join(', ')
+            });
+        });
+        return result;
+    """,
+}
+
+
+def page_url(search_url, page):
+    """Ссылка на страницу выдачи с номером page"""
+    parts = urlsplit(search_url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != "p"]
+    if page > 1:
+        query.append(("p", str(page)))
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+
+def normalize_card(raw):
+    """
+    Карточка выдачи → dict с теми же ключами, что у результата parse_ad.
+    Цена, площадь и цена за м² разбираются теми же функциями text_parsing,
+    что и при полном парсинге: годовая цена и цена за м² приводятся к месячной.
+    """
+    url = raw["url"].split("?")[0]
+    title = (raw.get("title") or "").replace("\xa0", " ").strip()
+
+    price, price_type = text_parsing.parse_price(raw.get("price_text"))
+    if price is None:
+        price = text_parsing.first_number(raw.get("price"))
+        price_type = "месяц" if price is not None else None
+    area_m2 = text_parsing.area_from_text(title)
+
+    price_per_m2 = text_parsing.price_per_m2_from_info(raw.get("price_per_m2_text"))
+    # В карточке указана только цена за м² — как в _fill_derived_fields парсера Avito
+    if price_type == "м²/месяц" and price:
+        price_per_m2 = price_per_m2 or int(price)
+        price = round(price * area_m2, 1) if area_m2 else None
+    if not price_per_m2 and price and area_m2:
+        price_per_m2 = int(price / area_m2)
+
+    return {
+        "id": listing_key(url).split(":")[-1],
+        "url": url,
+        "title": title,
+        "price": price,
+        "price_type": price_type,
+        "area_m2": area_m2,
+        "price_per_m2": price_per_m2,
+        "address": (raw.get("address") or "").replace("\n", " ").strip(),
+    }
+
+
+class SearchCrawler:
+    """Обход выдачи через драйвер парсера"""
+
+    def __init__(self, parser, cache=None, max_pages=20, page_delay=2.0, budget=None):
+        self.parser = parser
+        self.cache = cache
+        self.max_pages = max_pages
+        self.page_delay = page_delay
+        # RateBudget планировщика: страница выдачи списывает бюджет сайта
+        self.budget = budget
+        self.budget_exhausted = False
+        self.skipped_known = 0
+
+    def _wait_if_blocked(self):
+        """Страница блокировки по фразам адаптера — пауза парсера до решения капчи"""
+        page_text = self.parser.driver.find_element(By.TAG_NAME, "body").text.lower()
+        if any(phrase in page_text for phrase in self.parser.BLOCK_PHRASES):
+            self.parser._wait_for_user_action(self.parser.on_captcha)
+
+    def crawl(self, search_url, on_page=None):
+        """
+        Обходит выдачу и возвращает список карточек новых объявлений.
+        on_page(page, found_total) вызывается после каждой страницы.
+        """
+        site = detect_site(search_url)
+        if site not in CARDS_JS:
+            raise ValueError(f"Неизвестный сайт в ссылке поиска: {search_url}")
+
+        if not self.parser.driver:
+            self.parser._setup_driver()
+        driver = self.parser.driver
+
+        cards = []
+        seen = set()
+        self.skipped_known = 0
+        self.budget_exhausted = False
+
+        for page in range(1, self.max_pages + 1):
+            if self.budget is not None and not self.budget.spend(site):
+                self.budget_exhausted = True
+                log.info("  ⏸ Бюджет %s исчерпан, обход выдачи остановлен на странице %s", site, page)
+                break
+            driver.get(page_url(search_url, page))
+            self.parser.watchdog.page_loaded()
+            time.sleep(self.page_delay)
+            self._wait_if_blocked()
+
+            raw_cards = driver.execute_script(CARDS_JS[site]) or []
+
+            new_on_page = 0
+            for raw in raw_cards:
+                card = normalize_card(raw)
+                key = listing_key(card["url"])
+                if key in seen:
+                    continue
+                seen.add(key)
+                new_on_page += 1
+
+                if self.cache is not None and card["url"] in self.cache:
+                    self.skipped_known += 1
+                    continue
+                cards.append(card)
+
+            log.info("  ✓ Страница %s: карточек %s, новых %s", page, len(raw_cards), new_on_page)
+            if on_page:
+                on_page(page, len(cards))
+
+            # Пустая страница или повтор предыдущей — выдача закончилась
+            if new_on_page == 0:
+                break
+
+        return cards
@@ -0,0 +1,140 @@
+"""
+Selector Stats
+Статистика попаданий CSS-селекторов и адаптивный порядок их перебора.
+
+_extract_text перебирает список селекторов по порядку, и каждый промах —
+это лишний вызов WebDriver. Реестр запоминает для каждого поля, какой
+селектор нашёл текст, а какие промахнулись, и в следующий раз первым
+пробует самый успешный. Статистика хранится рядом с профилем браузера:
+    Профили/avito_selectors.json
+
+Переставляются только селекторы одного уровня точности: широкие запасные
+(«h1», «[class*='price']») всегда идут после точных, иначе широкий,
+заняв первое место, находил бы что угодно, а точные больше не проверялись.
+
+Селектор, который раньше находил поле, а теперь промахивается подряд
+stale_after раз, помечается устаревшим — это ранний признак смены вёрстки.
+
+Отчёт: python selector_stats.py avito
+"""
+
+import json
+import re
+import sys
+import threading
+from datetime import datetime
+
+import applog
+import browser_profile
+
+log = applog.get_logger(__name__)
+
+# Только имя тега: «h1», «div span»
+BARE_TAGS_RE = re.compile(r"^[a-z][a-z0-9]*(?:\s+[a-z][a-z0-9]*)*$")
+
+
+def specificity(selector):
+    """1 — точный селектор, 0 — широкий запасной (подстрока в атрибуте или только теги)"""
+    selector = selector.strip()
+    if "*=" in selector or BARE_TAGS_RE.match(selector):
+        return 0
+    return 1
+
+
+def stats_path(site):
+    browser_profile.PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+    return browser_profile.PROFILES_DIR / f"{site}_selectors.json"
+
+
+class SelectorRegistry:
+    """Попадания и промахи селекторов по полям одного сайта"""
+
+    def __init__(self, site, stale_after=20, save_every=50):
+        self.site = site
+        self.path = stats_path(site)
+        self.stale_after = stale_after
+        self.save_every = save_every
+        self.fields = {}
+        self._unsaved = 0
+        self._lock = threading.Lock()
+
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.fields = json.load(f)
+            except (OSError, ValueError) as e:
+                log.warning("  ℹ Статистика селекторов повреждена, начинаем заново: %s", e)
+
+    def _stat(self, field, selector):
+        return self.fields.setdefault(field, {}).setdefault(
+            selector, {"hits": 0, "misses": 0, "misses_in_row": 0, "last_hit": None}
+        )
+
+    def _score(self, field, selector):
+        stat = self.fields.get(field, {}).get(selector)
+        if not stat:
+            return 0.5
+        # Сглаженная доля попаданий: новый селектор — 0.5
+        return (stat["hits"] + 1) / (stat["hits"] + stat["misses"] + 2)
+
+    def order(self, field, selectors):
+        """
+        Сначала точные селекторы, затем широкие; внутри уровня — по убыванию доли
+        попаданий, при равенстве — в исходном порядке
+        """
+        with self._lock:
+            scores = {selector: self._score(field, selector) for selector in selectors}
+        return sorted(selectors, key=lambda selector: (-specificity(selector), -scores[selector]))
+
+    def record(self, field, missed, hit=None):
+        """missed — селекторы, перебранные до найденного; hit — сработавший или None"""
+        with self._lock:
+            for selector in missed:
+                stat = self._stat(field, selector)
+                stat["misses"] += 1
+                stat["misses_in_row"] += 1
+                if stat["hits"] and stat["misses_in_row"] == self.stale_after:
+                    log.warning("  ⚠ Селектор %s/%s перестал находить элементы: %s", self.site, field, selector)
+
+            if hit is not None:
+                stat = self._stat(field, hit)
+                stat["hits"] += 1
+                stat["misses_in_row"] = 0
+                stat["last_hit"] = datetime.now().isoformat()
+
+            self._unsaved += 1
+            need_save = self._unsaved >= self.save_every
+
+        if need_save:
+            self.save()
+
+    def stale(self):
+        """[(поле, селектор, промахов подряд)] для селекторов, переставших находить"""
+        with self._lock:
+            return [
+                (field, selector, stat["misses_in_row"])
+                for field, selectors in self.fields.items()
+                for selector, stat in selectors.items()
+                if stat["hits"] and stat["misses_in_row"] >= self.stale_after
+            ]
+
+    def save(self):
+        with self._lock:
+            self._unsaved = 0
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.fields, f, ensure_ascii=False, indent=2)
+            tmp_path.replace(self.path)
+
+
+if __name__ == "__main__":
+    for site in sys.argv[1:] or ["avito", "cian"]:
+        registry = SelectorRegistry(site)
+        print(f"\n{site}:")
+        for field, selectors in registry.fields.items():
+            print(f"  {field}:")
+            for selector in registry.order(field, list(selectors)):
+                stat = selectors[selector]
+                print(f"    {stat['hits']:>5} / {stat['misses']:<5} {selector}")
+        for field, selector, misses in registry.stale():
+            print(f"  ⚠ устарел {field}: {selector} (промахов подряд: {misses})")
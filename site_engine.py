@@ -0,0 +1,620 @@
+"""
+Site Engine
+Общий движок браузерных парсеров. AvitoParser и CianParser — адаптеры:
+они объявляют селекторы полей, признаки готовности страницы, фразы
+блокировки и постобработку полей, а запуск браузера, извлечение текста,
+загрузка фото, обрезка скриншотов, cookies, прокси и перезапуск драйвера
+реализованы здесь один раз.
+
+Объявления адаптера (атрибуты класса):
+    SITE              — "avito" / "cian" (профиль, cookies, статистика селекторов)
+    BASE_URL          — главная страница для восстановления cookies
+    FIELDS            — поле → список CSS-селекторов в порядке приоритета
+    POSTPROCESS       — поле → имя метода, который чистит значение
+    PARAM_SELECTORS   — селекторы пунктов списка параметров
+    CONTENT_SELECTOR  — признак, что страница объявления загрузилась
+    NOT_FOUND_PHRASES / BLOCK_PHRASES — состояние страницы по тексту
+    LOAD_DELAY        — пауза после загрузки, сек
+    CROP_MIN_SIZE     — меньший блок считается ошибкой, сохраняется весь скриншот
+
+Несколько полей извлекаются одним вызовом JavaScript (_extract_fields),
+а не find_element на каждый селектор.
+
+create_driver() запускает браузер с теми же настройками без привязки к сайту
+(без cookies и профиля) — для рендера отложенных скриншотов.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import aiohttp
+from PIL import Image
+from selenium import webdriver
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.common.by import By
+from webdriver_manager.chrome import ChromeDriverManager
+
+import applog
+import browser_profile
+import deferred_screens
+import metrics
+import page_metrics
+import text_parsing
+from browser_watchdog import DriverWatchdog
+from selector_stats import SelectorRegistry
+from timing import span, tracer
+
+log = applog.get_logger(__name__)
+
+
+def resource_path(relative_path):
+    if hasattr(sys, "_MEIPASS"):
+        return os.path.join(sys._MEIPASS, relative_path)
+    return os.path.abspath(relative_path)
+
+
+# Первый непустой innerText по каждому списку селекторов за один вызов
+FIELDS_JS = """
+    var specs = arguments[0];
+    var result = {};
+    for (var field in specs) {
+        result[field] = {text: "", index: -1};
+        var selectors = specs[field];
+        for (var i = 0; i < selectors.length; i++) {
+            var el = document.querySelector(selectors[i]);
+            var text = el ? (el.innerText || "").trim() : "";
+            if (text) {
+                result[field] = {text: text, index: i};
+                break;
+            }
+        }
+    }
+    return result;
+"""
+
+RECT_JS = """
+    var r = arguments[0].getBoundingClientRect();
+    return {left: r.left, top: r.top, width: r.width, height: r.height,
+            dpr: window.devicePixelRatio || 1};
+"""
+
+
+def create_driver(headless=False, arguments=()):
+    """
+    Браузер с общими настройками и антидетект-скриптами: Yandex, при неудаче — Chrome.
+    arguments — дополнительные аргументы командной строки (прокси, профиль).
+    Возвращает (driver, "yandex" | "chrome"); cookies и сайт не трогает.
+    """
+    options = Options()
+
+    if headless:
+        options.add_argument("--headless=new")
+
+    # Общие параметры для обоих браузеров
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_argument("--disable-infobars")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument("--start-maximized")
+    options.add_argument("--lang=ru-RU")
+    options.add_argument('--disable-notifications')
+    options.add_argument('--disable-extensions')
+    options.add_argument(
+        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option("useAutomationExtension", False)
+    options.page_load_strategy = "eager"
+    for argument in arguments:
+        options.add_argument(argument)
+
+
+    driver = None
+    browser_type = None
+
+    # Попытка 1: Yandex Browser с yandexdriver.exe
+    yandex_driver_path = resource_path("yandexdriver.exe")
+
+    if os.path.exists(yandex_driver_path):
+        try:
+            log.info("🔍 Найден yandexdriver.exe, запускаю Yandex Browser...")
+            service = Service(yandex_driver_path)
+            driver = webdriver.Chrome(service=service, options=options)
+            browser_type = "yandex"
+            log.info("✓ Yandex Browser успешно запущен")
+        except Exception as e:
+            log.warning("✗ Ошибка запуска Yandex Browser: %s", e)
+            log.info("↻ Переключаюсь на Chrome...")
+            driver = None
+    else:
+        log.debug("ℹ yandexdriver.exe не найден по пути: %s", yandex_driver_path)
+        log.info("↻ Переключаюсь на Chrome...")
+
+    # Попытка 2: Chrome (если Yandex не запустился)
+    if driver is None:
+        try:
+            log.info("🔍 Запускаю Chrome...")
+            service = Service(ChromeDriverManager().install())
+            driver = webdriver.Chrome(service=service, options=options)
+            browser_type = "chrome"
+            log.info("✓ Chrome успешно запущен")
+        except Exception as e:
+            raise Exception(f"Не удалось запустить ни Yandex, ни Chrome: {e}")
+
+    # Применяем антидетект скрипты
+    driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
+        "source": """
+            Object.defineProperty(navigator, 'webdriver', {get: () => undefined});
+            Object.defineProperty(navigator, 'plugins', {get: () => [1, 2, 3, 4, 5]});
+            Object.defineProperty(navigator, 'languages', {get: () => ['ru-RU', 'ru', 'en-US', 'en']});
+        """
+    })
+
+    return driver, browser_type
+
+
+class SiteParser:
+    """Базовый браузерный парсер; сайт задаётся атрибутами класса-адаптера"""
+
+    SITE = None
+    BASE_URL = None
+    FIELDS = {}
+    POSTPROCESS = {}
+    PARAM_SELECTORS = []
+    CONTENT_SELECTOR = "h1"
+    NOT_FOUND_PHRASES = []
+    BLOCK_PHRASES = []
+    LOAD_DELAY = 0
+    CROP_MIN_SIZE = 0
+
+    def __init__(self, headless=False, download_screens=True, download_photos=False, images_dir="Скриншоты",
+                 slow_mode=False, on_captcha=None, persistent_profile=True, proxy_pool=None, snapshot_archive=None):
+        self.download_screens = download_screens
+        self.download_photos = download_photos
+        self.images_dir = Path(images_dir)
+        self.driver = None
+        self.headless = headless
+        self.slow_mode = slow_mode
+        self.slow_delay = 0.4
+        self.on_captcha = on_captcha
+        self._wait_for_user = False
+        self.browser_type = None
+        self.watchdog = DriverWatchdog()
+        self.profile_dir = browser_profile.profile_dir(self.SITE) if persistent_profile else None
+        self.cookie_jar = browser_profile.cookie_jar_path(self.SITE)
+        self.proxy_pool = proxy_pool
+        self.proxy = None
+        self.snapshot_archive = snapshot_archive
+        self.defer_screenshots = False
+        self._deferred = None
+        self.selectors = SelectorRegistry(self.SITE)
+        # Базовые метрики DevTools и время загрузки текущей страницы — для page_metrics
+        self._page_baseline = {}
+        self._page_timing = {}
+
+        if download_screens:
+            self.images_dir.mkdir(parents=True, exist_ok=True)
+
+    def _setup_driver(self):
+        """Настройка драйвера с fallback: Yandex → Chrome"""
+        arguments = []
+
+        # Драйвер привязан к одному прокси из пула до перезапуска
+        if self.proxy_pool:
+            self.proxy = self.proxy_pool.acquire()
+            if self.proxy:
+                arguments.append(f"--proxy-server={self.proxy.url}")
+                log.info("ℹ Прокси: %s", self.proxy.url)
+            else:
+                log.warning("⚠ В пуле нет живых прокси, работаем напрямую")
+
+        # Постоянный профиль: авторизация, кэш и service workers переживают перезапуск
+        if self.profile_dir:
+            arguments.append(f"--user-data-dir={self.profile_dir}")
+
+        self.driver, self.browser_type = create_driver(self.headless, arguments)
+
+        # Метрики DevTools для диагностики медленных страниц
+        page_metrics.enable(self.driver)
+
+        # Без профиля сессию восстанавливаем из сохранённых cookies
+        if not self.profile_dir:
+            self._restore_cookies()
+
+        return self.driver
+
+
+    # ---------- Загрузка страницы ----------
+
+    def _open_ad(self, url):
+        """
+        Загружает страницу объявления и ждёт пользователя при капче.
+        Возвращает {'url', 'page_not_found'} для удалённых объявлений, иначе None.
+        """
+        tracer.set_ad(self.SITE, url)
+
+        if not self.driver:
+            with span("browser_start"):
+                self._setup_driver()
+
+        self._page_baseline = page_metrics.cdp_metrics(self.driver)
+        load_started = time.monotonic()
+        try:
+            with span("navigation"):
+                self.driver.get(url)
+        except TimeoutException:
+            self._report_proxy(ok=False)
+            metrics.RETRIES.inc(site=self.SITE, stage="page_timeout")
+            raise
+        self.watchdog.page_loaded()
+        load_time = time.monotonic() - load_started
+        metrics.PAGE_LOAD_SECONDS.observe(load_time, site=self.SITE)
+        self._page_timing = {"started": load_started, "page_load": load_time, "captcha": 0.0}
+        if self.LOAD_DELAY:
+            with span("load_delay"):
+                time.sleep(self.LOAD_DELAY)
+
+        page_text = self.driver.find_element(By.TAG_NAME, "body").text.lower()
+
+        if any(phrase in page_text for phrase in self.NOT_FOUND_PHRASES):
+            return {
+                "url": url,
+                "page_not_found": True
+            }
+
+        is_blocked = any(phrase in page_text for phrase in self.BLOCK_PHRASES)
+
+        # Также проверяем отсутствие основного контента
+        try:
+            self.driver.find_element(By.CSS_SELECTOR, self.CONTENT_SELECTOR)
+            has_content = True
+        except NoSuchElementException:
+            has_content = False
+
+        self._report_proxy(load_time, captcha=is_blocked)
+
+        if is_blocked or not has_content:
+            metrics.CAPTCHAS.inc(site=self.SITE, kind="blocked" if is_blocked else "no_content")
+            wait_started = time.monotonic()
+            with span("captcha_wait"):
+                self._wait_for_user_action(self.on_captcha)
+            self._page_timing["captcha"] = time.monotonic() - wait_started
+            metrics.CAPTCHA_WAIT_SECONDS.observe(self._page_timing["captcha"], site=self.SITE)
+
+        return None
+
+    def _collect_page_metrics(self):
+        """Метрики DevTools, Navigation Timing и наши ожидания для открытой страницы (после готовности)"""
+        result = page_metrics.collect(self.driver, baseline=self._page_baseline)
+        timing = self._page_timing
+        if timing:
+            result["waits"] = {
+                "page_load": round(timing["page_load"], 3),
+                "captcha": round(timing["captcha"], 3),
+                # Без ожидания пользователя при капче
+                "until_ready": round(time.monotonic() - timing["started"] - timing["captcha"], 3),
+            }
+        return result
+
+    def _wait_for_user_action(self, callback):
+        """Пауза до continue_after_captcha (капча, авторизация)"""
+        self._wait_for_user = True
+
+        if callback:
+            callback()
+
+        while self._wait_for_user:
+            time.sleep(0.3)
+
+    def continue_after_captcha(self):
+        self._wait_for_user = False
+
+    def _slow_pause(self, message=""):
+        if self.slow_mode:
+            if message:
+                log.debug("  [SLOW MODE] %s", message)
+            time.sleep(self.slow_delay)
+
+    # ---------- Извлечение полей ----------
+
+    def _extract_text(self, selectors, default="", field=None):
+        """Извлечение текста по списку селекторов"""
+        # Самые успешные селекторы поля пробуются первыми
+        field = field or selectors[0]
+        missed = []
+        for selector in self.selectors.order(field, selectors):
+            try:
+                el = self.driver.find_element(By.CSS_SELECTOR, selector)
+                text = el.text.strip()
+                if text:
+                    self.selectors.record(field, missed, selector)
+                    return text
+            except NoSuchElementException:
+                pass
+            missed.append(selector)
+        self.selectors.record(field, missed)
+        return default
+
+    def _extract_fields(self, *fields):
+        """Поля из FIELDS одним вызовом JavaScript, с постобработкой из POSTPROCESS"""
+        specs = {field: self.selectors.order(field, self.FIELDS[field]) for field in fields}
+        with span("fields", fields=",".join(fields)):
+            found = self.driver.execute_script(FIELDS_JS, specs)
+
+        values = {}
+        for field, selectors in specs.items():
+            index = found[field]["index"]
+            if index >= 0:
+                self.selectors.record(field, selectors[:index], selectors[index])
+            else:
+                self.selectors.record(field, selectors)
+
+            value = found[field]["text"]
+            if field in self.POSTPROCESS:
+                value = getattr(self, self.POSTPROCESS[field])(value)
+            values[field] = value
+        return values
+
+    def _parse_price(self, price_text):
+        """Парсинг цены из текста; годовая цена приводится к месячной"""
+        return text_parsing.parse_price(price_text)
+
+    def _extract_params(self):
+        """Извлечение параметров объявления: 'Ключ: значение' или 'Ключ\\nзначение'"""
+        params = {}
+
+        with span("params"):
+            self._collect_params(params)
+        return params
+
+    def _collect_params(self, params):
+        for selector in self.PARAM_SELECTORS:
+            try:
+                param_items = self.driver.find_elements(By.CSS_SELECTOR, selector)
+
+                for item in param_items:
+                    text = item.text.strip()
+                    if ':' in text:
+                        key, value = text.split(':', 1)
+                        params[key.strip()] = value.strip()
+                    elif '\n' in text:
+                        parts = text.split('\n')
+                        if len(parts) >= 2:
+                            params[parts[0].strip()] = parts[1].strip()
+
+                if params:
+                    break
+            except Exception as e:
+                log.warning("  ℹ Не удалось извлечь параметры: %s", e)
+
+    def _clean_address(self, address):
+        return address
+
+    def _fill_derived_fields(self, data):
+        pass
+
+    # ---------- Скриншоты ----------
+
+    def _ad_folder(self, address_ad):
+        ad_folder = self.images_dir / str(address_ad)
+        ad_folder.mkdir(parents=True, exist_ok=True)
+        return ad_folder
+
+    def _screenshot_region(self, ad_folder, name, element=None, tmp_name="_tmp_full.png"):
+        """
+        Скриншот окна, обрезанный по блоку element (или целиком, если блока нет
+        либо он меньше CROP_MIN_SIZE). Возвращает путь к файлу.
+        """
+        full_path = ad_folder / tmp_name
+        with span("screenshot", file=name):
+            self.driver.save_screenshot(str(full_path))
+
+        img = Image.open(full_path)
+        img_w, img_h = img.size
+        final_path = ad_folder / name
+
+        box = None
+        if element is not None:
+            rect = self.driver.execute_script(RECT_JS, element)
+            dpr = rect["dpr"]
+
+            # 🔧 защита от чёрных прямоугольников: не выходим за границы скриншота
+            left = max(0, int(rect["left"] * dpr))
+            top = max(0, int(rect["top"] * dpr))
+            right = min(img_w, int((rect["left"] + rect["width"]) * dpr))
+            bottom = min(img_h, int((rect["top"] + rect["height"]) * dpr))
+
+            too_small = rect["width"] * dpr < self.CROP_MIN_SIZE or rect["height"] * dpr < self.CROP_MIN_SIZE
+            if right > left and bottom > top and not too_small:
+                box = (left, top, right, bottom)
+            else:
+                log.warning("  ⚠ Некорректные размеры контейнера, используем весь скриншот")
+
+        if box:
+            img.crop(box).save(final_path)
+        else:
+            img.save(final_path)
+
+        img.close()
+        full_path.unlink(missing_ok=True)
+        return str(final_path)
+
+    def _capture_for_render(self, address_ad):
+        """Отложенный режим: снимок страницы и геометрия блоков вместо скриншотов"""
+        url = self.driver.current_url.split("?")[0]
+        with span("snapshot"):
+            snapshot = self.snapshot_archive.capture(self.driver, url)
+        if not snapshot:
+            return None
+
+        return {
+            "deferred": True,
+            "snapshot": snapshot,
+            "folder": str(address_ad),
+            "geometry": deferred_screens.record_geometry(self.driver, self.SITE),
+        }
+
+    # ---------- Фото ----------
+
+    @staticmethod
+    async def _download_image(session, url, path):
+        try:
+            async with session.get(url) as resp:
+                if resp.status == 200:
+                    data = await resp.read()
+                    with open(path, 'wb') as f:
+                        f.write(data)
+                    return True
+        except Exception as e:
+            log.warning("  ✗ Ошибка загрузки %s: %s", url, e)
+        return False
+
+    async def _download_all_images(self, image_urls, ad_folder):
+        downloaded = set()
+        async with aiohttp.ClientSession() as session:
+            tasks = []
+            for i, url in enumerate(image_urls):
+                path = ad_folder / f"фото_{i + 1:03d}.jpg"
+                tasks.append(self._download_image(session, url, path))
+            results = await asyncio.gather(*tasks)
+            for url, ok in zip(image_urls, results):
+                if ok:
+                    downloaded.add(url)
+        log.debug("  ✓ Загружено: %s/%s", len(downloaded), len(image_urls))
+        return downloaded
+
+    def _collect_image_urls(self):
+        """Ссылки на фото галереи; реализуется адаптером"""
+        return []
+
+    def _collect_and_download_images(self, address_ad):
+        """Собирает ссылки галереи и скачивает фото асинхронно"""
+        ad_folder = self._ad_folder(address_ad)
+
+        with span("gallery"):
+            image_urls = self._collect_image_urls()
+        log.debug("  ✓ Найдено изображений: %s", len(image_urls))
+
+        if not image_urls:
+            return set()
+
+        with span("downloads", images=len(image_urls)):
+            return asyncio.run(self._download_all_images(image_urls, ad_folder))
+
+    # ---------- Пакетный парсинг ----------
+
+    def parse_ad(self, url):
+        raise NotImplementedError
+
+    def parse_multiple(self, urls):
+        """Парсинг нескольких объявлений"""
+        results = []
+        for i, url in enumerate(urls, 1):
+            log.info("[%s/%s] %s", i, len(urls), url)
+            try:
+                data = self.parse_ad(url)
+                results.append(data)
+                if i < len(urls):
+                    delay = 3 + (i % 3)
+                    log.debug("  Пауза %s сек...", delay)
+                    time.sleep(delay)
+            except Exception as e:
+                log.error("  ✗ Ошибка: %s", e)
+                results.append({"url": url, "error": str(e)})
+        return results
+
+    def save_results(self, results, filename=None):
+        """Сохранение результатов в JSON"""
+        filename = filename or f"{self.SITE}_results.json"
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        log.info("Результаты сохранены в %s", filename)
+
+    # ---------- Сессия, прокси, перезапуск ----------
+
+    def _save_cookies(self):
+        if self.driver:
+            browser_profile.save_cookies(self.driver, self.cookie_jar)
+
+    def _restore_cookies(self):
+        try:
+            count = browser_profile.load_cookies(self.driver, self.cookie_jar, self.BASE_URL)
+            if count:
+                log.debug("  ✓ Восстановлено cookies: %s", count)
+        except Exception as e:
+            log.debug("  ℹ Не удалось восстановить cookies: %s", e)
+
+    def _close_driver(self):
+        """Закрывает браузер (если он есть) и возвращает прокси в пул"""
+        if self.driver:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+            self.driver = None
+        self._release_proxy()
+
+    def recycle_driver(self, attempts=2):
+        """
+        Перезапуск браузера с сохранением cookies (сбрасывает накопленную память).
+        Если браузер не поднялся за attempts попыток — RuntimeError; парсер при этом
+        остаётся без драйвера, и _open_ad запустит браузер заново на следующем объявлении.
+        """
+        if self.driver:
+            self._save_cookies()
+        self._close_driver()
+
+        for attempt in range(1, attempts + 1):
+            try:
+                with span("browser_restart"):
+                    self._setup_driver()
+                break
+            except Exception as e:
+                log.error("  ✗ Перезапуск браузера не удался (попытка %s из %s): %s", attempt, attempts, e)
+                # Полузапущенный драйвер и взятый прокси не оставляем
+                self._close_driver()
+                if attempt == attempts:
+                    raise RuntimeError(f"Не удалось перезапустить браузер: {e}") from e
+        self.watchdog.reset()
+        self.watchdog.restarts += 1
+        metrics.BROWSER_RESTARTS.inc(site=self.SITE)
+
+        # Сессионные cookies не сохраняются в профиле — возвращаем их из файла
+        if self.profile_dir:
+            self._restore_cookies()
+        log.info("  ✓ Браузер перезапущен")
+
+    def _report_proxy(self, latency=None, ok=True, captcha=False):
+        if self.proxy_pool and self.proxy:
+            self.proxy_pool.report(self.proxy, latency=latency, ok=ok, captcha=captcha)
+
+    def _release_proxy(self):
+        if self.proxy_pool and self.proxy:
+            self.proxy_pool.release(self.proxy)
+        self.proxy = None
+
+    def recycle_if_needed(self):
+        """Перезапуск драйвера, если watchdog сообщил о превышении порогов"""
+        reason = self.watchdog.check(self.driver)
+        if not reason and self.driver and self.proxy and self.proxy.evicted:
+            reason = f"прокси {self.proxy.url} исключён из пула"
+        if reason:
+            log.info("  ↻ Перезапуск браузера: %s", reason)
+            self.recycle_driver()
+        return reason
+
+    def close(self):
+        """Закрытие браузера"""
+        self.selectors.save()
+        if self.driver:
+            self._save_cookies()
+            self.driver.quit()
+            self.driver = None
+        self._release_proxy()
\ No newline at end of file
@@ -0,0 +1,167 @@
+"""
+Snapshot Archive
+Архив снимков страниц (MHTML через CDP Page.captureSnapshot) и повторный
+разбор без обращения к сайтам.
+
+Снимки сжимаются gzip и хранятся по SHA-256 содержимого рядом со скриншотами:
+    Скриншоты/_snapshots/ab/abcdef....mhtml.gz
+    Скриншоты/_snapshots/index.jsonl   — ссылка, хэш, время снимка
+Одинаковые страницы занимают место один раз.
+
+Повторный разбор архива (после правки селекторов или исправления ошибки):
+    python snapshot_archive.py reparse --out reparsed.json
+"""
+
+import argparse
+import email
+import gzip
+import hashlib
+import json
+import threading
+from datetime import datetime
+from email import policy
+from pathlib import Path
+
+import applog
+import http_fetcher
+from listing_cache import detect_site, listing_key
+from text_parsing import normalize_dates
+
+log = applog.get_logger(__name__)
+
+
+class SnapshotArchive:
+    """Контентно-адресуемое хранилище MHTML-снимков"""
+
+    def __init__(self, root="Скриншоты/_snapshots"):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.root / "index.jsonl"
+        self._lock = threading.Lock()
+
+    def _path(self, digest):
+        return self.root / digest[:2] / f"{digest}.mhtml.gz"
+
+    def capture(self, driver, url):
+        """Снимок текущей страницы драйвера. Возвращает хэш или None"""
+        try:
+            snapshot = driver.execute_cdp_cmd("Page.captureSnapshot", {"format": "mhtml"})["data"]
+        except Exception as e:
+            log.warning("  ✗ Ошибка снимка страницы: %s", e)
+            return None
+        return self.store(snapshot.encode("utf-8"), url)
+
+    def store(self, content, url):
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._path(digest)
+
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            with gzip.open(tmp_path, "wb", compresslevel=6) as f:
+                f.write(content)
+            tmp_path.replace(path)
+
+        entry = {
+            "url": url,
+            "key": listing_key(url),
+            "sha256": digest,
+            "captured_at": datetime.now().isoformat(),
+        }
+        with self._lock:
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+        log.debug("  ✓ Снимок страницы: %s (%s КБ)", digest[:12], len(content) // 1024)
+        return digest
+
+    def load(self, digest):
+        """Распакованный MHTML по хэшу"""
+        with gzip.open(self._path(digest), "rb") as f:
+            return f.read()
+
+    def entries(self, latest_only=True):
+        """Записи индекса; по умолчанию — последний снимок каждого объявления"""
+        if not self.index_path.exists():
+            return []
+
+        result = {}
+        all_entries = []
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                if latest_only:
+                    result[entry["key"]] = entry
+                else:
+                    all_entries.append(entry)
+        return list(result.values()) if latest_only else all_entries
+
+
+def mhtml_to_html(content):
+    """HTML главного документа из MHTML (первая часть text/html)"""
+    message = email.message_from_bytes(content, policy=policy.default)
+    for part in message.walk():
+        if part.get_content_type() == "text/html":
+            # Chrome не указывает charset в заголовке части — документ в UTF-8
+            payload = part.get_payload(decode=True)
+            return payload.decode(part.get_content_charset() or "utf-8", errors="replace")
+    raise ValueError("В снимке нет HTML-документа")
+
+
+def reparse(archive, parsers, latest_only=True):
+    """Повторный разбор снимков логикой http_fetcher. Возвращает список результатов"""
+    results = []
+    for entry in archive.entries(latest_only=latest_only):
+        site = detect_site(entry["url"])
+        parser = parsers.get(site)
+        if parser is None:
+            continue
+        try:
+            page_html = mhtml_to_html(archive.load(entry["sha256"]))
+            data = http_fetcher.extract(site, entry["url"], page_html, parser)
+        except Exception as e:
+            log.error("  ✗ %s: %s", entry['url'], e)
+            continue
+
+        if data is None:
+            log.warning("  ⚠ %s: в снимке нет данных объявления", entry['url'])
+            continue
+
+        data["source"] = "snapshot"
+        data["snapshot"] = entry["sha256"]
+        data["parsed_at"] = entry["captured_at"]
+        # Относительные даты («сегодня в 14:02») — от момента снимка, а не разбора
+        normalize_dates(data)
+        results.append(data)
+
+    return results
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Архив снимков страниц")
+    sub = arg_parser.add_subparsers(dest="command", required=True)
+
+    reparse_cmd = sub.add_parser("reparse", help="разобрать снимки заново без сети")
+    reparse_cmd.add_argument("--root", default="Скриншоты/_snapshots")
+    reparse_cmd.add_argument("--out", default="reparsed.json")
+    reparse_cmd.add_argument("--all", action="store_true", help="все снимки, а не только последние")
+
+    args = arg_parser.parse_args()
+    applog.setup()
+
+    from avito_parser import AvitoParser
+    from cian_parser import CianParser
+
+    archive = SnapshotArchive(args.root)
+    parsers = {
+        "avito": AvitoParser(download_screens=False, persistent_profile=False),
+        "cian": CianParser(download_images=False, persistent_profile=False),
+    }
+    results = reparse(archive, parsers, latest_only=not args.all)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\nРазобрано снимков: {len(results)}, результаты сохранены в {args.out}")
@@ -0,0 +1,356 @@
+"""
+Text Parsing
+Разбор чисел, цен, площадей, дат и истории цен из текста страниц.
+
+Общие функции для парсеров Avito и Циан, http_fetcher и повторного
+разбора снимков. Вызываются на каждое объявление, поэтому все регулярные
+выражения скомпилированы один раз при импорте, а функции не зависят от
+драйвера и проверяются без браузера:
+    python parsing_bench.py          — самопроверка свойств и замер скорости
+"""
+
+import functools
+import re
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+NUMBER_GROUP_RE = re.compile(r"[\d\s]+")
+NUM_CHAR_RE = re.compile(r"\d|(?<=\d)\.")
+FIRST_NUMBER_RE = re.compile(r"(\d+[.,]?\d*)")
+AREA_M2_RE = re.compile(r"(\d+[.,]?\d*)\s*м[²2]")
+SPACES_RE = re.compile(r"\s+")
+# Символы суммы перед знаком ₽: цифры и разряды через пробел
+RUB_AMOUNT_CHARS = "0123456789\xa0 "
+
+# Токены даты в tooltip истории цен: «12 января 2025»
+DAY_RE = re.compile(r"\d{1,2}")
+MONTH_RE = re.compile(r"[А-Яа-я]+")
+YEAR_RE = re.compile(r"\d{4}")
+CURRENCY_TOKENS = ("₽", "руб", "руб.")
+
+# Даты: «3 марта», «12 мар. 2025», «сегодня в 14:02», «2 часа назад», «03.03.2025»
+DATE_RE = re.compile(r"(\d{1,2})\s+([а-яё]+)\.?(?:\s+(\d{4}))?")
+NUMERIC_DATE_RE = re.compile(r"(\d{1,2})\.(\d{1,2})\.(\d{4})")
+TIME_RE = re.compile(r"(\d{1,2}):(\d{2})")
+AGO_RE = re.compile(r"(\d+)?\s*([а-яё]+)\.?\s+назад")
+
+# Месяц по первым трём буквам (любой падеж и сокращение) → номер
+MONTHS = {
+    "янв": 1, "фев": 2, "мар": 3, "апр": 4, "май": 5, "мая": 5, "июн": 6,
+    "июл": 7, "авг": 8, "сен": 9, "окт": 10, "ноя": 11, "дек": 12,
+}
+# «позавчера» проверяется раньше «вчера»
+RELATIVE_DAYS = (("позавчера", 2), ("вчера", 1), ("сегодня", 0))
+
+# Таблицы единиц: (регулярное выражение, множитель/делитель). Таблица собирается
+# в одно выражение-альтернативу, где каждая единица — именованная группа, так что
+# текст просматривается один раз; при нескольких единицах берётся самая левая,
+# в одной позиции — стоящая раньше в таблице. Единица ищется как начало слова
+# (перед ней не буква): «год» не находится в «выгодно», «га» — в «гараж».
+# Шаблоны начинаются с обычных символов: по набору первых символов re пропускает
+# остальные позиции, а текст без начала ни одного шаблона (keys) отсекается
+# проверкой подстроки, без регулярного выражения.
+NOT_LETTER = r"(?<![^\W\d_])"
+LITERAL_PREFIX_RE = re.compile(r"[^\\()\[\]{}.*+?|^$]+")
+
+UnitTable = namedtuple("UnitTable", "pattern factors keys")
+
+
+def _units(*entries, prefix=NOT_LETTER):
+    lead = "".join(sorted({re.escape(pattern[0]) for pattern, _ in entries}))
+    alternatives = "|".join(f"(?P<u{i}>{pattern})" for i, (pattern, _) in enumerate(entries))
+    factors = {f"u{i}": factor for i, (_, factor) in enumerate(entries)}
+    keys = tuple(dict.fromkeys(LITERAL_PREFIX_RE.match(pattern).group() for pattern, _ in entries))
+    return UnitTable(re.compile(f"(?=[{lead}]){prefix}(?:{alternatives})"), factors, keys)
+
+
+# Единица в «N … назад» по началу слова → секунды
+AGO_UNITS = _units(
+    ("сек", 1), ("мин", 60), ("час", 3600), ("дн", 86400), ("ден", 86400),
+    ("недел", 604800), ("мес", 2592000), ("год", 31536000), ("лет", 31536000), ("ч", 3600),
+    prefix="^",
+)
+# Площадь участка указывается только в сотках или гектарах
+PLOT_ENTRIES = ((r"сот", 100), (r"га(?![а-яё])", 10000))
+PLOT_UNITS = _units(*PLOT_ENTRIES)
+# Площадь → м²
+AREA_UNITS = _units(*PLOT_ENTRIES, (r"м[²2]", 1), (r"кв\.?\s?м", 1))
+# Период цены → число месяцев (делитель до месячной цены)
+PRICE_PERIODS = _units((r"год", 12), (r"мес", 1))
+# Цена за единицу → м² в единице (делитель до цены за м²)
+PRICE_UNITS = _units(
+    (r"за\s+(?:гектар|га(?![а-яё]))", 10000),
+    (r"за\s+сот", 100),
+    (r"за\s+(?:метр|м[²2])", 1), (r"/\s*м[²2]", 1),
+)
+# Цена за м² в тексте цены ('… ₽/м² в месяц')
+PER_M2 = _units((r"м²", True), (r"м2", True))
+
+
+def unit_factor(text, table, default=None):
+    """Множитель самой левой единицы из table в тексте, иначе default"""
+    for key in table.keys:
+        if key in text:
+            match = table.pattern.search(text)
+            return table.factors[match.lastgroup] if match else default
+    return default
+
+
+def to_monthly(value, months):
+    """Цена за период → цена за месяц; months — число месяцев периода (unit_factor по PRICE_PERIODS)"""
+    return value / months if months != 1 else value
+
+
+# Подписи вокруг числа ('₽ в год за м²', 'Цена за сотку') повторяются от объявления
+# к объявлению, меняется только число — единицы подписи разбираются один раз.
+# Части подписи до и после числа соединяются пробелом: он сохраняет границы слов.
+@functools.lru_cache(maxsize=4096)
+def _price_terms(label):
+    """(месяцев в периоде, цена за м²) по тексту цены без числа"""
+    return unit_factor(label, PRICE_PERIODS, 1), unit_factor(label, PER_M2, False)
+
+
+@functools.lru_cache(maxsize=4096)
+def _unit_terms(label):
+    """(м² в единице цены, месяцев в периоде) по подписи без числа"""
+    return unit_factor(label, PRICE_UNITS), unit_factor(label, PRICE_PERIODS, 1)
+
+
+def _rub_amount(text):
+    """
+    Сумма перед первым знаком ₽ и подпись без неё:
+    'Залог 50 000 ₽/мес.' → (50000.0, 'Залог ₽/мес.'); без суммы — (None, None).
+    """
+    before, sign, after = text.partition("₽")
+    if not sign:
+        return None, None
+    # Сумма — цифры и пробелы в конце текста перед ₽: rstrip быстрее регулярного выражения
+    head = before.rstrip(RUB_AMOUNT_CHARS)
+    try:
+        value = float(before[len(head):].replace(" ", "").replace("\xa0", ""))
+    except ValueError:
+        return None, None
+    return value, f"{head} {after}" if head else after
+
+
+def parse_price(price_text):
+    """
+    (цена, тип цены) из текста цены; тип — 'месяц', 'м²/месяц' или 'год'.
+    Годовая цена приводится к месячной, тип сохраняет исходный период.
+    """
+    if not price_text:
+        return None, None
+
+    match = NUMBER_GROUP_RE.search(price_text)
+    price = None
+    if match:
+        try:
+            price = int(match.group().replace(" ", "").replace("\xa0", ""))
+        except ValueError:
+            price = None
+
+    months, per_m2 = _price_terms(
+        f"{price_text[:match.start()]} {price_text[match.end():]}" if match else price_text
+    )
+    if price is not None and months != 1:
+        price /= months
+
+    price_type = "месяц"
+    if per_m2:
+        price_type = "м²/месяц"
+    elif months == 12:
+        price_type = "год"
+
+    return price, price_type
+
+
+def extract_num(text):
+    """Число из всех цифр строки ('1 500.5 ₽/м²' → 1500.5); ValueError, если цифр нет"""
+    return float("".join(NUM_CHAR_RE.findall(text)))
+
+
+def first_number(text):
+    """Первое число строки с дробной частью через точку или запятую, иначе None"""
+    if not isinstance(text, str):
+        return None
+    match = FIRST_NUMBER_RE.search(text)
+    return float(match.group(1).replace(",", ".")) if match else None
+
+
+def area_from_text(text):
+    """Первая площадь в м² ('60,5 м²', '60 м2') или None"""
+    if not isinstance(text, str):
+        return None
+    match = AREA_M2_RE.search(text)
+    return float(match.group(1).replace(",", ".")) if match else None
+
+
+def area_m2(text, units=AREA_UNITS):
+    """Площадь в м² по числу и единице из units ('10 сот.' → 1000.0); None без числа или единицы"""
+    if not isinstance(text, str):
+        return None
+    factor = unit_factor(text, units)
+    if factor is None:
+        return None
+    value = first_number(text)
+    return value * factor if value is not None else None
+
+
+def plot_area_m2(text):
+    """Площадь участка в м² из '10 сот.', '1,5 га'; None, если единица не указана"""
+    return area_m2(text, PLOT_UNITS)
+
+
+def price_per_m2_from_info(price_info):
+    """
+    Цена за м² из строки Avito под ценой ('83 333 ₽ за м²', '… ₽ за сотку').
+    Без единицы (например, 'Залог 50 000 ₽') — None.
+    """
+    if not price_info:
+        return None
+    value, label = _rub_amount(price_info)
+    if value is None:
+        return None
+    unit, months = _unit_terms(label)
+    if unit is None:
+        return None
+    return to_monthly(value / unit, months)
+
+
+def price_per_m2_from_facts(facts):
+    """Цена за м² из пар (название, значение) блока фактов Циан ('Цена за метр', 'Цена за сотку' …)"""
+    for title, value in facts:
+        unit = _unit_terms(title)[0] if title.startswith("Цена") else None
+        if unit:
+            number, label = _rub_amount(value)
+            if number is None:
+                return None
+            return to_monthly(number / unit, _price_terms(label)[0])
+    return None
+
+
+def parse_price_history(text):
+    """
+    Записи истории цен из текста tooltip:
+    '12 января 2025 5 200 000 ₽ 3 марта 2025 5 000 000 ₽' →
+    [{'date': '12 января 2025', 'price': 5200000}, …]
+    Между записями может быть что угодно (изменение цены, подписи).
+    """
+    tokens = SPACES_RE.sub(" ", text.replace("\xa0", " ")).strip().split(" ")
+    history = []
+
+    i = 0
+    count = len(tokens)
+    while i < count:
+        if (
+                i + 2 < count
+                and DAY_RE.match(tokens[i])
+                and MONTH_RE.match(tokens[i + 1])
+                and YEAR_RE.match(tokens[i + 2])
+        ):
+            date = f"{tokens[i]} {tokens[i + 1]} {tokens[i + 2]}"
+            i += 3
+
+            start = i
+            while i < count and tokens[i].isdigit():
+                i += 1
+
+            if i < count and i > start and tokens[i] in CURRENCY_TOKENS:
+                history.append({"date": date, "price": int("".join(tokens[start:i]))})
+                i += 1
+            continue
+
+        i += 1
+
+    return history
+
+
+@functools.lru_cache(maxsize=8192)
+def _date_spec(text):
+    """
+    Разбор строки даты без привязки ко времени разбора (кэшируется по тексту):
+    ('date', год или None, месяц, день, час, минута), ('days_ago', дни, час, минута),
+    ('ago', секунды) или None.
+    """
+    lowered = text.lower().replace("\xa0", " ")
+    time_match = TIME_RE.search(lowered)
+    hour, minute = (int(time_match.group(1)), int(time_match.group(2))) if time_match else (0, 0)
+
+    for word, days in RELATIVE_DAYS:
+        if word in lowered:
+            return "days_ago", days, hour, minute
+
+    match = NUMERIC_DATE_RE.search(lowered)
+    if match:
+        return "date", int(match.group(3)), int(match.group(2)), int(match.group(1)), hour, minute
+
+    for match in DATE_RE.finditer(lowered):
+        month = MONTHS.get(match.group(2)[:3])
+        if month:
+            year = int(match.group(3)) if match.group(3) else None
+            return "date", year, month, int(match.group(1)), hour, minute
+
+    if "только что" in lowered:
+        return "ago", 0
+    match = AGO_RE.search(lowered)
+    if match:
+        factor = unit_factor(match.group(2), AGO_UNITS)
+        if factor:
+            return "ago", int(match.group(1) or 1) * factor
+
+    return None
+
+
+def resolve_date(text, reference):
+    """
+    datetime по русской дате относительно reference (время разбора) или None.
+    Дата без года — ближайшая не позже следующего за reference дня: сутки запаса
+    на разницу часовых поясов сайта и машины, где идёт разбор.
+    """
+    if not isinstance(text, str) or not text:
+        return None
+    spec = _date_spec(text.strip())
+    if spec is None:
+        return None
+
+    kind = spec[0]
+    try:
+        if kind == "ago":
+            return reference - timedelta(seconds=spec[1])
+        if kind == "days_ago":
+            day = reference - timedelta(days=spec[1])
+            return day.replace(hour=spec[2], minute=spec[3], second=0, microsecond=0)
+
+        year, month, day, hour, minute = spec[1:]
+        result = datetime(year or reference.year, month, day, hour, minute)
+        if year is None and result > reference + timedelta(days=1):
+            result = result.replace(year=reference.year - 1)
+        return result
+    except ValueError:
+        # 31 февраля, 25:00 и т.п.
+        return None
+
+
+def to_iso(text, reference):
+    result = resolve_date(text, reference)
+    return result.isoformat(timespec="seconds") if result else None
+
+
+def normalize_dates(data):
+    """
+    published_at и date_iso в записях price_history — ISO-время относительно parsed_at.
+    Исходные строки не меняются.
+    """
+    try:
+        reference = datetime.fromisoformat(data["parsed_at"])
+    except (KeyError, TypeError, ValueError):
+        return data
+
+    published_at = to_iso(data.get("published_date"), reference)
+    if published_at:
+        data["published_at"] = published_at
+    for entry in data.get("price_history") or []:
+        date_iso = to_iso(entry.get("date"), reference)
+        if date_iso:
+            entry["date_iso"] = date_iso
+    return data
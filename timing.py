@@ -0,0 +1,138 @@
+"""
+Timing
+Замер длительности этапов парсинга (спаны).
+
+Каждый этап — загрузка страницы, ожидание готовности, история цен,
+скриншоты, галерея, загрузка фото — оборачивается в span() и записывается
+вместе с сайтом и ссылкой объявления. Объявление задаётся set_ad()
+(парсер вызывает его при открытии страницы) и действует для потока до
+следующего объявления.
+
+Выгрузка после прогона:
+    Диагностика/timing_20250101_120000.jsonl       — один спан на строку
+    Диагностика/timing_20250101_120000.trace.json  — Chrome trace events,
+        открывается в chrome://tracing или https://ui.perfetto.dev
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+DIAGNOSTICS_DIR = Path("Диагностика")
+
+
+class Tracer:
+    """Буфер спанов; max_spans ограничивает память при долгих прогонах"""
+
+    def __init__(self, max_spans=100000):
+        self.enabled = True
+        self.spans = deque(maxlen=max_spans)
+        self._local = threading.local()
+        self._origin = time.perf_counter()
+        self._origin_wall = time.time()
+
+    def set_ad(self, site, url):
+        self._local.ad = (site, url)
+
+    def current_ad(self):
+        return getattr(self._local, "ad", (None, None))
+
+    @contextmanager
+    def span(self, name, **attrs):
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            site, url = self.current_ad()
+            self.spans.append({
+                "name": name,
+                "site": site,
+                "url": url,
+                "start": start - self._origin,
+                "duration": end - start,
+                "thread": threading.get_ident(),
+                "attrs": attrs,
+            })
+
+    def traced(self, name):
+        """Декоратор: весь вызов метода — один спан"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def take(self):
+        """Забирает накопленные спаны (буфер очищается)"""
+        spans = list(self.spans)
+        self.spans.clear()
+        return spans
+
+    def to_jsonl(self, spans, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for span in spans:
+                record = dict(span)
+                record["started_at"] = datetime.fromtimestamp(self._origin_wall + span["start"]).isoformat()
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def to_chrome_trace(self, spans, path):
+        """Формат Trace Event: полные события ph='X', время в микросекундах"""
+        events = []
+        for span in spans:
+            args = {"site": span["site"], "url": span["url"]}
+            args.update(span["attrs"])
+            events.append({
+                "name": span["name"],
+                "cat": span["site"] or "app",
+                "ph": "X",
+                "ts": int(span["start"] * 1e6),
+                "dur": int(span["duration"] * 1e6),
+                "pid": os.getpid(),
+                "tid": span["thread"],
+                "args": args,
+            })
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+    def export(self, directory=DIAGNOSTICS_DIR, spans=None):
+        """Выгружает спаны (по умолчанию накопленные) в JSONL и Chrome trace. Возвращает базовый путь или None"""
+        if spans is None:
+            spans = self.take()
+        if not spans:
+            return None
+
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        base = directory / f"timing_{datetime.now():%Y%m%d_%H%M%S}"
+        self.to_jsonl(spans, base.with_suffix(".jsonl"))
+        self.to_chrome_trace(spans, base.with_suffix(".trace.json"))
+        return base
+
+
+def summarize(spans):
+    """{(сайт, этап): (число, сумма сек, максимум сек)} — для краткого отчёта в лог"""
+    result = {}
+    for span in spans:
+        key = (span["site"], span["name"])
+        count, total, longest = result.get(key, (0, 0.0, 0.0))
+        result[key] = (count + 1, total + span["duration"], max(longest, span["duration"]))
+    return result
+
+
+# Общий трассировщик процесса: парсеры и воркеры пишут в него
+tracer = Tracer()
+span = tracer.span
+traced = tracer.traced
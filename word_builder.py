@@ -10,7 +10,8 @@ def set_tnr_12(paragraph):
         run.font.size = Pt(12)
 
 
-def build_word_with_screenshots(data_rows, output_path):
+def build_word_with_screenshots(data_rows, output_path, on_progress=None):
+    """on_progress(готово, всего) вызывается после каждого объявления"""
 
     doc = Document()
 
@@ -37,6 +38,7 @@ def build_word_with_screenshots(data_rows, output_path):
     offers = [r for r in data_rows if not r["is_analog"]]
 
     analog_counter = 1
+    total = len(analogs) + len(offers)
 
     for row in analogs:
         analog = row["data"]
@@ -83,7 +85,7 @@ def build_word_with_screenshots(data_rows, output_path):
                 run.add_picture(titul_img, width=Pt(500))
                 set_tnr_12(p_img3)
 
-            if os.path.exists(address_img) and not row["data"]["screenshots"]["has_location_and_date"]:
+            if os.path.exists(address_img) and not row["data"].get("screenshots", {}).get("has_location_and_date"):
                 p_img2 = doc.add_paragraph()
                 p_img2.alignment = WD_ALIGN_PARAGRAPH.CENTER
                 run = p_img2.add_run()
@@ -150,6 +152,8 @@ def build_word_with_screenshots(data_rows, output_path):
         # Пустая строка между аналогами
         doc.add_paragraph("")
 
+        if on_progress:
+            on_progress(analog_counter, total)
         analog_counter += 1
 
     if offers:
@@ -161,7 +165,7 @@ def build_word_with_screenshots(data_rows, output_path):
 
         doc.add_paragraph("")
 
-        for row in offers:
+        for offer_counter, row in enumerate(offers, 1):
             data = row["data"]
 
             title = data.get("title")
@@ -196,7 +200,7 @@ def build_word_with_screenshots(data_rows, output_path):
                     run.add_picture(titul_img, width=Pt(500))
                     set_tnr_12(p_img3)
 
-                if os.path.exists(address_img) and not row["data"]["screenshots"]["has_location_and_date"]:
+                if os.path.exists(address_img) and not row["data"].get("screenshots", {}).get("has_location_and_date"):
                     p_img2 = doc.add_paragraph()
                     p_img2.alignment = WD_ALIGN_PARAGRAPH.CENTER
                     run = p_img2.add_run()
@@ -259,4 +263,7 @@ def build_word_with_screenshots(data_rows, output_path):
 
             doc.add_paragraph("")
 
+            if on_progress:
+                on_progress(len(analogs) + offer_counter, total)
+
     doc.save(output_path)